@@ -0,0 +1,100 @@
+"""
+Per-row cost of a contact list response, before and after the orjson fast path.
+
+before: select(Contact) loading the projected columns, dumped with ContactProjection.dump, validated into
+        list[ContactSparseResponse] and rendered by JSONResponse, as FastAPI does for a route with a response_model
+after:  plain rows from repository.get_contacts, rendered by services.serialization.contacts_response
+Both read the same columns, without the owner, and produce the same JSON: only the serialization path differs.
+
+Run from the project root:
+    python -m benchmarks.contacts_serialization [--rows 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.entity.models import Base, Contact, User
+from src.repository.contacts import (contact_load_options, contact_values,
+                                     get_contacts)
+from src.schemas.schemas import (ContactModel, ContactProjection,
+                                 ContactSparseResponse)
+from src.services.contacts_cache import contacts_cache
+from src.services.serialization import contacts_response
+
+
+async def seed(session: AsyncSession, rows: int) -> User:
+    user = User(username="benchmark", email="benchmark@example.com", password="secret")
+    session.add(user)
+    await session.flush()
+    values = []
+    for number in range(rows):
+        body = ContactModel(first_name=f"First{number}", last_name=f"Last{number}",
+                            email=f"contact{number}@example.com",
+                            contact_number=f"{200 + number // 10000:03}-555-{number % 10000:04}",
+                            birth_date=date(1970, 1, 1) + timedelta(days=number % 15000),
+                            additional_information="note" if number % 2 else None)
+        values.append({**contact_values(body), "user_id": user.id})
+    await session.execute(insert(Contact), values)
+    await session.commit()
+    return user
+
+
+async def before(session: AsyncSession, user: User, rows: int) -> tuple[float, float, bytes]:
+    projection = ContactProjection()
+    field = create_response_field(name="response", type_=list[ContactSparseResponse])
+    start = time.perf_counter()
+    result = await session.execute(select(Contact).options(*contact_load_options(projection))
+                                   .where(Contact.user_id == user.id).limit(rows))
+    contacts = result.scalars().all()
+    fetched = time.perf_counter()
+    content = await serialize_response(field=field, response_content=[projection.dump(contact) for contact in contacts],
+                                       exclude_unset=True, is_coroutine=True)
+    body = JSONResponse(content).body
+    session.expunge_all()
+    return fetched - start, time.perf_counter() - fetched, body
+
+
+async def after(session: AsyncSession, user: User, rows: int) -> tuple[float, float, bytes]:
+    projection = ContactProjection()
+    start = time.perf_counter()
+    contacts = await get_contacts(rows, 0, session, user, projection)
+    fetched = time.perf_counter()
+    body = contacts_response(contacts, projection, user).body
+    return fetched - start, time.perf_counter() - fetched, body
+
+
+async def main(rows: int, repeat: int):
+    # Every run must read the database, not the Redis cache of contact reads
+    contacts_cache.client = None
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = await seed(session, rows)
+        print(f"{rows} contacts, best of {repeat}, per row:")
+        bodies = []
+        for name, run in (("before", before), ("after", after)):
+            timings = [await run(session, user, rows) for _ in range(repeat)]
+            query = min(timing[0] for timing in timings) / rows * 1e6
+            serialize = min(timing[1] for timing in timings) / rows * 1e6
+            bodies.append(timings[0][2])
+            print(f"  {name:6}  query {query:6.2f} us  serialize {serialize:6.2f} us  "
+                  f"total {query + serialize:6.2f} us  body {len(timings[0][2]) / rows:.0f} B")
+        assert json.loads(bodies[0]) == json.loads(bodies[1]), "before and after must return the same JSON"
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.rows, arguments.repeat))
@@ -1,3 +1,5 @@
+import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import redis.asyncio as redis
@@ -10,14 +12,51 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from middlewares import (BlackListMiddleware, CustomCORSMiddleware,
-                         CustomHeaderMiddleware, UserAgentBanMiddleware,
-                         WhiteListMiddleware)
+                         CustomHeaderMiddleware, QueryCountMiddleware,
+                         RequestTrackingMiddleware, UserAgentBanMiddleware,
+                         WhiteListMiddleware, request_tracker)
 from src.conf.config import config
-from src.database.db import get_db
-from src.routes import auth, contacts, users
+from src.database.db import get_db, sessionmanager
+from src.routes import admin, auth, contacts, users
+from src.services.auth import auth_service
+from src.services.contacts_cache import contacts_cache
+from src.services.contacts_import import import_jobs
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function prepares the application before it starts serving and cleans up after it stops.
+    On startup it checks Redis, initializes the rate limiter and pre-opens database pool connections,
+    so the app only reports ready once the first requests won't pay for connecting.
+    On shutdown it waits for in-flight requests to finish, then closes the Redis clients and the database pools.
+
+    :param app: FastAPI: The application instance
+    :return: An async context manager that runs for the lifetime of the app
+    """
+    r = await redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    await r.ping()
+    await FastAPILimiter.init(r)
+    await sessionmanager.warm_up(config.DB_POOL_WARMUP)
+
+    yield
+
+    if not await request_tracker.drain(config.SHUTDOWN_DRAIN_TIMEOUT):
+        logger.warning("Shutting down with %d requests still in flight", request_tracker.in_flight)
+    await FastAPILimiter.close()
+    auth_service.cache.close()
+    if contacts_cache.client is not None:
+        await contacts_cache.client.aclose()
+    await import_jobs.client.aclose()
+    # Also closes the read-your-writes marker store
+    await sessionmanager.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(QueryCountMiddleware)  # noqa
 app.add_middleware(CustomHeaderMiddleware)  # noqa
 app.add_middleware(CustomCORSMiddleware,  # noqa
                    origins=["*"],
@@ -28,6 +67,8 @@ app.add_middleware(CustomCORSMiddleware,  # noqa
 # app.add_middleware(BlackListMiddleware)  # noqa
 # app.add_middleware(WhiteListMiddleware) # noqa
 # app.add_middleware(UserAgentBanMiddleware)  # noqa
+# Added last so it is the outermost middleware and shutdown drains every request
+app.add_middleware(RequestTrackingMiddleware)  # noqa
 
 
 BASE_DIR = Path(__file__).parent
@@ -37,19 +78,7 @@ app.mount("/static", StaticFiles(directory=BASE_DIR / "src" / "static"), name="s
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
-
-
-@app.on_event("startup")
-async def startup():
-    """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are used by the app, such as databases or caches.
-    
-    :return: A redis object
-    :doc-author: Trelent
-    """
-    r = await redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
-    await FastAPILimiter.init(r)
+app.include_router(admin.router, prefix='/api')
 
 
 templates = Jinja2Templates(directory=BASE_DIR / "src" / "templates")  # noqa
@@ -88,3 +117,4 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+
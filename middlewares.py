@@ -1,3 +1,4 @@
+import asyncio
 import re
 import time
 from ipaddress import ip_address
@@ -8,6 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from src.database.instrumentation import RequestQueries, current_request_queries
+
 BANNED_IPS = [ip_address("192.168.1.1"), ip_address("192.168.1.2"), ip_address("127.0.0.1")]
 ALLOWED_IPS = [ip_address('192.168.1.0'), ip_address('172.16.0.0'), ip_address("127.0.0.1")]
 USER_AGENT_BAN = [r"Gecko", r"Python-urllib"]
@@ -30,6 +33,22 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
         return response
 
 
+class QueryCountMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+
+    async def dispatch(self, request: Request, call_next: Callable):
+        queries = RequestQueries(route=f"{request.method} {request.url.path}")
+        token = current_request_queries.set(queries)
+        try:
+            response = await call_next(request)
+        finally:
+            current_request_queries.reset(token)
+        response.headers["X-DB-Queries"] = str(queries.count)
+        response.headers["Server-Timing"] = queries.server_timing()
+        return response
+
+
 class BlackListMiddleware(BaseHTTPMiddleware):
     def __init__(self, app):
         super().__init__(app)
@@ -78,3 +97,49 @@ class CustomCORSMiddleware(CORSMiddleware):
             allow_methods=allow_methods,
             allow_headers=allow_headers
         )
+
+
+class RequestTracker:
+    """
+    Counts requests that are still being handled, so shutdown can wait for them to finish.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def started(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def finished(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+request_tracker = RequestTracker()
+
+
+class RequestTrackingMiddleware:
+    # Plain ASGI middleware: unlike BaseHTTPMiddleware it also covers streamed response bodies.
+    def __init__(self, app, tracker: RequestTracker = request_tracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.tracker.started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.finished()
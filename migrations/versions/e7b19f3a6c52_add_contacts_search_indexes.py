@@ -0,0 +1,47 @@
+"""add contacts search indexes
+
+Revision ID: e7b19f3a6c52
+Revises: c5d07b2e9a14
+Create Date: 2026-10-17 14:02:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b19f3a6c52'
+down_revision: Union[str, None] = 'c5d07b2e9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE contacts_fts USING fts5(first_name, last_name, email, contact_number, "
+                   "content='contacts', content_rowid='id', tokenize='trigram')")
+        op.execute("CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email, contact_number) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email, new.contact_number); END")
+        op.execute("CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, contact_number) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.contact_number); END")
+        op.execute("CREATE TRIGGER contacts_fts_update AFTER UPDATE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, contact_number) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.contact_number); "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email, contact_number) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email, new.contact_number); END")
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+    else:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_contacts_search_trgm ON contacts USING gin "
+                   "(lower(first_name || ' ' || last_name || ' ' || email || ' ' || contact_number) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('contacts_fts_insert', 'contacts_fts_delete', 'contacts_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
+    else:
+        op.drop_index('ix_contacts_search_trgm', table_name='contacts')
@@ -0,0 +1,90 @@
+"""add contacts phone_e164
+
+Revision ID: f3c8a2d91b07
+Revises: e7b19f3a6c52
+Create Date: 2026-10-17 16:25:09.734120
+
+"""
+import logging
+import re
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a2d91b07'
+down_revision: Union[str, None] = 'e7b19f3a6c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Country code of the numbers stored without one, PHONE_DEFAULT_COUNTRY_CODE at the time of this migration
+DEFAULT_COUNTRY_CODE = "1"
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(f"alembic.{revision}")
+
+
+def phone_e164(value: str) -> str:
+    digits = re.sub(r"\D", "", value)
+    if value.lstrip().startswith("+"):
+        return f"+{digits}"
+    return f"+{DEFAULT_COUNTRY_CODE}{digits}"
+
+
+def backfill() -> None:
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('contact_number', sa.String),
+                        sa.column('phone_e164', sa.String), sa.column('phone_reversed', sa.String))
+    update = (contacts.update()
+              .where(contacts.c.id == sa.bindparam('contact_id'))
+              .values(phone_e164=sa.bindparam('e164'), phone_reversed=sa.bindparam('reversed')))
+    connection = op.get_bind()
+    seen = set()
+    skipped = []
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select(contacts.c.id, contacts.c.contact_number)
+                                  .where(contacts.c.id > last_id)
+                                  .order_by(contacts.c.id)
+                                  .limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        parameters = []
+        for contact_id, contact_number in rows:
+            e164 = phone_e164(contact_number)
+            reversed_digits = e164[1:][::-1]
+            # Numbers already stored in another format get no phone_e164, the unique index would reject them.
+            # phone_reversed isn't unique, so suffix search still finds them.
+            if e164 in seen:
+                skipped.append(contact_id)
+                parameters.append({'contact_id': contact_id, 'e164': None, 'reversed': reversed_digits})
+                continue
+            seen.add(e164)
+            parameters.append({'contact_id': contact_id, 'e164': e164, 'reversed': reversed_digits})
+        if parameters:
+            connection.execute(update, parameters)
+        last_id = rows[-1].id
+    if skipped:
+        logger.warning("%d contacts share their E.164 number with an earlier contact and were left without "
+                       "phone_e164, ids: %s", len(skipped), ", ".join(map(str, skipped)))
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('contacts', sa.Column('phone_e164', sa.String(length=16), nullable=True))
+    op.add_column('contacts', sa.Column('phone_reversed', sa.String(length=15), nullable=True))
+    # ### end Alembic commands ###
+    backfill()
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index('ix_contacts_phone_e164', 'contacts', ['phone_e164'], unique=True)
+    op.create_index('ix_contacts_user_id_phone_reversed', 'contacts', ['user_id', 'phone_reversed'], unique=False)
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_contacts_user_id_phone_reversed', table_name='contacts')
+    op.drop_index('ix_contacts_phone_e164', table_name='contacts')
+    op.drop_column('contacts', 'phone_reversed')
+    op.drop_column('contacts', 'phone_e164')
+    # ### end Alembic commands ###
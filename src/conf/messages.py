@@ -7,3 +7,14 @@ VERIFICATION_ERROR = "Verification error"
 CONTACT_NOT_FOUND = "Contact not found"
 ACCESS_FORBIDDEN = "Access forbidden"
 CONTACT_NUMBER_EMAIL_EXISTS = "Contact with the mentioned email or contact number already exists"
+CONTACT_EMAIL_EXISTS = "Contact with the mentioned email already exists."
+CONTACT_NUMBER_EXISTS = "Contact with the mentioned contact number already exists."
+CONTACT_FIELDS_INVALID = "Unknown contact fields"
+CONTACT_INCLUDE_INVALID = "Only user can be included"
+CONTACT_VERSION_MISMATCH = "Contact was changed since it was read"
+IMPORT_JOB_NOT_FOUND = "Import job not found"
+IMPORT_FILE_NOT_UTF8 = "File is not UTF-8 text"
+IMPORT_FILE_INVALID_CSV = "Invalid CSV"
+DUPLICATE_NOT_FOUND = "Duplicate not found"
+DUPLICATE_KEEP_INVALID = "The contact to keep must be one of the two duplicates"
+SYNC_TOKEN_INVALID = "Invalid sync token"
@@ -1,22 +1,264 @@
+import asyncio
 import contextlib
+import functools
+import hashlib
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
 
-from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
-                                    create_async_engine)
+import redis.asyncio as redis
+from fastapi import Request
+from fastapi.routing import APIRoute
+from jose import JWTError, jwt
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import config
+from src.database.instrumentation import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    Checkout counters and a latency histogram for one connection pool.
+    Bucket bounds are in milliseconds, the last bucket collects everything slower.
+    """
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.histogram = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def observe(self, elapsed: float):
+        elapsed_ms = elapsed * 1000
+        self.checkouts += 1
+        self.wait_time_total += elapsed
+        self.wait_time_max = max(self.wait_time_max, elapsed)
+        self.histogram[bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["inf"]
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_time_total": round(self.wait_time_total, 6),
+            "wait_time_avg": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_time_max": round(self.wait_time_max, 6),
+            "checkout_latency_histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records how long every checkout had to wait for a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        self.stats.observe(time.perf_counter() - start)
+        return connection
+
+
+class TrackedSession(Session):
+    """
+    Session that remembers whether the current transaction wrote anything.
+    """
+
+
+@event.listens_for(TrackedSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["writes"] = True
+
+
+@event.listens_for(TrackedSession, "after_commit")
+def _after_commit(session):
+    if session.info.pop("writes", False):
+        session.info["committed_writes"] = True
+
+
+@event.listens_for(TrackedSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("writes", None)
+
+
+class LazyConnectionSession(AsyncSession):
+    """
+    AsyncSession that takes a connection from the pool on the first statement and keeps it, in one
+    read transaction, for the rest of the endpoint's reads. The read transaction ends when the endpoint
+    returns (see SessionScopedRoute), before the response is serialized and sent.
+    Transactions that wrote, or that locked rows, keep their connection until commit or rollback.
+    """
+    sync_session_class = TrackedSession
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        sessions = _request_sessions.get()
+        if sessions is not None:
+            sessions.append(self)
+
+    async def execute(self, statement, *args, **kwargs):
+        self._track(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        self._track(statement)
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def commit(self):
+        await super().commit()
+        if self.info.pop("committed_writes", False) and "on_write_commit" in self.info:
+            await self.info["on_write_commit"]()
+
+    def _track(self, statement):
+        if not getattr(statement, "is_select", False) or getattr(statement, "_for_update_arg", None) is not None:
+            self.info["writes"] = True
+
+    async def end_read(self):
+        """
+        End a transaction that only read, returning its connection to the pool.
+        Loaded objects stay usable, a later statement starts a new transaction.
+        """
+        if not self.in_transaction() or self.info.get("writes"):
+            return
+        if self.new or self.dirty or self.deleted:
+            return
+        await self.commit()
+
+
+# Sessions opened while a SessionScopedRoute handles a request
+_request_sessions: ContextVar[list[LazyConnectionSession] | None] = ContextVar("request_sessions", default=None)
+
+
+class SessionScopedRoute(APIRoute):
+    """
+    Route that ends the read transactions of the request's sessions as soon as the endpoint returns.
+    Yield dependencies only close their sessions after the response model is serialized, this gives
+    the connections back before that. An endpoint that raised leaves its sessions to the dependencies.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+        if not asyncio.iscoroutinefunction(endpoint):
+            return
+
+        @functools.wraps(endpoint)
+        async def call(**values):
+            result = await endpoint(**values)
+            for session in _request_sessions.get() or ():
+                await session.end_read()
+            return result
+
+        self.dependant.call = call
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            token = _request_sessions.set([])
+            try:
+                return await handler(request)
+            finally:
+                _request_sessions.reset(token)
+
+        return route_handler
+
+
+def _uses_static_pool(url: str) -> bool:
+    # In-memory SQLite always runs on a single StaticPool connection.
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _create_engine(url: str, **pool_options) -> AsyncEngine:
+    if _uses_static_pool(url):
+        engine = create_async_engine(url)
+    else:
+        engine = create_async_engine(url, poolclass=InstrumentedQueuePool, **pool_options)
+    instrument_engine(engine)
+    return engine
+
+
+def _pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,  # noqa
+            "timeout": pool.timeout(),
+            **pool.stats.as_dict(),
+        })
+    return status
 
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+    def __init__(self, url: str,
+                 replica_url: str | None = None,
+                 sticky_seconds: float = config.DB_READ_YOUR_WRITES_SECONDS,
+                 sticky_store: redis.Redis | None = None,
+                 pool_size: int = config.DB_POOL_SIZE,
+                 max_overflow: int = config.DB_MAX_OVERFLOW,
+                 pool_timeout: float = config.DB_POOL_TIMEOUT,
+                 pool_recycle: int = config.DB_POOL_RECYCLE,
+                 pool_pre_ping: bool = config.DB_POOL_PRE_PING):
+        pool_options = dict(pool_size=pool_size,
+                            max_overflow=max_overflow,
+                            pool_timeout=pool_timeout,
+                            pool_recycle=pool_recycle,
+                            pool_pre_ping=pool_pre_ping)
+        self._engine: AsyncEngine | None = _create_engine(url, **pool_options)
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
+                                                                     expire_on_commit=False,
+                                                                     class_=LazyConnectionSession,
                                                                      bind=self._engine)
+        self._replica_engine: AsyncEngine | None = None
+        self._replica_session_maker: async_sessionmaker | None = None
+        if replica_url:
+            self._replica_engine = _create_engine(replica_url, **pool_options)
+            self._replica_session_maker = async_sessionmaker(autoflush=False, autocommit=False,
+                                                             expire_on_commit=False,
+                                                             class_=LazyConnectionSession,
+                                                             bind=self._replica_engine)
+        self._sticky_seconds = sticky_seconds
+        self._sticky_store = sticky_store
 
     @contextlib.asynccontextmanager
-    async def session(self):
+    async def session(self, read_only: bool = False, client_key: str | None = None):
+        """
+        Open a session on the primary, or on the replica when read_only is set and one is configured.
+        A commit on a primary session made for client_key pins that client's reads to the primary
+        for the read-your-writes window, in every process sharing the sticky store.
+        """
         if self._session_maker is None:
             raise Exception("Session is not initialized")
-        session = self._session_maker()
+        if read_only and self._replica_session_maker is not None and not await self.is_sticky(client_key):
+            session = self._replica_session_maker()
+        else:
+            session = self._session_maker()
+            if client_key is not None and self._replica_session_maker is not None:
+                session.info["on_write_commit"] = functools.partial(self.mark_write, client_key)
         try:
             yield session
         except Exception as err:
@@ -26,14 +268,106 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    @staticmethod
+    def sticky_key(client_key: str) -> str:
+        return f"db:sticky:{client_key}"
+
+    async def mark_write(self, client_key: str):
+        """
+        Pin the client's reads to the primary; the marker expires in Redis after the window.
+        A failed write of the marker is logged, the client may then read the replica's lag.
+        """
+        if self._sticky_store is None:
+            return
+        try:
+            await self._sticky_store.set(self.sticky_key(client_key), 1, px=max(int(self._sticky_seconds * 1000), 1))
+        except redis.RedisError as err:
+            logger.warning("Read-your-writes marker was not set: %s", err)
+
+    async def is_sticky(self, client_key: str | None) -> bool:
+        if client_key is None or self._sticky_store is None:
+            return False
+        try:
+            return bool(await self._sticky_store.exists(self.sticky_key(client_key)))
+        except redis.RedisError as err:
+            # Without the marker a recent write can't be ruled out, the primary is always fresh
+            logger.warning("Read-your-writes marker was not read: %s", err)
+            return True
+
+    async def warm_up(self, connections: int):
+        """
+        Open up to `connections` pooled connections on every engine, so the first requests
+        after a deploy don't pay for connecting. The connections stay in the pool.
+        """
+        for engine in filter(None, (self._engine, self._replica_engine)):
+            pool = engine.pool
+            count = min(connections, pool.size()) if isinstance(pool, InstrumentedQueuePool) else 1
+            async with contextlib.AsyncExitStack() as stack:
+                opened = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(count)))
+                for connection in opened:
+                    await connection.execute(text("SELECT 1"))
+
+    async def close(self):
+        for engine in filter(None, (self._engine, self._replica_engine)):
+            await engine.dispose()
+        if self._sticky_store is not None:
+            await self._sticky_store.aclose()
+
     @property
     def engine(self):
         return self._engine
 
+    @property
+    def replica_engine(self):
+        return self._replica_engine
+
+    def pool_status(self) -> dict:
+        status = _pool_status(self._engine)
+        if self._replica_engine is not None:
+            status["replica"] = _pool_status(self._replica_engine)
+        return status
+
 
-sessionmanager = DatabaseSessionManager(config.DB_URL)
+sessionmanager = DatabaseSessionManager(
+    config.DB_URL, replica_url=config.DB_REPLICA_URL,
+    sticky_store=redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0,
+                             password=config.REDIS_PASSWORD,
+                             socket_timeout=config.DB_READ_YOUR_WRITES_REDIS_TIMEOUT,
+                             socket_connect_timeout=config.DB_READ_YOUR_WRITES_REDIS_TIMEOUT)
+    if config.DB_REPLICA_URL else None)
 
 
-async def get_db():
-    async with sessionmanager.session() as session:
+def client_key(request: Request) -> str | None:
+    """
+    Identify the user behind a request for read-your-writes stickiness.
+    The key is the access token's subject, so every token of one user shares the marker.
+    Requests without a valid access token have nothing to stick to.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, config.SECRET_KEY_JWT, algorithms=[config.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("scope") != "access_token" or payload.get("sub") is None:
+        return None
+    return hashlib.sha1(str(payload["sub"]).encode()).hexdigest()
+
+
+async def get_db(request: Request):
+    async with sessionmanager.session(client_key=client_key(request)) as session:
         yield session
+
+
+async def get_read_db(request: Request):
+    async with sessionmanager.session(read_only=True, client_key=client_key(request)) as session:
+        yield session
+
+
+def get_read_session_factory(request: Request):
+    """
+    Sessions for streaming responses. A yield dependency is closed before the response body is sent,
+    so a stream opens its own session from this factory and keeps it while it runs.
+    """
+    return functools.partial(sessionmanager.session, read_only=True, client_key=client_key(request))
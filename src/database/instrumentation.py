@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class RequestQueries:
+    """
+    Statements run and time spent in the database while handling one request.
+    Statements are grouped by their SQL text, so the same query shape with different
+    parameters counts as a repeat.
+    """
+
+    def __init__(self, route: str | None = None, repeat_threshold: int = config.DB_QUERY_REPEAT_THRESHOLD):
+        self.route = route
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter[str] = Counter()
+        self.warned: set[str] = set()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement] += 1
+        if self.shapes[statement] > self.repeat_threshold and statement not in self.warned:
+            self.warned.add(statement)
+            logger.warning("Possible N+1: %s ran the same statement more than %d times: %s",
+                           self.route, self.repeat_threshold, statement)
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+
+current_request_queries: ContextVar[RequestQueries | None] = ContextVar("current_request_queries", default=None)
+
+
+class SlowQueryLog:
+    """
+    Bounded ring of the most recent statements slower than the threshold.
+    The execution plan of each one is captured in a background task, so the request
+    that ran the slow statement doesn't wait for the EXPLAIN.
+    Each EXPLAIN takes a pool connection, so at most explain_concurrency of them run at once and
+    a plan is dropped when they are all busy; a statement explained within the last
+    explain_window seconds is not explained again. Such entries keep "plan": None.
+    """
+    EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+    def __init__(self, threshold_ms: float = config.SLOW_QUERY_THRESHOLD_MS, size: int = config.SLOW_QUERY_LOG_SIZE,
+                 explain_concurrency: int = config.SLOW_QUERY_EXPLAIN_CONCURRENCY,
+                 explain_window: float = config.SLOW_QUERY_EXPLAIN_WINDOW_SECONDS):
+        self.threshold = threshold_ms / 1000
+        self.entries: deque[dict] = deque(maxlen=size)
+        self.explain_window = explain_window
+        self.plans_dropped = 0
+        self.plans_deduplicated = 0
+        self._tasks: set[asyncio.Task] = set()
+        # Never waited on, so it isn't tied to an event loop like asyncio.Semaphore
+        self._explain_slots = threading.BoundedSemaphore(explain_concurrency)
+        self._explained_at: dict[str, float] = {}
+
+    @staticmethod
+    def normalize(statement: str) -> str:
+        statement = re.sub(r"\s+", " ", statement).strip()
+        # IN lists of any length are the same query shape
+        return re.sub(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*\)",
+                      "(...)", statement)
+
+    @staticmethod
+    def parameter_shapes(parameters, executemany: bool):
+        if executemany and parameters:
+            parameters = parameters[0]
+        if isinstance(parameters, dict):
+            return {key: type(value).__name__ for key, value in parameters.items()}
+        if isinstance(parameters, (list, tuple)):
+            return [type(value).__name__ for value in parameters]
+        return None
+
+    def record(self, conn, statement: str, parameters, executemany: bool, duration: float):
+        queries = current_request_queries.get()
+        entry = {
+            "statement": self.normalize(statement),
+            "parameters": self.parameter_shapes(parameters, executemany),
+            "duration_ms": round(duration * 1000, 3),
+            "route": queries.route if queries is not None else None,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "plan": None,
+        }
+        self.entries.append(entry)
+        if not statement.lstrip().upper().startswith(self.EXPLAINABLE):
+            logger.warning("Slow query %.1f ms on %s: %s", entry["duration_ms"], entry["route"], entry["statement"])
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        now = time.monotonic()
+        if now - self._explained_at.get(entry["statement"], float("-inf")) < self.explain_window:
+            self.plans_deduplicated += 1
+            logger.warning("Slow query %.1f ms on %s (plan logged earlier): %s",
+                           entry["duration_ms"], entry["route"], entry["statement"])
+            return
+        if not self._explain_slots.acquire(blocking=False):
+            self.plans_dropped += 1
+            logger.warning("Slow query %.1f ms on %s (plan dropped, EXPLAINs busy): %s",
+                           entry["duration_ms"], entry["route"], entry["statement"])
+            return
+        if len(self._explained_at) > 10_000:
+            self._explained_at = {key: at for key, at in self._explained_at.items() if now - at < self.explain_window}
+        self._explained_at[entry["statement"]] = now
+        task = loop.create_task(self._explain(AsyncEngine(conn.engine), entry, statement, parameters, executemany))
+        self._tasks.add(task)
+        task.add_done_callback(self._explain_done)
+
+    def _explain_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._explain_slots.release()
+
+    async def _explain(self, engine: AsyncEngine, entry: dict, statement: str, parameters, executemany: bool):
+        # The EXPLAIN belongs to no request and must not be counted against one
+        current_request_queries.set(None)
+        if executemany and parameters:
+            parameters = parameters[0]
+        explain = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(explain + statement, parameters)
+                entry["plan"] = [" ".join(str(column) for column in row) for row in result]
+        except Exception as err:
+            entry["plan"] = [f"EXPLAIN failed: {err}"]
+        logger.warning("Slow query %.1f ms on %s: %s\n%s", entry["duration_ms"], entry["route"], entry["statement"],
+                       "\n".join(entry["plan"]))
+
+    async def wait_for_plans(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    queries = current_request_queries.get()
+    if queries is not None:
+        queries.record(statement, duration)
+    if duration >= slow_query_log.threshold and not statement.lstrip().upper().startswith("EXPLAIN"):
+        slow_query_log.record(conn, statement, parameters, executemany, duration)
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_start_time"):
+        context.connection.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """
+    Count the statements an engine runs against the request that is currently being handled,
+    and record the slow ones in the slow query log.
+    """
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
@@ -1,16 +1,68 @@
 import enum
+import re
 from datetime import date
 from typing import Any
 
-from sqlalchemy import (Boolean, DateTime, Enum, ForeignKey, Integer, String,
-                        func)
+from sqlalchemy import (DDL, Boolean, DateTime, Enum, ForeignKey, Index,
+                        Integer, String, UniqueConstraint, event, func,
+                        literal_column)
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from src.conf.config import config
+
 
 class Base(DeclarativeBase):
     pass
 
 
+# SQLite stamps func.now() defaults as 'YYYY-MM-DD HH:MM:SS' text and compares timestamps as text, so bound
+# values are written the same way: with the default '.000000' suffix a stored second sorts before the bound
+# value of that same second, and keyset cursors and range filters skip the rows written in it.
+Timestamp = DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite')
+
+
+def birthday_key(value: date) -> int:
+    """
+    Month and day of a date as one sortable number, 18 April -> 418.
+    Unlike day-of-year it doesn't shift by one in leap years.
+    """
+    return value.month * 100 + value.day
+
+
+def _birthday_md_default(context) -> int | None:
+    birth_date = context.get_current_parameters().get("birth_date")
+    return birthday_key(birth_date) if birth_date else None
+
+
+def phone_e164(value: str) -> str:
+    """
+    A contact number in E.164 form, "+" followed by digits only, so that "(123) 456-7890" and
+    "123.456.7890" are the same number. Numbers without a country code get PHONE_DEFAULT_COUNTRY_CODE.
+    """
+    digits = re.sub(r"\D", "", value)
+    if value.lstrip().startswith("+"):
+        return f"+{digits}"
+    return f"+{config.PHONE_DEFAULT_COUNTRY_CODE}{digits}"
+
+
+def phone_reversed(value: str) -> str:
+    """
+    Digits of the E.164 number, last digit first: a search by the last digits becomes a prefix range on an index.
+    """
+    return phone_e164(value)[1:][::-1]
+
+
+def _phone_e164_default(context) -> str | None:
+    contact_number = context.get_current_parameters().get("contact_number")
+    return phone_e164(contact_number) if contact_number else None
+
+
+def _phone_reversed_default(context) -> str | None:
+    contact_number = context.get_current_parameters().get("contact_number")
+    return phone_reversed(contact_number) if contact_number else None
+
+
 class Contact(Base):
     __tablename__ = 'contacts'
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -18,12 +70,168 @@ class Contact(Base):
     last_name: Mapped[str] = mapped_column(String(15), nullable=False)
     email: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     contact_number: Mapped[str] = mapped_column(String(20), nullable=False, unique=True)
+    phone_e164: Mapped[str] = mapped_column(String(16), default=_phone_e164_default, nullable=True)
+    phone_reversed: Mapped[str] = mapped_column(String(15), default=_phone_reversed_default, nullable=True)
     birth_date: Mapped[date] = mapped_column(nullable=False)
+    birthday_md: Mapped[int] = mapped_column(Integer, default=_birthday_md_default, nullable=True)
     additional_information: Mapped[str] = mapped_column(String(250), nullable=True)
-    created_at: Mapped[date] = mapped_column(DateTime, default=func.now(), nullable=True)
-    update_at: Mapped[date] = mapped_column(DateTime, default=func.now(), onupdate=func.now(), nullable=True)
+    created_at: Mapped[date] = mapped_column(Timestamp, default=func.now(), nullable=True)
+    update_at: Mapped[date] = mapped_column(Timestamp, default=func.now(), onupdate=func.now(), nullable=True)
+    # Incremented by every UPDATE of the contact: the ETag of the contact and what If-Match is checked against
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
-    user: Mapped["User"] = relationship('User', backref="contacts", lazy="joined")
+    # Never loaded implicitly: reads join the owner only when it is asked for, writes attach the known owner
+    user: Mapped["User"] = relationship('User', backref="contacts", lazy="raise")
+
+    # Every repository query is scoped by user_id, these cover the extra filters used with it.
+    # The trailing id makes the name and created_at indexes serve keyset pagination as well.
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_first_name_id', 'user_id', 'first_name', 'id'),
+        Index('ix_contacts_user_id_last_name_id', 'user_id', 'last_name', 'id'),
+        Index('ix_contacts_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_contacts_user_id_email', 'user_id', 'email'),
+        Index('ix_contacts_user_id_birthday_md', 'user_id', 'birthday_md'),
+        Index('ix_contacts_user_id_phone_reversed', 'user_id', 'phone_reversed'),
+        # Delta sync reads what changed after a point in time
+        Index('ix_contacts_user_id_update_at', 'user_id', 'update_at'),
+        # The same number written in another format is still a duplicate
+        Index('ix_contacts_phone_e164', 'phone_e164', unique=True),
+        Index('ix_contacts_first_name_id', 'first_name', 'id'),
+        Index('ix_contacts_last_name_id', 'last_name', 'id'),
+        Index('ix_contacts_created_at_id', 'created_at', 'id'),
+    )
+
+
+# Names, email and phone as one lower-cased string: the text that contact search matches against.
+# Postgres indexes it with trigrams, SQLite keeps the same columns in an FTS5 trigram table.
+_SEARCH_SEPARATOR = literal_column("' '")
+contact_search_text = func.lower(Contact.first_name + _SEARCH_SEPARATOR + Contact.last_name + _SEARCH_SEPARATOR
+                                 + Contact.email + _SEARCH_SEPARATOR + Contact.contact_number)
+
+Index('ix_contacts_search_trgm', contact_search_text.label('search_text'),
+      postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+
+event.listen(Base.metadata, 'before_create',
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql'))
+
+CONTACTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, contact_number, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, contact_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.contact_number); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, contact_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.contact_number); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_update AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, contact_number) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.contact_number); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email, contact_number) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email, new.contact_number); END",
+]
+
+for _statement in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect='sqlite'))
+
+# users.contacts_version changes with every write to the user's contacts, whichever code path makes it:
+# it is the validator of the ETags of contact lists. SQLite bumps it per row, Postgres once per statement.
+CONTACTS_VERSION_DDL = {
+    'sqlite': [
+        "CREATE TRIGGER IF NOT EXISTS contacts_version_insert AFTER INSERT ON contacts BEGIN "
+        "UPDATE users SET contacts_version = contacts_version + 1 WHERE id = new.user_id; END",
+        "CREATE TRIGGER IF NOT EXISTS contacts_version_update AFTER UPDATE ON contacts BEGIN "
+        "UPDATE users SET contacts_version = contacts_version + 1 WHERE id IN (old.user_id, new.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS contacts_version_delete AFTER DELETE ON contacts BEGIN "
+        "UPDATE users SET contacts_version = contacts_version + 1 WHERE id = old.user_id; END",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION contacts_version_bump() RETURNS trigger AS $$ BEGIN "
+        "IF TG_OP <> 'DELETE' THEN UPDATE users SET contacts_version = contacts_version + 1 "
+        "WHERE id IN (SELECT user_id FROM new_contacts); END IF; "
+        "IF TG_OP <> 'INSERT' THEN UPDATE users SET contacts_version = contacts_version + 1 "
+        "WHERE id IN (SELECT user_id FROM old_contacts); END IF; "
+        "RETURN NULL; END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER contacts_version_insert AFTER INSERT ON contacts REFERENCING NEW TABLE AS new_contacts "
+        "FOR EACH STATEMENT EXECUTE FUNCTION contacts_version_bump()",
+        "CREATE TRIGGER contacts_version_update AFTER UPDATE ON contacts "
+        "REFERENCING OLD TABLE AS old_contacts NEW TABLE AS new_contacts "
+        "FOR EACH STATEMENT EXECUTE FUNCTION contacts_version_bump()",
+        "CREATE TRIGGER contacts_version_delete AFTER DELETE ON contacts REFERENCING OLD TABLE AS old_contacts "
+        "FOR EACH STATEMENT EXECUTE FUNCTION contacts_version_bump()",
+    ],
+}
+
+for _dialect, _statements in CONTACTS_VERSION_DDL.items():
+    for _statement in _statements:
+        event.listen(Contact.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Contact.__table__, 'after_drop',
+             DDL("DROP FUNCTION IF EXISTS contacts_version_bump()").execute_if(dialect='postgresql'))
+
+
+class ContactDuplicate(Base):
+    """
+    Two contacts of one user that are likely the same person, found by the duplicate scan.
+    contact_id is always the lower of the two ids.
+    """
+    __tablename__ = 'contact_duplicates'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    contact_id: Mapped[int] = mapped_column(Integer, ForeignKey('contacts.id', ondelete='CASCADE'), nullable=False)
+    duplicate_id: Mapped[int] = mapped_column(Integer, ForeignKey('contacts.id', ondelete='CASCADE'), nullable=False)
+    reason: Mapped[str] = mapped_column(String(20), nullable=False)
+    created_at: Mapped[date] = mapped_column(DateTime, default=func.now(), nullable=True)
+    contact: Mapped["Contact"] = relationship(Contact, foreign_keys=[contact_id], lazy="joined")
+    duplicate: Mapped["Contact"] = relationship(Contact, foreign_keys=[duplicate_id], lazy="joined")
+
+    __table_args__ = (
+        UniqueConstraint('contact_id', 'duplicate_id'),
+        Index('ix_contact_duplicates_user_id_id', 'user_id', 'id'),
+        Index('ix_contact_duplicates_duplicate_id', 'duplicate_id'),
+    )
+
+
+class ContactTombstone(Base):
+    """
+    A deleted contact, kept for delta sync so clients learn about the deletion.
+    Written by a trigger on contacts, whichever code path deletes the contact.
+    """
+    __tablename__ = 'contact_tombstones'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    contact_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    deleted_at: Mapped[date] = mapped_column(Timestamp, default=func.now(), server_default=func.now(),
+                                             nullable=False)
+
+    __table_args__ = (
+        Index('ix_contact_tombstones_user_id_deleted_at', 'user_id', 'deleted_at'),
+    )
+
+
+# Created once both tables exist. Contacts without an owner are never synced, so they leave no tombstone.
+CONTACT_TOMBSTONES_DDL = {
+    'sqlite': [
+        "CREATE TRIGGER IF NOT EXISTS contacts_tombstone AFTER DELETE ON contacts WHEN old.user_id IS NOT NULL "
+        "BEGIN INSERT INTO contact_tombstones (contact_id, user_id, deleted_at) "
+        "VALUES (old.id, old.user_id, CURRENT_TIMESTAMP); END",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION contacts_tombstone() RETURNS trigger AS $$ BEGIN "
+        "INSERT INTO contact_tombstones (contact_id, user_id, deleted_at) "
+        "SELECT id, user_id, now() FROM old_contacts WHERE user_id IS NOT NULL; "
+        "RETURN NULL; END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER contacts_tombstone AFTER DELETE ON contacts REFERENCING OLD TABLE AS old_contacts "
+        "FOR EACH STATEMENT EXECUTE FUNCTION contacts_tombstone()",
+    ],
+}
+
+for _dialect, _statements in CONTACT_TOMBSTONES_DDL.items():
+    for _statement in _statements:
+        event.listen(Base.metadata, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Base.metadata, 'after_drop',
+             DDL("DROP FUNCTION IF EXISTS contacts_tombstone()").execute_if(dialect='postgresql'))
 
 
 class Role(enum.Enum):
@@ -45,3 +253,5 @@ class User(Base):
     role: Mapped[Enum] = mapped_column(Enum(Role), default=Role.user, nullable=True)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
     reset_token: Mapped[str] = mapped_column(String, nullable=True)
+    # Bumped by triggers on contacts, see CONTACTS_VERSION_DDL
+    contacts_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
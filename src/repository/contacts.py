@@ -1,32 +1,137 @@
+import base64
+import json
+import re
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
 from fastapi import HTTPException
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import (DateTime, and_, bindparam, case, cast, column, delete,
+                        false, func, insert, literal_column, or_, select,
+                        table, tuple_, update)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Row, RowMapping
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
 from starlette import status
 
-from src.entity.models import Contact, User
-from src.schemas.schemas import ContactModel
+from src.conf import messages
+from src.conf.config import config
+from src.entity.models import (Contact, ContactTombstone, User, birthday_key,
+                               contact_search_text, phone_e164, phone_reversed)
+from src.schemas.schemas import (ContactFilter, ContactModel, ContactPartialModel,
+                                 ContactProjection, ContactSort)
+from src.services.contacts_cache import contacts_cache
+from src.services.typeahead import typeahead_index
+
+contacts_table = Contact.__table__
+users_table = User.__table__
+
+"""
+Вибірка лише потрібних полів контакту (?fields=, ?include=user).
+"""
+
+# The columns of UserResponse, selected as user__<name> when the owners are joined into contact rows
+USER_ROW_COLUMNS = {name: users_table.c[name] for name in ("id", "username", "email", "avatar", "role")}
+
+
+def select_contact_rows(projection: ContactProjection | None, join_user: bool, *columns: str):
+    """
+    The select_contact_rows function starts a Core select of plain contact rows for list reads:
+    only the projected columns, plus the columns the query itself needs, such as the sort key of a page.
+    The owner's columns are joined in, as user__<name>, only when they are asked for and join_user is set.
+
+    :param projection: ContactProjection | None: The requested fields, None selects every field
+    :param join_user: bool: Join the owners in, for reads across all users
+    :param columns: str: Names of extra contact columns to select
+    :return: A select statement over contacts
+    """
+    names = (projection or ContactProjection()).columns()
+    selected = [contacts_table.c[name] for name in dict.fromkeys([*names, *columns])]
+    if projection is None or not (projection.include_user and join_user):
+        return select(*selected)
+    selected += [column.label(f"user__{name}") for name, column in USER_ROW_COLUMNS.items()]
+    return select(*selected).select_from(contacts_table.outerjoin(users_table,
+                                                                  contacts_table.c.user_id == users_table.c.id))
+
+
+
+def contact_load_options(projection: ContactProjection | None) -> list:
+    """
+    The contact_load_options function makes an ORM read of the user's own contacts select only the projected
+    columns. The owner is never joined: it is the current user, whom the caller already has.
+
+    :param projection: ContactProjection | None: The requested fields, None loads every column
+    :return: A list of loader options for select(Contact)
+    """
+    if projection is None:
+        return []
+    return [load_only(*(getattr(Contact, name) for name in projection.columns()))]
+
+
+"""
+Версії для умовних запитів (ETag / If-None-Match).
+"""
+
+
+async def get_contacts_version(current_user: User, db: AsyncSession) -> int:
+    """
+    The get_contacts_version function reads the user's contacts version, which the database bumps
+    on every write to the user's contacts. Only the users row is read, no contact is loaded.
+
+    :param current_user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The current version
+    """
+    result = await db.execute(select(users_table.c.contacts_version).where(users_table.c.id == current_user.id))
+    return result.scalar_one()
+
+
+async def get_contact_version(contact_id: int, current_user: User, db: AsyncSession) -> int | None:
+    """
+    The get_contact_version function reads a single contact's version, its ETag, without loading the contact.
+
+    :param contact_id: int: Identify the contact
+    :param current_user: User: Ensure that the user only reads their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The version, None if the user has no contact with this id
+    """
+    statement = (select(contacts_table.c.version)
+                 .where(contacts_table.c.id == contact_id, contacts_table.c.user_id == current_user.id))
+    result = await db.execute(statement)
+    return result.scalar_one_or_none()
+
 
 """
 Отримати список всіх контактів.
 """
 
 
-async def get_contacts(limit: int, offset: int, db: AsyncSession, current_user: User) -> list[Contact]:
+@contacts_cache.cached("contacts", config.CONTACTS_CACHE_LIST_TTL)
+async def get_contacts(limit: int, offset: int, db: AsyncSession, current_user: User,
+                       projection: ContactProjection | None = None, cache_version: int | None = None) -> list[Row]:
     """
     The get_contacts function returns a list of contacts for the current user.
+    Plain rows are returned, not ORM objects, for the route to serialize directly.
         
     
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip
     :param db: AsyncSession: Pass in the database connection to the function
     :param current_user: User: Filter the contacts by user
-    :return: A list of contact
+    :param projection: ContactProjection | None: Select only the requested fields
+    :param cache_version: int | None: The user's contacts version read for the ETag, cache the read under it
+    :return: A list of contact rows
     :doc-author: Trelent
     """
-    search = select(Contact).filter_by(user=current_user).offset(offset).limit(limit)
+    search = (select_contact_rows(projection, False)
+              .where(contacts_table.c.user_id == current_user.id)
+              .offset(offset)
+              .limit(limit))
     result = await db.execute(search)
-    contact = result.scalars().all()
+    contact = result.all()
     return contact  # noqa
 
 
@@ -35,23 +140,265 @@ async def get_contacts(limit: int, offset: int, db: AsyncSession, current_user:
 """
 
 
-async def get_all_contacts(limit: int, offset: int, db: AsyncSession) -> list[Contact]:
+async def get_all_contacts(limit: int, offset: int, db: AsyncSession,
+                           projection: ContactProjection | None = None) -> list[Row]:
     """
     The get_all_contacts function returns a list of all contacts in the database.
+    Plain rows are returned, not ORM objects, for the route to serialize directly.
         
     
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Skip the first n rows
     :param db: AsyncSession: Pass the database session to the function
-    :return: A list of contact objects
+    :param projection: ContactProjection | None: Select only the requested fields, join the owners if asked
+    :return: A list of contact rows
     :doc-author: Trelent
     """
-    search = select(Contact).offset(offset).limit(limit)
+    search = select_contact_rows(projection, True).offset(offset).limit(limit)
     result = await db.execute(search)
-    contact = result.scalars().all()
+    contact = result.all()
     return contact  # noqa
 
 
+"""
+Отримати сторінку контактів за курсором (keyset pagination).
+"""
+
+CONTACT_SORT_COLUMNS = {
+    ContactSort.id: Contact.id,
+    ContactSort.last_name: Contact.last_name,
+    ContactSort.first_name: Contact.first_name,
+    ContactSort.created_at: Contact.created_at,
+}
+
+
+def encode_cursor(sort: ContactSort, contact: Contact | Row) -> str:
+    """
+    The encode_cursor function builds an opaque cursor pointing right after the given contact.
+
+    :param sort: ContactSort: The sort key the page was ordered by
+    :param contact: Contact | Row: The last contact of the page
+    :return: A url-safe string
+    """
+    value = getattr(contact, sort.value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort.value, value, contact.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: ContactSort) -> tuple:
+    """
+    The decode_cursor function reads the sort value and id back from a cursor made by encode_cursor.
+
+    :param cursor: str: The cursor sent by the client
+    :param sort: ContactSort: The sort key of the requested page, it must match the cursor
+    :return: A tuple of the sort value and the contact id
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, contact_id = json.loads(raw)
+        if cursor_sort != sort.value or type(contact_id) is not int:
+            raise ValueError
+        if sort == ContactSort.created_at:
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, int if sort == ContactSort.id else str) or isinstance(value, bool):
+            # The value is bound against the sort column, a value of another type must not reach the query
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return value, contact_id
+
+
+@contacts_cache.cached("page", config.CONTACTS_CACHE_LIST_TTL)
+async def get_contacts_page(limit: int, cursor: str | None, sort: ContactSort, db: AsyncSession,
+                            current_user: User | None = None,
+                            filters: ContactFilter | None = None,
+                            projection: ContactProjection | None = None,
+                            cache_version: int | None = None) -> tuple[list[Row], str | None]:
+    """
+    The get_contacts_page function returns one page of contacts ordered by (sort key, id).
+    Instead of skipping rows with an offset it continues right after the cursor, so every page
+    is a single index range read no matter how deep the client pages.
+    Contacts without a created_at value are not returned when sorting by created_at.
+    Plain rows are returned, not ORM objects, for the route to serialize directly.
+
+    :param limit: int: Limit the number of contacts returned
+    :param cursor: str | None: The next_cursor of the previous page, None for the first page
+    :param sort: ContactSort: Column to order the contacts by
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User | None: Only return contacts of this user, None returns contacts of all users
+    :param filters: ContactFilter | None: Only return contacts matching every supplied filter
+    :param projection: ContactProjection | None: Select only the requested fields, join the owners if asked
+        and current_user is None
+    :param cache_version: int | None: The user's contacts version read for the ETag, cache the read under it
+    :return: A list of contact rows and the cursor of the next page, None if this is the last page
+    """
+    column = CONTACT_SORT_COLUMNS[sort]
+    # The cursor is made from the sort key, select it even if it wasn't asked for
+    search = select_contact_rows(projection, current_user is None, "id", sort.value)
+    if current_user is not None:
+        search = search.where(contacts_table.c.user_id == current_user.id)
+    if filters is not None:
+        search = search.where(*contact_filters(filters))
+    if cursor:
+        value, contact_id = decode_cursor(cursor, sort)
+        if sort == ContactSort.id:
+            search = search.where(Contact.id > contact_id)
+        else:
+            # Bound with the column's type, so the value is written like the stored ones (see Timestamp)
+            search = search.where(tuple_(column, Contact.id) > tuple_(bindparam(None, value, column.type), contact_id))
+    if sort == ContactSort.id:
+        search = search.order_by(Contact.id)
+    else:
+        search = search.order_by(column, Contact.id)
+    result = await db.execute(search.limit(limit + 1))
+    contacts = list(result.all())
+    next_cursor = encode_cursor(sort, contacts[limit - 1]) if len(contacts) > limit else None
+    return contacts[:limit], next_cursor
+
+
+"""
+Синхронізація змін (delta sync): змінені контакти і видалені (tombstones) після токена.
+"""
+
+tombstones_table = ContactTombstone.__table__
+
+
+def encode_sync_token(moment: datetime) -> str:
+    """
+    The encode_sync_token function wraps the moment a sync read started into an opaque token.
+
+    :param moment: datetime: The database time of the sync read
+    :return: A url-safe string
+    """
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> datetime:
+    """
+    The decode_sync_token function reads the moment back from a token made by encode_sync_token.
+
+    :param token: str: The token sent by the client
+    :return: The moment of the previous sync read
+    """
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.SYNC_TOKEN_INVALID)
+
+
+async def get_contact_changes(since: datetime | None, current_user: User, db: AsyncSession,
+                              projection: ContactProjection | None = None) -> tuple[list[Row], list[int], datetime]:
+    """
+    The get_contact_changes function returns the user's contacts created or updated since the given moment,
+    read on the (user_id, update_at) index, and the ids of the contacts deleted since then, read from
+    the tombstones. Without a moment every contact is returned and no deletion.
+    The window starts config.SYNC_OVERLAP_SECONDS before the moment, so writes whose transaction committed
+    after the previous read, with an earlier update_at, are not missed; clients get such contacts twice.
+    A contact id that is both deleted and changed (SQLite can reuse the highest id) is only reported as changed.
+
+    :param since: datetime | None: The moment of the previous sync read, None for a full sync
+    :param current_user: User: Ensure that the user only gets their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param projection: ContactProjection | None: Select only the requested fields
+    :return: The changed contact rows, the deleted contact ids and the moment of this read
+    """
+    # update_at is a timestamp without time zone, written with the database clock
+    now = func.now() if db.bind.dialect.name == "sqlite" else cast(func.now(), DateTime)
+    moment = (await db.execute(select(now))).scalar_one()
+    search = select_contact_rows(projection, False).where(contacts_table.c.user_id == current_user.id)
+    if since is None:
+        result = await db.execute(search.order_by(contacts_table.c.id))
+        return result.all(), [], moment
+    # At least a second: SQLite stamps update_at with whole seconds, a write in the token's second comes after it
+    start = since - timedelta(seconds=max(config.SYNC_OVERLAP_SECONDS, 1))
+    search = (search.where(contacts_table.c.update_at >= start)
+              .order_by(contacts_table.c.update_at, contacts_table.c.id))
+    changed = (await db.execute(search)).all()
+    statement = (select(tombstones_table.c.contact_id)
+                 .where(tombstones_table.c.user_id == current_user.id, tombstones_table.c.deleted_at >= start)
+                 .order_by(tombstones_table.c.deleted_at, tombstones_table.c.id))
+    changed_ids = {row.id for row in changed}
+    deleted = [contact_id for contact_id in dict.fromkeys((await db.execute(statement)).scalars().all())
+               if contact_id not in changed_ids]
+    return changed, deleted, moment
+
+
+"""
+Запис контакту одним запитом. Конфлікти унікальності визначаються обмеженнями бази даних.
+"""
+
+
+def contact_values(body: ContactModel) -> dict:
+    """
+    The contact_values function turns a request body into the column values written for a contact.
+
+    :param body: ContactModel: The validated request body
+    :return: A dictionary of column values
+    """
+    return dict(first_name=body.first_name,
+                last_name=body.last_name,
+                email=body.email,
+                contact_number=body.contact_number,
+                phone_e164=phone_e164(body.contact_number),
+                phone_reversed=phone_reversed(body.contact_number),
+                birth_date=body.birth_date,
+                birthday_md=birthday_key(body.birth_date),
+                additional_information=body.additional_information)
+
+
+def conflict_field(err: IntegrityError) -> str | None:
+    """
+    The conflict_field function tells which unique column a failed write collided on.
+    Postgres names the constraint (contacts_contact_number_key), SQLite the column (contacts.contact_number).
+    A number that is only written differently collides on the normalized phone_e164 instead.
+
+    :param err: IntegrityError: The error raised by the write
+    :return: "contact_number", "email", or None for any other integrity error
+    """
+    message = str(err.orig)
+    if "contact_number" in message or "phone_e164" in message:
+        return "contact_number"
+    if "email" in message:
+        return "email"
+    return None
+
+
+def raise_conflict(err: IntegrityError, email_detail: str, number_detail: str):
+    """
+    The raise_conflict function turns a unique-constraint violation into a 409 response,
+    any other integrity error is raised again unchanged.
+
+    :param err: IntegrityError: The error raised by the write
+    :param email_detail: str: Message used when the email is taken
+    :param number_detail: str: Message used when the contact number is taken
+    :return: Never returns
+    """
+    field = conflict_field(err)
+    if field is None:
+        raise err
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                        detail=number_detail if field == "contact_number" else email_detail)
+
+
+async def _write_contact(statement, current_user: User, db: AsyncSession,
+                         email_detail: str, number_detail: str) -> Contact | None:
+    try:
+        result = await db.execute(statement)
+        contact = result.scalar_one_or_none()
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        raise_conflict(err, email_detail, number_detail)
+    if contact is not None:
+        # RETURNING only brings the contact's own columns, the owner is already known
+        set_committed_value(contact, "user", current_user)
+        typeahead_index.contact_written(current_user.id, contact.id, contact.first_name, contact.last_name,
+                                        contact.email)
+    return contact
+
+
 """
 Створити новий контакт.
 """
@@ -59,7 +406,8 @@ async def get_all_contacts(limit: int, offset: int, db: AsyncSession) -> list[Co
 
 async def create_contact(body: ContactModel, current_user: User, db: AsyncSession) -> Contact:
     """
-    The create_contact function creates a new contact in the database.
+    The create_contact function creates a new contact in the database with a single INSERT ... RETURNING.
+    Duplicates are detected by the unique constraints, atomically, instead of by separate lookups.
     
     :param body: ContactModel: Get the data from the request body
     :param current_user: User: Get the user that is currently logged in
@@ -67,28 +415,89 @@ async def create_contact(body: ContactModel, current_user: User, db: AsyncSessio
     :return: An object of type contact
     :doc-author: Trelent
     """
-    contact = Contact(
-        first_name=body.first_name,
-        last_name=body.last_name,
-        email=body.email,
-        contact_number=body.contact_number,
-        birth_date=body.birth_date,
-        additional_information=body.additional_information,
-        user=current_user
-    )
-
-    db.add(contact)
-    await db.commit()
-    await db.refresh(contact)
+    values = contact_values(body)
+    contact = await _write_contact(insert(Contact).values(**values, user_id=current_user.id).returning(Contact),
+                                   current_user, db, email_detail=messages.CONTACT_EMAIL_EXISTS,
+                                   number_detail=messages.CONTACT_NUMBER_EXISTS)
     return contact
 
 
+"""
+Масове додавання контактів (імпорт).
+"""
+
+
+async def insert_contacts_batch(rows: list[dict], current_user: User, db: AsyncSession) -> set[str]:
+    """
+    The insert_contacts_batch function inserts a batch of contacts with one multi-row INSERT.
+    Rows whose email or contact number already exists are skipped by ON CONFLICT DO NOTHING,
+    so one duplicate doesn't fail the whole batch.
+
+    :param rows: list[dict]: Column values of the contacts, as made by contact_values
+    :param current_user: User: The owner of the new contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The emails of the contacts that were inserted
+    """
+    if not rows:
+        return set()
+    dialect_insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    statement = (dialect_insert(contacts_table)
+                 .values([{**row, "user_id": current_user.id} for row in rows])
+                 .on_conflict_do_nothing()
+                 .returning(contacts_table.c.email))
+    result = await db.execute(statement)
+    inserted = set(result.scalars().all())
+    await db.commit()
+    if inserted:
+        # Cheaper to rebuild on the next lookup than to add a whole batch one contact at a time
+        typeahead_index.invalidate(current_user.id)
+    return inserted
+
+
+"""
+Потокове читання контактів (експорт).
+"""
+
+EXPORT_COLUMNS = [contacts_table.c.id,
+                  contacts_table.c.first_name,
+                  contacts_table.c.last_name,
+                  contacts_table.c.email,
+                  contacts_table.c.contact_number,
+                  contacts_table.c.birth_date,
+                  contacts_table.c.additional_information,
+                  contacts_table.c.created_at,
+                  contacts_table.c.update_at,
+                  contacts_table.c.user_id]
+
+
+async def stream_contacts(batch_size: int, db: AsyncSession,
+                          current_user: User | None = None) -> AsyncIterator[list[RowMapping]]:
+    """
+    The stream_contacts function reads contacts through a server-side cursor, batch_size rows at a time,
+    so only one batch is held in memory however large the table is.
+    Plain columns are selected: the owner isn't joined in.
+
+    :param batch_size: int: Number of rows fetched per batch
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User | None: The owner of the contacts, all contacts when None
+    :return: An async iterator of batches of row mappings, ordered by id
+    """
+    statement = select(*EXPORT_COLUMNS).order_by(contacts_table.c.id).execution_options(yield_per=batch_size)
+    if current_user is not None:
+        statement = statement.where(contacts_table.c.user_id == current_user.id)
+    result = await db.stream(statement)
+    async for batch in result.mappings().partitions():
+        yield batch
+
+
 """
 Отримати один контакт за ідентифікатором.
 """
 
 
-async def get_contact(contact_id: int, current_user: User, db: AsyncSession) -> Contact:
+@contacts_cache.cached("contact", config.CONTACTS_CACHE_TTL)
+async def get_contact(contact_id: int, current_user: User, db: AsyncSession,
+                      projection: ContactProjection | None = None, cache_version: int | None = None) -> Contact:
     """
     The get_contact function returns a contact object from the database.
         Args:
@@ -99,194 +508,468 @@ async def get_contact(contact_id: int, current_user: User, db: AsyncSession) ->
     :param contact_id: int: Specify the id of the contact to be retrieved
     :param current_user: User: Ensure that the user is only able to get contacts that they own
     :param db: AsyncSession: Pass the database session to the function
+    :param projection: ContactProjection | None: Load only the requested fields, and the version
+    :param cache_version: int | None: The contact's version read for the ETag, cache the read under it
     :return: The contact object if it exists
     :doc-author: Trelent
     """
-    search = select(Contact).filter_by(id=contact_id, user=current_user)
+    options = [load_only(*(getattr(Contact, name) for name in [*projection.columns(), "version"]))] \
+        if projection is not None else []
+    search = select(Contact).filter_by(id=contact_id, user=current_user).options(*options)
     result = await db.execute(search)
     contact = result.scalar_one_or_none()
     return contact
 
 
+"""
+Оптимістичне блокування: If-Match перевіряється тим самим UPDATE, що і записує контакт.
+"""
+
+
+def version_condition(versions: list[int] | None) -> list:
+    """
+    The version_condition function turns the versions allowed by If-Match into a WHERE condition.
+
+    :param versions: list[int] | None: Versions the contact must have, None allows any version
+    :return: A list of conditions to AND together
+    """
+    return [] if versions is None else [contacts_table.c.version.in_(versions)]
+
+
+async def raise_if_version_mismatch(contact_id: int, current_user: User, db: AsyncSession):
+    """
+    The raise_if_version_mismatch function tells why a conditional write matched no row: it runs only then.
+    A contact that exists was changed by someone else since the client read it, which is a 412.
+
+    :param contact_id: int: Identify the contact
+    :param current_user: User: The owner of the contact
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None if the user has no contact with this id
+    """
+    if await get_contact_version(contact_id, current_user, db) is not None:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=messages.CONTACT_VERSION_MISMATCH)
+
+
 """
 Оновити існуючий контакт.
 """
 
 
-async def update_contact(contact_id: int, body: ContactModel, current_user: User, db: AsyncSession) -> Contact | None:
+async def update_contact(contact_id: int, body: ContactModel, current_user: User, db: AsyncSession,
+                         versions: list[int] | None = None) -> Contact | None:
     """
-    The update_contact function updates a contact in the database.
+    The update_contact function updates a contact in the database with a single UPDATE ... RETURNING.
+    Duplicates are detected by the unique constraints, atomically, instead of by separate lookups.
+    With versions (If-Match) the same UPDATE only writes a contact that still has one of them,
+    so a concurrent change is never overwritten and no row lock is taken.
     
     :param contact_id: int: Identify the contact to update
     :param body: ContactModel: Get the data from the request body
     :param current_user: User: Ensure that the user is only updating their own contacts
     :param db: AsyncSession: Pass the database session to the function
-    :return: A contact object, but i am not sure how to get the id from that
+    :param versions: list[int] | None: Versions the contact must have, None updates any version
+    :return: The updated contact object, None if the user has no contact with this id
     :doc-author: Trelent
     """
-    search = select(Contact).filter_by(id=contact_id, user=current_user)
-    result = await db.execute(search)
-    contact = result.scalar_one_or_none()
-    if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.contact_number = body.contact_number
-        contact.birth_date = body.birth_date
-        contact.additional_information = body.additional_information
-        await db.commit()
-        await db.refresh(contact)
+    values = contact_values(body)
+    statement = (update(Contact)
+                 .where(Contact.id == contact_id, Contact.user_id == current_user.id,
+                        *version_condition(versions))
+                 .values(**values, version=Contact.version + 1)
+                 .returning(Contact))
+    contact = await _write_contact(statement, current_user, db, email_detail=messages.CONTACT_NUMBER_EMAIL_EXISTS,
+                                   number_detail=messages.CONTACT_NUMBER_EMAIL_EXISTS)
+    if contact is None and versions is not None:
+        await raise_if_version_mismatch(contact_id, current_user, db)
     return contact
 
 
+"""
+Частково оновити існуючий контакт (PATCH).
+"""
+
+
+async def patch_contact(contact_id: int, body: ContactPartialModel, current_user: User,
+                        db: AsyncSession, versions: list[int] | None = None) -> dict | None:
+    """
+    The patch_contact function writes only the fields that were sent, with a single UPDATE ... RETURNING
+    on the contacts table, so no ORM object is loaded.
+    With versions (If-Match) only a contact that still has one of them is written.
+
+    :param contact_id: int: Identify the contact to update
+    :param body: ContactPartialModel: The fields to change
+    :param current_user: User: Ensure that the user is only updating their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param versions: list[int] | None: Versions the contact must have, None updates any version
+    :return: The updated contact as a dictionary, None if the user has no contact with this id
+    """
+    values = body.model_dump(exclude_unset=True)
+    if "birth_date" in values:
+        values["birthday_md"] = birthday_key(values["birth_date"])
+    if "contact_number" in values:
+        values["phone_e164"] = phone_e164(values["contact_number"])
+        values["phone_reversed"] = phone_reversed(values["contact_number"])
+    owned = (contacts_table.c.id == contact_id, contacts_table.c.user_id == current_user.id,
+             *version_condition(versions))
+    if values:
+        statement = (update(contacts_table).where(*owned)
+                     .values(**values, version=contacts_table.c.version + 1)
+                     .returning(*contacts_table.c))
+    else:
+        statement = select(*contacts_table.c).where(*owned)
+    try:
+        result = await db.execute(statement)
+        row = result.mappings().one_or_none()
+        await db.commit()
+    except IntegrityError as err:
+        await db.rollback()
+        raise_conflict(err, messages.CONTACT_NUMBER_EMAIL_EXISTS, messages.CONTACT_NUMBER_EMAIL_EXISTS)
+    if row is None:
+        if versions is not None:
+            await raise_if_version_mismatch(contact_id, current_user, db)
+        return None
+    if values:
+        typeahead_index.contact_written(current_user.id, row["id"], row["first_name"], row["last_name"], row["email"])
+    return {**row, "user": current_user}
+
+
 """
 Видалити контакт.
 """
 
 
-async def remove_contact(contact_id: int, current_user: User, db: AsyncSession) -> Contact | None:
+async def remove_contact(contact_id: int, current_user: User, db: AsyncSession) -> int | None:
     """
-    The remove_contact function removes a contact from the database.
+    The remove_contact function removes a contact from the database with a single DELETE ... RETURNING
+    scoped by the owner, without loading the contact first.
     
     :param contact_id: int: Identify the contact to be removed
     :param current_user: User: Ensure that the contact being deleted belongs to the user making the request
     :param db: AsyncSession: Pass the database session to the function
-    :return: A contact object
+    :return: The id of the removed contact, None if the user has no contact with this id
     :doc-author: Trelent
     """
-    search = select(Contact).filter_by(id=contact_id, user=current_user)
-    result = await db.execute(search)
-    contact = result.scalar_one_or_none()
-    if contact:
-        await db.delete(contact)
-        await db.commit()
-    return contact
+    statement = (delete(contacts_table)
+                 .where(contacts_table.c.id == contact_id, contacts_table.c.user_id == current_user.id)
+                 .returning(contacts_table.c.id))
+    result = await db.execute(statement)
+    deleted_id = result.scalar_one_or_none()
+    await db.commit()
+    if deleted_id is not None:
+        typeahead_index.contact_removed(current_user.id, deleted_id)
+    return deleted_id
 
 
 """
-Пошук контакту за ім'ям.
+Пакетні операції над контактами.
 """
 
 
-async def find_contact_by_first_name(contact_first_name: str, current_user: User, db: AsyncSession) -> list[Contact]:
+async def get_contacts_by_ids(contact_ids: list[int], current_user: User, db: AsyncSession) -> dict[int, Contact]:
     """
-    The find_contact_by_first_name function searches for a contact by first name.
-    
-    :param contact_first_name: str: Search for a contact by first name
-    :param current_user: User: Get the current user from the database
-    :param db: AsyncSession: Connect to the database
-    :return: A list of contact objects
-    :doc-author: Trelent
+    The get_contacts_by_ids function loads all requested contacts of the user with one IN (...) query.
+
+    :param contact_ids: list[int]: Identify the contacts to load
+    :param current_user: User: Ensure that the user only gets their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The found contacts by id, ids the user has no contact with are missing
     """
-    search = select(Contact).filter_by(first_name=contact_first_name, user=current_user)
-    result = await db.execute(search)
+    statement = select(Contact).where(Contact.id.in_(contact_ids), Contact.user_id == current_user.id)
+    result = await db.execute(statement)
+    contacts = {contact.id: contact for contact in result.scalars().all()}
+    for contact in contacts.values():
+        set_committed_value(contact, "user", current_user)
+    return contacts
+
+
+async def _update_one_by_one(statement, parameters: list[dict], errors: dict[int, tuple[int, str]],
+                             db: AsyncSession) -> list[dict]:
+    """
+    The _update_one_by_one function writes the items of a batch that collided with another user's contact
+    one at a time, each in a savepoint, and reports the colliding ones as conflicts.
 
+    :param statement: The UPDATE of one item
+    :param parameters: list[dict]: The values of each item
+    :param errors: dict[int, tuple[int, str]]: Where the conflicts are reported, by contact id
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The values of the items that were written
+    """
+    written = []
+    for values in parameters:
+        try:
+            async with db.begin_nested():
+                await db.execute(statement, [values])
+        except IntegrityError as err:
+            if conflict_field(err) is None:
+                await db.rollback()
+                raise err
+            errors[values["contact_id"]] = (status.HTTP_409_CONFLICT, messages.CONTACT_NUMBER_EMAIL_EXISTS)
+            continue
+        written.append(values)
+    return written
+
+
+async def update_contacts_batch(bodies: dict[int, ContactModel], current_user: User,
+                                db: AsyncSession) -> tuple[dict[int, Contact], dict[int, tuple[int, str]]]:
+    """
+    The update_contacts_batch function updates many contacts in one transaction.
+    One query locks the user's contacts that the batch updates or whose emails and numbers it takes,
+    one executemany UPDATE writes every item that can be written, one query reads the results back.
+    Only the user's own rows are locked; a value held by another user's contact is found by the unique
+    constraints, and then the items are written one by one, each in a savepoint, to tell which ones collide.
+    Items that would hit a unique constraint are reported instead of failing the whole batch.
+
+    :param bodies: dict[int, ContactModel]: The new data of each contact, by contact id
+    :param current_user: User: Ensure that the user is only updating their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The updated contacts by id, and (status code, detail) by id for the items that were not written
+    """
+    c = contacts_table.c
+    emails = {body.email for body in bodies.values()}
+    phones = {phone_e164(body.contact_number) for body in bodies.values()}
+    statement = (select(c.id, c.email, c.phone_e164)
+                 .where(c.user_id == current_user.id,
+                        or_(c.id.in_(bodies), c.email.in_(emails), c.phone_e164.in_(phones)))
+                 .with_for_update())
+    rows = (await db.execute(statement)).all()
+    owned = {row.id for row in rows if row.id in bodies}
+    email_holders = {row.email: row.id for row in rows}
+    phone_holders = {row.phone_e164: row.id for row in rows}
+
+    errors: dict[int, tuple[int, str]] = {}
+    parameters = []
+    for contact_id, body in bodies.items():
+        if contact_id not in owned:
+            errors[contact_id] = (status.HTTP_404_NOT_FOUND, messages.CONTACT_NOT_FOUND)
+        elif (email_holders.get(body.email, contact_id) != contact_id
+              or phone_holders.get(phone_e164(body.contact_number), contact_id) != contact_id):
+            errors[contact_id] = (status.HTTP_409_CONFLICT, messages.CONTACT_NUMBER_EMAIL_EXISTS)
+        else:
+            # Later items of the batch can't take the values this one writes
+            email_holders[body.email] = phone_holders[phone_e164(body.contact_number)] = contact_id
+            parameters.append({"contact_id": contact_id, **contact_values(body)})
+
+    statement = (update(contacts_table)
+                 .where(c.id == bindparam("contact_id"), c.user_id == current_user.id)
+                 .values(version=c.version + 1))
     try:
-        contacts = result.scalars().all()
-        if not contacts:
-            raise NoResultFound
-    except NoResultFound:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+        if parameters:
+            async with db.begin_nested():
+                await db.execute(statement, parameters)
+    except IntegrityError as err:
+        if conflict_field(err) is None:
+            await db.rollback()
+            raise err
+        parameters = await _update_one_by_one(statement, parameters, errors, db)
+    if not parameters:
+        await db.rollback()
+        return {}, errors
+    statement = (select(Contact)
+                 .where(Contact.id.in_([values["contact_id"] for values in parameters]))
+                 .execution_options(populate_existing=True))
+    result = await db.execute(statement)
+    updated = {contact.id: contact for contact in result.scalars().all()}
+    await db.commit()
+    for contact in updated.values():
+        set_committed_value(contact, "user", current_user)
+        typeahead_index.contact_written(current_user.id, contact.id, contact.first_name, contact.last_name,
+                                        contact.email)
+    return updated, errors
 
-    return contacts  # noqa
+
+async def remove_contacts_batch(contact_ids: list[int], current_user: User, db: AsyncSession) -> set[int]:
+    """
+    The remove_contacts_batch function removes many contacts with a single DELETE ... WHERE id IN (...) RETURNING.
+
+    :param contact_ids: list[int]: Identify the contacts to be removed
+    :param current_user: User: Ensure that the user only removes their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The ids of the removed contacts
+    """
+    statement = (delete(contacts_table)
+                 .where(contacts_table.c.id.in_(contact_ids), contacts_table.c.user_id == current_user.id)
+                 .returning(contacts_table.c.id))
+    result = await db.execute(statement)
+    deleted_ids = set(result.scalars().all())
+    await db.commit()
+    for contact_id in deleted_ids:
+        typeahead_index.contact_removed(current_user.id, contact_id)
+    return deleted_ids
 
 
 """
-Пошук контакту за прізвищем.
+Нечіткий пошук контактів за ім'ям, прізвищем, поштою і телефоном.
 """
 
+contacts_fts = table("contacts_fts", column("rowid"))
+
 
-async def find_contact_by_last_name(contact_last_name: str, current_user: User, db: AsyncSession) -> list[Contact]:
+def query_trigrams(text: str) -> list[str]:
     """
-    The find_contact_by_last_name function searches for a contact by last name.
-        Args:
-            contact_last_name (str): The last name of the desired contact.
-            current_user (User): The user who is making the request. This is used to ensure that only contacts belonging to this user are returned in the response.
-    
-    :param contact_last_name: str: Search for a contact by last name
-    :param current_user: User: Get the current user
-    :param db: AsyncSession: Pass the database session to the function
-    :return: A list of contacts
-    :doc-author: Trelent
+    The query_trigrams function splits a search query into the distinct three-character pieces it is matched by.
+
+    :param text: str: The lower-cased search query
+    :return: The trigrams of the query, in order of first appearance
     """
-    search = select(Contact).filter_by(last_name=contact_last_name, user=current_user)
-    result = await db.execute(search)
+    return list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
 
-    try:
-        contacts = result.scalars().all()
-        if not contacts:
-            raise NoResultFound
-    except NoResultFound:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
 
-    return contacts  # noqa
+@contacts_cache.cached("search", config.CONTACTS_CACHE_SEARCH_TTL)
+async def search_contacts(query: str, limit: int, offset: int, current_user: User, db: AsyncSession,
+                          projection: ContactProjection | None = None,
+                          cache_version: int | None = None) -> list[Contact]:
+    """
+    The search_contacts function finds the user's contacts whose names, email or phone match the query
+    by prefix, by substring or with a typo, ranked with prefix matches first and then by similarity.
+    Postgres matches the trigram-indexed contact_search_text (pg_trgm), SQLite the contacts_fts FTS5 table,
+    where a contact sharing more trigrams with the query gets a better bm25 rank.
+    Queries shorter than a trigram only match by prefix.
+
+    :param query: str: The text typed by the user
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Skip the first offset matches
+    :param current_user: User: Ensure that the user only finds their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param projection: ContactProjection | None: Load only the requested fields
+    :param cache_version: int | None: The user's contacts version read for the ETag, cache the read under it
+    :return: A page of matching contacts, best matches first
+    """
+    text = query.strip().lower()
+    prefix = or_(func.lower(Contact.first_name).startswith(text, autoescape=True),
+                 func.lower(Contact.last_name).startswith(text, autoescape=True),
+                 func.lower(Contact.email).startswith(text, autoescape=True),
+                 Contact.contact_number.startswith(text, autoescape=True))
+    prefix_rank = case((prefix, 0), else_=1)
+    statement = (select(Contact)
+                 .where(Contact.user_id == current_user.id)
+                 .options(*contact_load_options(projection)))
+    trigrams = query_trigrams(text)
+    if not trigrams:
+        statement = statement.where(prefix).order_by(prefix_rank, Contact.id)
+    elif db.bind.dialect.name == "postgresql":
+        statement = (statement
+                     .where(or_(contact_search_text.contains(text, autoescape=True),
+                                contact_search_text.op("%>")(text)))
+                     .order_by(prefix_rank, func.word_similarity(text, contact_search_text).desc(), Contact.id))
+    else:
+        match = " OR ".join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams)
+        statement = (statement
+                     .join(contacts_fts, contacts_fts.c.rowid == Contact.id)
+                     .where(literal_column("contacts_fts").op("MATCH")(match))
+                     .order_by(prefix_rank, func.bm25(literal_column("contacts_fts")), Contact.id))
+    result = await db.execute(statement.offset(offset).limit(limit))
+    return list(result.unique().scalars().all())
 
 
 """
-Пошук контакту за електронною поштою.
+Автодоповнення контактів.
 """
 
 
-async def find_contact_by_email(contact_email: str, current_user: User, db: AsyncSession) -> Contact:
+async def autocomplete_contacts(prefix: str, limit: int, current_user: User, db: AsyncSession) -> list[dict]:
     """
-    The find_contact_by_email function searches for a contact by email address.
-        Args:
-            contact_email (str): The email address of the desired Contact.
-            current_user (User): The User who is making the request. This is used to ensure that only Contacts belonging to this user are returned.
-            db (AsyncSession): An async database session object, which will be used to execute queries against the database and return results.
-    
-    :param contact_email: str: Find the contact by email
-    :param current_user: User: Ensure that the user is only able to access their own contacts
+    The autocomplete_contacts function suggests the user's contacts whose first name, last name, full name
+    or email starts with the prefix. Lookups are served from the in-process typeahead index,
+    the database is only read to build it on the user's first lookup.
+
+    :param prefix: str: The text typed so far
+    :param limit: int: Limit the number of suggestions returned
+    :param current_user: User: Ensure that the user only gets their own contacts
     :param db: AsyncSession: Pass the database session to the function
-    :return: The contact object
-    :doc-author: Trelent
+    :return: Suggestions with the id, names and email of each contact
     """
-    search = select(Contact).filter_by(email=contact_email, user=current_user)
-    result = await db.execute(search)
+    index = typeahead_index.get(current_user.id)
+    if index is None:
+        typeahead_index.start_build(current_user.id)
+        c = contacts_table.c
+        result = await db.execute(select(c.id, c.first_name, c.last_name, c.email).where(c.user_id == current_user.id))
+        index = typeahead_index.finish_build(current_user.id, result.all())
+    return index.suggest(prefix, limit)
 
-    try:
-        contact = result.scalar()
-        if not contact:
-            raise NoResultFound
-    except NoResultFound:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
 
-    return contact  # noqa
+"""
+Пошук контактів за будь-якою комбінацією фільтрів.
+"""
+
+CONTACT_FILTER_PREDICATES = {
+    "first_name": lambda value: Contact.first_name == value,
+    "last_name": lambda value: Contact.last_name == value,
+    "email": lambda value: Contact.email == value,
+    "phone": lambda value: Contact.phone_e164 == phone_e164(value),
+    "phone_suffix": lambda value: phone_suffix_range(value),
+    "birth_date_from": lambda value: Contact.birth_date >= value,
+    "birth_date_to": lambda value: Contact.birth_date <= value,
+    "created_from": lambda value: Contact.created_at >= value,
+    "created_to": lambda value: Contact.created_at <= value,
+    "updated_from": lambda value: Contact.update_at >= value,
+    "updated_to": lambda value: Contact.update_at <= value,
+}
+
+
+def phone_suffix_range(suffix: str):
+    """
+    The phone_suffix_range function matches numbers ending with the given digits ("caller ID" search)
+    as a range on the reversed digits, which an index can serve. The range holds only digit strings,
+    so it doesn't depend on the collation.
+
+    :param suffix: str: The last digits of the number, other characters are ignored
+    :return: A condition on phone_reversed, never true when the suffix has no digits
+    """
+    digits = re.sub(r"\D", "", suffix)
+    if not digits:
+        return false()
+    prefix = digits[::-1]
+    return Contact.phone_reversed.between(prefix, prefix + "9" * (15 - len(prefix)))
+
+
+def contact_filters(filters: ContactFilter) -> list:
+    """
+    The contact_filters function turns the supplied filters into WHERE conditions, one per filter that was sent.
+    Filters that were not sent add nothing to the query.
+
+    :param filters: ContactFilter: The filters from the request
+    :return: A list of conditions to AND together
+    """
+    return [CONTACT_FILTER_PREDICATES[name](value)
+            for name, value in filters.model_dump(exclude_none=True).items()]
 
 
 """
-API повинен мати змогу отримати список контактів з днями народження на найближчі 7 днів.
+API повинен мати змогу отримати список контактів з днями народження на найближчі N днів.
 """
 
 
-async def upcoming_birthdays(current_date, to_date, skip: int, limit: int, current_user: User, db: AsyncSession) -> \
-        list[Contact]:
+async def upcoming_birthdays(current_date, to_date, skip: int, limit: int, current_user: User, db: AsyncSession,
+                            projection: ContactProjection | None = None) -> list[Contact]:
     """
-    The upcoming_birthdays function returns a list of contacts whose birthdays fall between the current date and the to_date.
-    The skip and limit parameters are used for pagination.
+    The upcoming_birthdays function returns a list of contacts whose birthdays fall between the current date
+    and the to_date (both included), ordered by how soon the birthday comes.
+    The window is filtered in the database on the indexed birthday_md column, including windows that wrap
+    from December into January, and the skip and limit parameters paginate the matches.
     
     :param current_date: Get the current date
     :param to_date: Calculate the upcoming birthdays
-    :param skip: int: Skip the first n contacts in the database
+    :param skip: int: Skip the first n matching contacts
     :param limit: int: Limit the number of contacts returned
     :param current_user: User: Pass the current user to the function
     :param db: AsyncSession: Pass the database session to the function
+    :param projection: ContactProjection | None: Load only the requested fields
     :return: A list of contacts that have birthdays between the current date and the to_date
     :doc-author: Trelent
     """
-    search = select(Contact).filter_by(user=current_user).offset(skip).limit(limit)
+    start, end = birthday_key(current_date), birthday_key(to_date)
+    if start < end:
+        window = and_(Contact.birthday_md >= start, Contact.birthday_md <= end)
+    else:
+        # The window wraps around the new year (or covers the whole year)
+        window = or_(Contact.birthday_md >= start, Contact.birthday_md <= end)
+    this_year_first = case((Contact.birthday_md >= start, 0), else_=1)
+    search = (select(Contact)
+              .filter_by(user_id=current_user.id)
+              .where(window)
+              .options(*contact_load_options(projection))
+              .order_by(this_year_first, Contact.birthday_md, Contact.id)
+              .offset(skip)
+              .limit(limit))
     result = await db.execute(search)
-    contacts = result.scalars()
-
-    upcoming = []
-
-    for contact in contacts:
-
-        contact_birthday_month_day = (contact.birth_date.month, contact.birth_date.day)
-        current_date_month_day = (current_date.month, current_date.day)
-        to_date_month_day = (to_date.month, to_date.day)
-
-        if current_date_month_day < contact_birthday_month_day <= to_date_month_day:
-            upcoming.append(contact)
-
-    return upcoming
+    return list(result.scalars().all())
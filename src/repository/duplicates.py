@@ -0,0 +1,119 @@
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from starlette import status
+
+from src.conf import messages
+from src.entity.models import Contact, ContactDuplicate, User
+from src.services.typeahead import typeahead_index
+
+contacts_table = Contact.__table__
+
+
+async def get_dedupe_rows(user_id: int, db: AsyncSession) -> list:
+    """
+    The get_dedupe_rows function reads the columns the duplicate scan compares, for all contacts of a user.
+
+    :param user_id: int: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of rows with id, names, email, contact number and birth date
+    """
+    c = contacts_table.c
+    statement = (select(c.id, c.first_name, c.last_name, c.email, c.contact_number, c.birth_date)
+                 .where(c.user_id == user_id))
+    result = await db.execute(statement)
+    return list(result.all())
+
+
+async def get_user_ids_with_contacts(after_id: int, limit: int, db: AsyncSession) -> list[int]:
+    """
+    The get_user_ids_with_contacts function pages through the ids of users that have contacts, in id order.
+
+    :param after_id: int: Return only users with a greater id, 0 for the first page
+    :param limit: int: Limit the number of ids returned
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of user ids
+    """
+    statement = (select(contacts_table.c.user_id)
+                 .where(contacts_table.c.user_id > after_id)
+                 .group_by(contacts_table.c.user_id)
+                 .order_by(contacts_table.c.user_id)
+                 .limit(limit))
+    result = await db.execute(statement)
+    return list(result.scalars().all())
+
+
+async def replace_duplicates(user_id: int, pairs: dict[tuple[int, int], str], db: AsyncSession):
+    """
+    The replace_duplicates function stores the result of a scan in place of the user's previous one.
+
+    :param user_id: int: The owner of the contacts
+    :param pairs: dict[tuple[int, int], str]: The reason by (contact id, duplicate id)
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    """
+    await db.execute(delete(ContactDuplicate).where(ContactDuplicate.user_id == user_id))
+    if pairs:
+        await db.execute(insert(ContactDuplicate),
+                         [{"user_id": user_id, "contact_id": contact_id, "duplicate_id": duplicate_id, "reason": reason}
+                          for (contact_id, duplicate_id), reason in pairs.items()])
+    await db.commit()
+
+
+async def get_duplicates(limit: int, offset: int, current_user: User, db: AsyncSession) -> list[ContactDuplicate]:
+    """
+    The get_duplicates function returns the stored duplicate pairs of the user with both contacts loaded.
+
+    :param limit: int: Limit the number of pairs returned
+    :param offset: int: Skip the first offset pairs
+    :param current_user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of duplicate pairs
+    """
+    statement = (select(ContactDuplicate)
+                 .where(ContactDuplicate.user_id == current_user.id)
+                 .order_by(ContactDuplicate.id)
+                 .offset(offset)
+                 .limit(limit))
+    result = await db.execute(statement)
+    duplicates = list(result.unique().scalars().all())
+    for duplicate in duplicates:
+        set_committed_value(duplicate.contact, "user", current_user)
+        set_committed_value(duplicate.duplicate, "user", current_user)
+    return duplicates
+
+
+async def merge_duplicate(duplicate_id: int, keep_id: int, current_user: User, db: AsyncSession) -> Contact | None:
+    """
+    The merge_duplicate function merges a duplicate pair into the contact to keep: the other contact's
+    additional information is appended to it, then the other contact and every pair it was part of are removed.
+
+    :param duplicate_id: int: Identify the duplicate pair
+    :param keep_id: int: The contact of the pair that stays
+    :param current_user: User: Ensure that the user only merges their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The kept contact, None if the user has no duplicate pair with this id
+    """
+    statement = select(ContactDuplicate).where(ContactDuplicate.id == duplicate_id,
+                                               ContactDuplicate.user_id == current_user.id)
+    pair = (await db.execute(statement)).unique().scalar_one_or_none()
+    if pair is None:
+        return None
+    if keep_id not in (pair.contact_id, pair.duplicate_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.DUPLICATE_KEEP_INVALID)
+    keep, drop = (pair.contact, pair.duplicate) if keep_id == pair.contact_id else (pair.duplicate, pair.contact)
+
+    notes = "\n".join(filter(None, (keep.additional_information, drop.additional_information)))
+    await db.execute(delete(ContactDuplicate).where(or_(ContactDuplicate.contact_id == drop.id,
+                                                        ContactDuplicate.duplicate_id == drop.id)))
+    await db.execute(delete(contacts_table).where(contacts_table.c.id == drop.id))
+    statement = (update(Contact)
+                 .where(Contact.id == keep.id)
+                 .values(additional_information=notes[:250] or None, version=Contact.version + 1)
+                 .returning(Contact))
+    contact = (await db.execute(statement)).scalar_one()
+    await db.commit()
+    set_committed_value(contact, "user", current_user)
+    typeahead_index.contact_removed(current_user.id, drop.id)
+    return contact
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, status
+
+from src.conf.config import config
+from src.database.db import SessionScopedRoute, sessionmanager
+from src.database.instrumentation import slow_query_log
+from src.entity.models import Role
+from src.services.contacts_cache import contacts_cache
+from src.services.duplicates import run_duplicate_scan
+from src.services.roles import RoleAccess
+
+router = APIRouter(prefix='/admin', tags=['Admin'], route_class=SessionScopedRoute)
+
+access_to_route_admin = RoleAccess([Role.admin])
+
+"""
+Router.
+Останні повільні SQL-запити з планами виконання. admin
+"""
+
+
+@router.get("/slow-queries",
+            dependencies=[Depends(access_to_route_admin)])
+async def get_slow_queries(limit: int = Query(50, ge=1, le=config.SLOW_QUERY_LOG_SIZE)):
+    entries = list(slow_query_log.entries)[-limit:]
+    return {"threshold_ms": slow_query_log.threshold * 1000, "plans_dropped": slow_query_log.plans_dropped,
+            "plans_deduplicated": slow_query_log.plans_deduplicated, "queries": entries[::-1]}
+
+
+"""
+Router.
+Лічильники влучань і промахів кешу читань контактів (цього процесу). admin
+"""
+
+
+@router.get("/contacts-cache",
+            dependencies=[Depends(access_to_route_admin)])
+async def get_contacts_cache_stats():
+    return contacts_cache.summary()
+
+
+"""
+Router.
+Стан пулу з'єднань з базою даних (цього процесу). admin
+"""
+
+
+@router.get("/pool",
+            dependencies=[Depends(access_to_route_admin)])
+async def get_pool_status():
+    return sessionmanager.pool_status()
+
+
+"""
+Router.
+Пошук дублікатів контактів для всіх користувачів (у фоні, частинами). admin
+"""
+
+
+@router.post("/duplicates/scan",
+             status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Depends(access_to_route_admin)])
+async def scan_all_duplicates(background_tasks: BackgroundTasks):
+    background_tasks.add_task(run_duplicate_scan)
+    return {"status": "scheduled"}
@@ -6,14 +6,14 @@ from fastapi.security import (HTTPAuthorizationCredentials, HTTPBearer,
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
-from src.database.db import get_db
+from src.database.db import SessionScopedRoute, get_db
 from src.repository import users as repository_users
 from src.schemas.schemas import PasswordReset, PasswordResetRequest
 from src.schemas.user import RequestEmail, TokenModel, UserModel, UserResponse
 from src.services.auth import auth_service
 from src.services.email import send_email, send_password_reset_email
 
-router = APIRouter(prefix='/auth', tags=["Authorization"])
+router = APIRouter(prefix='/auth', tags=["Authorization"], route_class=SessionScopedRoute)
 get_refresh_token = HTTPBearer()
 
 
@@ -1,59 +1,361 @@
 import pathlib
+import shutil
+import tempfile
 from datetime import date, timedelta
 
-from fastapi import (APIRouter, Depends, File, HTTPException, Path, Query,
+from fastapi import (APIRouter, BackgroundTasks, Depends, File,
+                     HTTPException, Path, Query, Request, Response,
                      UploadFile, status)
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from src.conf import messages
-from src.database.db import get_db
-from src.entity.models import Contact, Role, User
+from src.conf.config import config
+from src.database.db import (SessionScopedRoute, get_db, get_read_db,
+                             get_read_session_factory)
+from src.entity.models import Role, User
 from src.repository import contacts as repository_contacts
-from src.schemas.schemas import ContactModel, ContactResponse
+from src.repository import duplicates as repository_duplicates
+from src.schemas.schemas import (ContactBatchIds, ContactBatchResponse,
+                                 ContactBatchResult, ContactBatchUpdate,
+                                 ContactChanges, ContactDuplicateResponse,
+                                 ContactField,
+                                 ContactFilter, ContactModel, ContactPage,
+                                 ContactPartialModel, ContactProjection,
+                                 ContactResponse, ContactSort,
+                                 ContactSparseResponse, ContactSuggestion,
+                                 ExportFormat, ImportFormat, ImportReport)
+from src.services import contacts_export
 from src.services.auth import auth_service
+from src.services.contacts_import import (ContactImport, import_jobs,
+                                          run_import_job)
+from src.services.duplicates import run_duplicate_scan
+from src.services.etag import (contact_etag, etag_matches, if_match_versions,
+                               make_etag, not_modified)
 from src.services.roles import RoleAccess
+from src.services.serialization import (changes_response, contacts_response,
+                                        user_item)
 
-router = APIRouter(prefix='/contacts')
+router = APIRouter(prefix='/contacts', route_class=SessionScopedRoute)
 
 access_to_route_all = RoleAccess([Role.admin, Role.moderator])
 
+
+def contact_projection(fields: str | None = Query(None, description="Comma-separated fields to return, "
+                                                                    "e.g. first_name,email. The id is always returned"),
+                       include: str | None = Query(None, description="user: return the owner of each contact")) \
+        -> ContactProjection:
+    """
+    Read ?fields= and ?include= of the contact read endpoints. Without them every field but the owner is returned.
+    """
+    projection = ContactProjection()
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in ContactField.__members__]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"{messages.CONTACT_FIELDS_INVALID}: {', '.join(unknown)}")
+        projection.fields = [ContactField(name) for name in names]
+    if include:
+        names = {name.strip() for name in include.split(",") if name.strip()}
+        if names - {"user"}:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.CONTACT_INCLUDE_INVALID)
+        projection.include_user = "user" in names
+    return projection
+
+
+async def contacts_etag(request: Request, projection: ContactProjection, current_user: User, db: AsyncSession,
+                        *parts) -> tuple[str, int]:
+    """
+    ETag of a read of the user's contacts: it changes with the user's contacts version, with the query
+    and with the owner's details when they are included. Costs one lookup of the users row.
+    The version is returned too, the cached reads are keyed by it.
+    """
+    version = await repository_contacts.get_contacts_version(current_user, db)
+    owner = user_item(current_user) if projection.include_user else None
+    return make_etag(current_user.id, version, request.url.path, sorted(request.query_params.multi_items()),
+                     owner, *parts), version
+
+
 """
 Router.
 Отримати список всіх контактів.
-Валідація не відбувається. 
+Без cursor і sort повертає список (offset/limit), з ними - сторінку з next_cursor.
+fields - лише вибрані поля, include=user - разом з власником контакту.
+ETag: якщо контакти користувача не змінились, на If-None-Match повертається 304 без читання контактів.
+Валідація:
+1) Чи відомі всі поля з fields і include?
 """
 
 
 @router.get("/",
-            response_model=list[ContactResponse],
+            response_model=list[ContactSparseResponse] | ContactPage,
             tags=['Contacts'],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def get_contacts(limit: int = 100,
+async def get_contacts(request: Request,
+                       limit: int = Query(100, ge=1, le=1000),
                        offset: int = 0,
-                       db: AsyncSession = Depends(get_db),
+                       cursor: str | None = None,
+                       sort: ContactSort | None = None,
+                       projection: ContactProjection = Depends(contact_projection),
+                       db: AsyncSession = Depends(get_read_db),
                        current_user: User = Depends(auth_service.get_current_user)):
-    contacts = await repository_contacts.get_contacts(limit, offset, db, current_user)
-    return contacts
+    etag, version = await contacts_etag(request, projection, current_user, db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if cursor is not None or sort is not None:
+        contacts, next_cursor = await repository_contacts.get_contacts_page(limit, cursor, sort or ContactSort.id,
+                                                                            db, current_user,
+                                                                            projection=projection,
+                                                                            cache_version=version)
+        return contacts_response(contacts, projection, current_user, next_cursor, page=True, headers={"ETag": etag})
+    contacts = await repository_contacts.get_contacts(limit, offset, db, current_user, projection, version)
+    return contacts_response(contacts, projection, current_user, headers={"ETag": etag})
 
 
 """
 Router.
 Отримати список всіх контактів. all
-Валідація не відбувається.
+Без cursor і sort повертає список (offset/limit), з ними - сторінку з next_cursor.
+fields - лише вибрані поля, include=user - разом з власниками контактів (join users лише тоді).
+Валідація:
+1) Чи відомі всі поля з fields і include?
 """
 
 
 @router.get("/all",
-            response_model=list[ContactResponse],
+            response_model=list[ContactSparseResponse] | ContactPage,
             tags=['Contacts'],
             dependencies=[Depends(access_to_route_all), Depends(RateLimiter(times=1, seconds=20))])
-async def get_all_contacts(limit: int = 100,
+async def get_all_contacts(limit: int = Query(100, ge=1, le=1000),
                            offset: int = 0,
-                           db: AsyncSession = Depends(get_db)):
-    contacts = await repository_contacts.get_all_contacts(limit, offset, db)
-    return contacts
+                           cursor: str | None = None,
+                           sort: ContactSort | None = None,
+                           projection: ContactProjection = Depends(contact_projection),
+                           db: AsyncSession = Depends(get_read_db)):
+    if cursor is not None or sort is not None:
+        contacts, next_cursor = await repository_contacts.get_contacts_page(limit, cursor, sort or ContactSort.id,
+                                                                            db, projection=projection)
+        return contacts_response(contacts, projection, next_cursor=next_cursor, page=True)
+    contacts = await repository_contacts.get_all_contacts(limit, offset, db, projection)
+    return contacts_response(contacts, projection)
+
+
+"""
+Router.
+Експорт контактів користувача (csv, ndjson, vcard).
+Рядки читаються серверним курсором і відправляються пакетами, без завантаження всієї таблиці в пам'ять.
+"""
+
+
+@router.get("/export",
+            response_class=StreamingResponse,
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def export_contacts(file_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+                          session_factory=Depends(get_read_session_factory),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    return export_response(contacts_export.export_contacts(session_factory, file_format, current_user), file_format)
+
+
+"""
+Router.
+Експорт всіх контактів. all
+"""
+
+
+@router.get("/all/export",
+            response_class=StreamingResponse,
+            tags=['Contacts'],
+            dependencies=[Depends(access_to_route_all), Depends(RateLimiter(times=1, seconds=20))])
+async def export_all_contacts(file_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+                              session_factory=Depends(get_read_session_factory)):
+    return export_response(contacts_export.export_contacts(session_factory, file_format), file_format)
+
+
+def export_response(body, file_format: ExportFormat) -> StreamingResponse:
+    filename = f"contacts.{contacts_export.FILE_EXTENSIONS[file_format]}"
+    return StreamingResponse(body, media_type=contacts_export.MEDIA_TYPES[file_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+"""
+Router.
+Автодоповнення контактів за префіксом імені, прізвища або електронної пошти.
+Відповідає з індексу в пам'яті процесу, без запиту до бази даних на кожне натискання клавіші.
+"""
+
+
+@router.get("/autocomplete",
+            response_model=list[ContactSuggestion],
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=10, seconds=1))])
+async def autocomplete_contacts(q: str = Query(min_length=1, max_length=100),
+                                limit: int = Query(10, ge=1, le=50),
+                                db: AsyncSession = Depends(get_read_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    suggestions = await repository_contacts.autocomplete_contacts(q, limit, current_user, db)
+    return suggestions
+
+
+"""
+Router.
+Синхронізація змін для офлайн-клієнтів: контакти, створені або змінені після токена, і ідентифікатори
+видалених (tombstones), разом з новим токеном для наступного запиту. Без since - усі контакти.
+Контакти, змінені в межах SYNC_OVERLAP_SECONDS до токена, можуть прийти повторно.
+fields - лише вибрані поля, include=user - разом з власником контакту.
+Валідація:
+1) Чи токен since створений цим API?
+2) Чи відомі всі поля з fields і include?
+"""
+
+
+@router.get("/changes",
+            response_model=ContactChanges,
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def get_contact_changes(since: str | None = None,
+                              projection: ContactProjection = Depends(contact_projection),
+                              # The primary: a lagging replica would hand out a token past writes it hasn't seen
+                              db: AsyncSession = Depends(get_db),
+                              current_user: User = Depends(auth_service.get_current_user)):
+    moment = repository_contacts.decode_sync_token(since) if since is not None else None
+    changed, deleted, now = await repository_contacts.get_contact_changes(moment, current_user, db, projection)
+    return changes_response(changed, deleted, repository_contacts.encode_sync_token(now), projection, current_user)
+
+
+"""
+Router.
+Запустити пошук дублікатів серед контактів користувача (у фоні).
+Дублікати: однакова електронна пошта або номер телефону, або схожі імена з однаковою датою народження.
+"""
+
+
+@router.post("/duplicates/scan",
+             status_code=status.HTTP_202_ACCEPTED,
+             tags=['Contacts'],
+             dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+async def scan_duplicates(background_tasks: BackgroundTasks,
+                          current_user: User = Depends(auth_service.get_current_user)):
+    background_tasks.add_task(run_duplicate_scan, current_user.id)
+    return {"status": "scheduled"}
+
+
+"""
+Router.
+Знайдені дублікати контактів.
+"""
+
+
+@router.get("/duplicates",
+            response_model=list[ContactDuplicateResponse],
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def get_duplicates(limit: int = Query(100, ge=1, le=1000),
+                         offset: int = Query(0, ge=0),
+                         db: AsyncSession = Depends(get_read_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    duplicates = await repository_duplicates.get_duplicates(limit, offset, current_user, db)
+    return duplicates
+
+
+"""
+Router.
+Об'єднати пару дублікатів: залишається контакт keep, інший видаляється.
+Валідація:
+1) Чи існує пара дублікатів?
+2) Чи є keep одним з двох контактів пари? (repository func)
+"""
+
+
+@router.post("/duplicates/{duplicate_id}/merge",
+             response_model=ContactResponse,
+             tags=['Contacts'],
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def merge_duplicate(keep: int,
+                          duplicate_id: int = Path(ge=1),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    contact = await repository_duplicates.merge_duplicate(duplicate_id, keep, current_user, db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.DUPLICATE_NOT_FOUND)
+    return contact
+
+
+"""
+Router.
+Пакетне отримання контактів за ідентифікаторами одним запитом IN (...).
+Для кожного ідентифікатора повертається свій статус.
+"""
+
+
+@router.post("/batch/get",
+             response_model=ContactBatchResponse,
+             tags=['Contacts'],
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def get_contacts_batch(body: ContactBatchIds,
+                             db: AsyncSession = Depends(get_read_db),
+                             current_user: User = Depends(auth_service.get_current_user)):
+    contact_ids = list(dict.fromkeys(body.ids))
+    contacts = await repository_contacts.get_contacts_by_ids(contact_ids, current_user, db)
+    return ContactBatchResponse(items=[
+        ContactBatchResult(id=contact_id, status=status.HTTP_200_OK, contact=contacts[contact_id])
+        if contact_id in contacts else
+        ContactBatchResult(id=contact_id, status=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
+        for contact_id in contact_ids
+    ])
+
+
+"""
+Router.
+Пакетне оновлення контактів в одній транзакції.
+Валідація:
+1) Чи відповідають дані кожного контакту формату? (schemas.py, помилка для всього запиту)
+2) Чи існує кожен контакт в базі даних? (404 для елемента)
+3) Чи не зайняті електронна пошта або номер телефону іншим контактом? (409 для елемента)
+"""
+
+
+@router.put("/batch",
+            response_model=ContactBatchResponse,
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def update_contacts_batch(body: ContactBatchUpdate,
+                                db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    bodies = {item.id: item for item in body.items}
+    contacts, errors = await repository_contacts.update_contacts_batch(bodies, current_user, db)
+    return ContactBatchResponse(items=[
+        ContactBatchResult(id=contact_id, status=status.HTTP_200_OK, contact=contacts[contact_id])
+        if contact_id in contacts else
+        ContactBatchResult(id=contact_id, status=errors[contact_id][0], detail=errors[contact_id][1])
+        for contact_id in bodies
+    ])
+
+
+"""
+Router.
+Пакетне видалення контактів одним запитом DELETE ... IN (...).
+"""
+
+
+@router.post("/batch/delete",
+             response_model=ContactBatchResponse,
+             tags=['Contacts'],
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def remove_contacts_batch(body: ContactBatchIds,
+                                db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    contact_ids = list(dict.fromkeys(body.ids))
+    deleted_ids = await repository_contacts.remove_contacts_batch(contact_ids, current_user, db)
+    return ContactBatchResponse(items=[
+        ContactBatchResult(id=contact_id, status=status.HTTP_204_NO_CONTENT)
+        if contact_id in deleted_ids else
+        ContactBatchResult(id=contact_id, status=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
+        for contact_id in contact_ids
+    ])
 
 
 """
@@ -62,8 +364,8 @@ Router.
 Валідація:
 1) Чи відповідає номер формату? (schemas.py)
 2) Чи день народження в майбутньому? (schemas.py)
-3) Чи існує контакт з надісланою електронною поштою?
-4) Чи існує контакт з надісланим номером телефону?
+3) Чи існує контакт з надісланою електронною поштою? (обмеження unique, repository func)
+4) Чи існує контакт з надісланим номером телефону? (обмеження unique, repository func)
 """
 
 
@@ -75,51 +377,46 @@ Router.
 async def create_contact(body: ContactModel,
                          db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
-    email_search = select(Contact).filter_by(email=body.email, user=current_user)
-    result = await db.execute(email_search)
-    email_exists = result.scalar_one_or_none()
-
-    number_search = select(Contact).filter_by(contact_number=body.contact_number, user=current_user)
-    result = await db.execute(number_search)
-    number_exists = result.scalar_one_or_none()
-
-    if email_exists:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Contact with the mentioned email already exists."
-        )
-
-    if number_exists:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Contact with the mentioned contact number already exists."
-        )
-
     return await repository_contacts.create_contact(body, current_user, db)
 
 
 """
 Router.
 Отримати один контакт за ідентифікатором.
+fields - лише вибрані поля, include=user - разом з власником контакту.
+ETag - версія контакту: якщо контакт не змінився, на If-None-Match повертається 304 без читання контакту.
 Валідація:
-1) Чи існує контакт в базі даних?
+1) Чи відомі всі поля з fields і include?
+2) Чи існує контакт в базі даних?
 """
 
 
 @router.get("/{contact_id}",
-            response_model=ContactResponse,
+            response_model=ContactSparseResponse,
+            response_model_exclude_unset=True,
             tags=['Contacts'],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def get_contact(contact_id: int = Path(ge=1),
-                      db: AsyncSession = Depends(get_db),
+async def get_contact(request: Request,
+                      response: Response,
+                      contact_id: int = Path(ge=1),
+                      projection: ContactProjection = Depends(contact_projection),
+                      db: AsyncSession = Depends(get_read_db),
                       current_user: User = Depends(auth_service.get_current_user)):
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
+    version = None
+    if "if-none-match" in request.headers:
+        # A conditional GET first reads only the version, the contact is loaded when it has changed,
+        # from the cache when it was read at this version before
+        version = await repository_contacts.get_contact_version(contact_id, current_user, db)
+        if version is not None and etag_matches(request, contact_etag(contact_id, version)):
+            return not_modified(contact_etag(contact_id, version))
+    contact = await repository_contacts.get_contact(contact_id, current_user, db, projection, version)
     if not contact:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=messages.CONTACT_NOT_FOUND
         )
-    return contact
+    response.headers["ETag"] = contact_etag(contact_id, contact.version)
+    return projection.dump(contact, current_user)
 
 
 """
@@ -130,8 +427,9 @@ Router.
 1) Чи день народження в майбутньому? (schemas.py)
 2) Чи відповідає електронна адреса формату? (schemas.py)
 3) Чи існує контакт в базі даних?
-4) Чи існує контакт з надісланою електронною поштою?
-5) Чи існує контакт з надісланим номером телефону?
+4) Чи існує контакт з надісланою електронною поштою? (обмеження unique, repository func)
+5) Чи існує контакт з надісланим номером телефону? (обмеження unique, repository func)
+6) If-Match: чи не змінився контакт після читання? Інакше 412. (той самий UPDATE, repository func)
 """
 
 
@@ -139,34 +437,50 @@ Router.
             response_model=ContactResponse,
             tags=['Contacts'],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def update_contact(body: ContactModel,
+async def update_contact(request: Request,
+                         response: Response,
+                         body: ContactModel,
                          contact_id: int = Path(ge=1),
                          db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
-    email_search = select(Contact).filter_by(email=body.email, user=current_user)
-    result = await db.execute(email_search)
-    email_exists = result.scalar_one_or_none()
+    contact = await repository_contacts.update_contact(contact_id, body, current_user, db,
+                                                       if_match_versions(request, contact_id))
 
-    number_search = select(Contact).filter_by(contact_number=body.contact_number, user=current_user)
-    result = await db.execute(number_search)
-    number_exists = result.scalar_one_or_none()
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
+    response.headers["ETag"] = contact_etag(contact.id, contact.version)
+    return contact
 
-    if email_exists:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=messages.CONTACT_NUMBER_EMAIL_EXISTS
-        )
 
-    if number_exists:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=messages.CONTACT_NUMBER_EMAIL_EXISTS
-        )
+"""
+Router.
+Частково оновити існуючий контакт. Записуються лише надіслані поля.
+Валідація:
+1) Чи відповідає номер формату? (schemas.py)
+2) Чи день народження в майбутньому? (schemas.py)
+3) Чи не передано null для обов'язкового поля? (schemas.py)
+4) Чи існує контакт в базі даних?
+5) Чи існує контакт з надісланою електронною поштою або номером телефону? (обмеження unique, repository func)
+6) If-Match: чи не змінився контакт після читання? Інакше 412. (той самий UPDATE, repository func)
+"""
+
 
-    contact = await repository_contacts.update_contact(contact_id, body, current_user, db)
+@router.patch("/{contact_id}",
+              response_model=ContactResponse,
+              tags=['Contacts'],
+              dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def patch_contact(request: Request,
+                        response: Response,
+                        body: ContactPartialModel,
+                        contact_id: int = Path(ge=1),
+                        db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    contact = await repository_contacts.patch_contact(contact_id, body, current_user, db,
+                                                      if_match_versions(request, contact_id))
 
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
+    response.headers["ETag"] = contact_etag(contact_id, contact["version"])
     return contact
 
 
@@ -185,65 +499,164 @@ Router.
 async def remove_contact(contact_id: int = Path(ge=1),
                          db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
-    contact = await repository_contacts.remove_contact(contact_id, current_user, db)
-    if not contact:
+    deleted_id = await repository_contacts.remove_contact(contact_id, current_user, db)
+    if deleted_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Contact not found"
         )
-    return contact
 
 
 """
 Router.
-Контакти повинні бути доступні для пошуку за іменем, прізвищем чи адресою електронної пошти (Query).
+Нечіткий пошук контактів за ім'ям, прізвищем, електронною поштою і телефоном.
+Без урахування регістру, за префіксом і з помилками; спочатку найкращі збіги, з пагінацією.
+fields - лише вибрані поля, include=user - разом з власником контакту.
+ETag: якщо контакти користувача не змінились, на If-None-Match повертається 304.
+"""
+
+
+@router.get("/search/fuzzy",
+            response_model=list[ContactSparseResponse],
+            response_model_exclude_unset=True,
+            tags=['Contacts'],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def search_contacts(request: Request,
+                          response: Response,
+                          q: str = Query(min_length=1, max_length=100),
+                          limit: int = Query(20, ge=1, le=100),
+                          offset: int = Query(0, ge=0),
+                          projection: ContactProjection = Depends(contact_projection),
+                          db: AsyncSession = Depends(get_read_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    etag, version = await contacts_etag(request, projection, current_user, db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    contacts = await repository_contacts.search_contacts(q, limit, offset, current_user, db, projection, version)
+    return [projection.dump(contact, current_user) for contact in contacts]
+
+
+"""
+Router.
+Пошук контактів за будь-якою комбінацією фільтрів: ім'я, прізвище, електронна пошта,
+номер телефону в будь-якому форматі, останні цифри номера (phone_suffix),
+діапазони дати народження, створення та оновлення. Результат - сторінка з next_cursor.
+fields - лише вибрані поля, include=user - разом з власником контакту.
+ETag: якщо контакти користувача не змінились, на If-None-Match повертається 304.
 Валідація:
-1) Чи існує контакт з вказаним параметром(ім'ям, прізвищем або електронною адресою) в базі даних? (repository func)
+1) Чи задано хоча б один фільтр?
+Якщо контактів не знайдено, повертається порожня сторінка.
 """
 
 
 @router.get("/search/",
-            response_model=list[ContactResponse] | ContactResponse,
+            response_model=ContactPage,
             tags=['Contacts'],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def find_contact(first_name: str = Query(None),
-                       last_name: str = Query(None),
-                       email: str = Query(None),
-                       db: AsyncSession = Depends(get_db),
+async def find_contact(request: Request,
+                       filters: ContactFilter = Depends(),
+                       limit: int = Query(100, ge=1, le=1000),
+                       cursor: str | None = None,
+                       sort: ContactSort = ContactSort.id,
+                       projection: ContactProjection = Depends(contact_projection),
+                       db: AsyncSession = Depends(get_read_db),
                        current_user: User = Depends(auth_service.get_current_user)):
-    if first_name:
-        return await repository_contacts.find_contact_by_first_name(first_name, current_user, db)
-    elif last_name:
-        return await repository_contacts.find_contact_by_last_name(last_name, current_user, db)
-    elif email:
-        return await repository_contacts.find_contact_by_email(email, current_user, db)
-    else:
+    if not filters.model_dump(exclude_none=True):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You must provide at least one parameter"
         )
+    etag, version = await contacts_etag(request, projection, current_user, db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    contacts, next_cursor = await repository_contacts.get_contacts_page(limit, cursor, sort, db, current_user,
+                                                                        filters, projection, version)
+    return contacts_response(contacts, projection, current_user, next_cursor, page=True, headers={"ETag": etag})
 
 
 """
 Router.
-API повинен мати змогу отримати список контактів з днями народження на найближчі 7 днів.
-Валідація не відбувається.
+API повинен мати змогу отримати список контактів з днями народження на найближчі N днів (за замовчуванням 7).
+ETag: якщо контакти користувача і дата не змінились, на If-None-Match повертається 304.
+Валідація:
+1) Чи days в межах від 1 до 365?
+2) Чи відомі всі поля з fields і include?
 """
 
 
 @router.get("/birthdays/",
-            response_model=list[ContactResponse],
+            response_model=list[ContactSparseResponse],
+            response_model_exclude_unset=True,
             tags=['Birthdays'],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def get_upcoming_birthdays(skip: int = 0,
-                                 limit: int = 100,
-                                 db: AsyncSession = Depends(get_db),
+async def get_upcoming_birthdays(request: Request,
+                                 response: Response,
+                                 days: int = Query(7, ge=1, le=365),
+                                 skip: int = 0,
+                                 limit: int = Query(100, ge=1, le=1000),
+                                 projection: ContactProjection = Depends(contact_projection),
+                                 db: AsyncSession = Depends(get_read_db),
                                  current_user: User = Depends(auth_service.get_current_user)):
     current_date = date.today()
-    to_date = current_date + timedelta(days=7)
+    to_date = current_date + timedelta(days=days)
+    # The window moves with the date even if no contact changes
+    etag, _ = await contacts_etag(request, projection, current_user, db, current_date)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    birthdays = await repository_contacts.upcoming_birthdays(current_date, to_date, skip, limit, current_user, db,
+                                                             projection)
+    return [projection.dump(contact, current_user) for contact in birthdays]
+
+
+"""
+Router.
+Імпорт контактів з CSV або NDJSON.
+Файл читається і записується пакетами, помилки повертаються по рядках.
+Великі файли (або background=true) імпортуються у фоні, повертається 202 з job_id.
+"""
 
-    birthdays = await repository_contacts.upcoming_birthdays(current_date, to_date, skip, limit, current_user, db)
-    return birthdays
+
+@router.post("/import",
+             response_model=ImportReport,
+             tags=['Contacts'],
+             dependencies=[Depends(RateLimiter(times=1, seconds=45))])
+async def import_contacts(response: Response,
+                          background_tasks: BackgroundTasks,
+                          file: UploadFile = File(),
+                          file_format: ImportFormat = Query(ImportFormat.csv, alias="format"),
+                          background: bool = False,
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    if background or (file.size or 0) > config.IMPORT_BACKGROUND_THRESHOLD:
+        # The upload is closed once the response is sent, the job reads its own copy
+        with tempfile.NamedTemporaryFile(suffix=f".{file_format.value}", delete=False) as spooled:
+            await run_in_threadpool(shutil.copyfileobj, file.file, spooled)
+        report = await import_jobs.create(current_user.id)
+        background_tasks.add_task(run_import_job, spooled.name, file_format, report, current_user)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return report
+    report = ImportReport()
+    return await ContactImport(report, current_user).run(file.file, file_format, db)
+
+
+"""
+Router.
+Стан фонового імпорту контактів.
+"""
+
+
+@router.get("/import/{job_id}",
+            response_model=ImportReport,
+            tags=['Contacts'])
+async def get_import_job(job_id: str,
+                         current_user: User = Depends(auth_service.get_current_user)):
+    report = await import_jobs.get(job_id, current_user.id)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMPORT_JOB_NOT_FOUND)
+    return report
 
 
 """
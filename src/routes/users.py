@@ -5,13 +5,13 @@ from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import config
-from src.database.db import get_db
+from src.database.db import SessionScopedRoute, get_db
 from src.entity.models import User
 from src.repository import users as repository_users
 from src.schemas.user import UserResponse
 from src.services.auth import auth_service
 
-router = APIRouter(prefix='/users', tags=["users"])
+router = APIRouter(prefix='/users', tags=["users"], route_class=SessionScopedRoute)
 
 cloudinary.config(cloud_name=config.CLD_NAME,
                   api_key=config.CLD_API_KEY,
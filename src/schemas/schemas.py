@@ -1,13 +1,37 @@
+import enum
 import re
-from datetime import date
+from datetime import date, datetime
 from typing import Optional
 
 from fastapi import HTTPException, status
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from pydantic import (BaseModel, ConfigDict, EmailStr, Field, field_validator,
+                      model_validator)
 
+from src.conf.config import config
 from src.schemas.user import UserResponse
 
 
+def validate_contact_number(value: str) -> str:
+    if not re.match(r'^(\+\d{1,2}\s)?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}$', value):
+        """
+        Matching formats:
+        123-456-7890
+        (123) 456-7890
+        123 456 7890
+        123.456.7890
+        +12 (345) 678-9012
+        """
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Invalid contact number")
+    return value
+
+
+def validate_birth_date(value: date) -> date:
+    if value > date.today():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Invalid birth date. Birth date can't be in the future.")
+    return value
+
+
 class ContactModel(BaseModel):
     first_name: str = Field(max_length=15)
     last_name: str = Field(max_length=15)
@@ -19,25 +43,41 @@ class ContactModel(BaseModel):
     @field_validator('contact_number')  # noqa
     @classmethod
     def validate_contact_number(cls, value: str) -> str:
-        if not re.match(r'^(\+\d{1,2}\s)?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}$', value):
-            """
-            Matching formats:
-            123-456-7890
-            (123) 456-7890
-            123 456 7890
-            123.456.7890
-            +12 (345) 678-9012
-            """
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Invalid contact number")
-        return value
+        return validate_contact_number(value)
 
     @field_validator("birth_date")  # noqa
     @classmethod
     def validate_birth_date(cls, value: date) -> date:
-        if value > date.today():
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
-                                detail="Invalid birth date. Birth date can't be in the future.")
-        return value
+        return validate_birth_date(value)
+
+
+class ContactPartialModel(BaseModel):
+    """
+    Body of PATCH: only the fields that are sent get written.
+    """
+    first_name: Optional[str] = Field(None, max_length=15)
+    last_name: Optional[str] = Field(None, max_length=15)
+    email: Optional[EmailStr] = None
+    contact_number: Optional[str] = None
+    birth_date: Optional[date] = None
+    additional_information: Optional[str] = None
+
+    @field_validator('contact_number')  # noqa
+    @classmethod
+    def validate_contact_number(cls, value: str | None) -> str | None:
+        return validate_contact_number(value) if value is not None else value
+
+    @field_validator("birth_date")  # noqa
+    @classmethod
+    def validate_birth_date(cls, value: date | None) -> date | None:
+        return validate_birth_date(value) if value is not None else value
+
+    @model_validator(mode="after")
+    def validate_required_not_null(self):
+        for field in self.model_fields_set - {"additional_information"}:
+            if getattr(self, field) is None:
+                raise ValueError(f"{field} can't be null")
+        return self
 
 
 class ContactResponse(ContactModel):
@@ -46,6 +86,156 @@ class ContactResponse(ContactModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ContactField(str, enum.Enum):
+    id = "id"
+    first_name = "first_name"
+    last_name = "last_name"
+    email = "email"
+    contact_number = "contact_number"
+    birth_date = "birth_date"
+    additional_information = "additional_information"
+
+
+class ContactProjection(BaseModel):
+    """
+    What a contact read returns: the fields picked with ?fields= (the id is always returned)
+    and, with ?include=user, the owner of each contact.
+    """
+    fields: list[ContactField] = list(ContactField)
+    include_user: bool = False
+
+    def columns(self) -> list[str]:
+        return list(dict.fromkeys([ContactField.id.value, *(field.value for field in self.fields)]))
+
+    def dump(self, contact, owner=None) -> dict:
+        data = {name: getattr(contact, name) for name in self.columns()}
+        if self.include_user:
+            data["user"] = owner if owner is not None else contact.user
+        return data
+
+
+class ContactSparseResponse(BaseModel):
+    """
+    A contact read with a projection: only the selected fields are present.
+    """
+    id: int
+    first_name: str | None = None
+    last_name: str | None = None
+    email: EmailStr | None = None
+    contact_number: str | None = None
+    birth_date: date | None = None
+    additional_information: str | None = None
+    user: UserResponse | None = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ContactSort(str, enum.Enum):
+    id = "id"
+    last_name = "last_name"
+    first_name = "first_name"
+    created_at = "created_at"
+
+
+class ContactPage(BaseModel):
+    items: list[ContactSparseResponse]
+    next_cursor: str | None = None
+
+
+class ContactChanges(BaseModel):
+    changed: list[ContactSparseResponse]
+    deleted: list[int]
+    token: str
+
+
+class ImportFormat(str, enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class ContactDuplicateResponse(BaseModel):
+    id: int
+    reason: str
+    contact: ContactResponse
+    duplicate: ContactResponse
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ContactFilter(BaseModel):
+    """
+    Filters of the contact search, only the ones that are sent are applied. Ranges include both ends.
+    """
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    phone_suffix: Optional[str] = None
+    birth_date_from: Optional[date] = None
+    birth_date_to: Optional[date] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    updated_from: Optional[datetime] = None
+    updated_to: Optional[datetime] = None
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+
+
+class ContactBatchIds(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=config.BATCH_MAX_ITEMS)
+
+
+class ContactBatchUpdateItem(ContactModel):
+    id: int = Field(ge=1)
+
+
+class ContactBatchUpdate(BaseModel):
+    items: list[ContactBatchUpdateItem] = Field(min_length=1, max_length=config.BATCH_MAX_ITEMS)
+
+    @model_validator(mode="after")
+    def validate_unique_ids(self):
+        if len({item.id for item in self.items}) != len(self.items):
+            raise ValueError("Every contact can be updated only once per batch")
+        return self
+
+
+class ContactBatchResult(BaseModel):
+    """
+    Outcome for one id of a batch request, status is the HTTP status the single-contact endpoint would return.
+    """
+    id: int
+    status: int
+    detail: str | None = None
+    contact: ContactResponse | None = None
+
+
+class ContactBatchResponse(BaseModel):
+    items: list[ContactBatchResult]
+
+
+class ExportFormat(str, enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    vcard = "vcard"
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    job_id: str | None = None
+    status: str = "running"
+    processed: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: list[ImportRowError] = []
+
+
 class PasswordResetRequest(BaseModel):
     email: str
 
@@ -10,7 +10,7 @@ from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import config
-from src.database.db import get_db
+from src.database.db import get_read_db
 from src.repository import users as repository_users
 
 
@@ -68,7 +68,7 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -95,6 +95,9 @@ class Auth:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
+            # Detach from the read session so routes can attach the user to their own session,
+            # exactly like a user unpickled from the cache.
+            db.expunge(user)
             self.cache.set(user_hash, pickle.dumps(user))  # noqa
             self.cache.expire(user_hash, 300)  # noqa
         else:
@@ -0,0 +1,103 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import pickle
+
+import redis.asyncio as redis
+from pydantic import BaseModel
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _key_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+class ContactsCache:
+    """
+    Read-through Redis cache of contact reads, namespaced by the version the read's ETag was made from:
+    contacts:<user id>:<version>:<read>:<digest of the arguments>.
+    The version is users.contacts_version (contacts.version for a single contact), which the database
+    bumps in the same transaction as every write, and the route reads it in the same transaction as
+    the cached read. A cached body therefore always belongs to the version in its key, whether it was
+    read from the primary or from a lagging replica; entries of old versions expire with their TTL.
+    Redis errors never fail a request: the read goes to the database and the error is counted.
+    """
+
+    def __init__(self, client: redis.Redis | None):
+        self.client = client
+        self.stats: dict[str, dict[str, int]] = {}
+        self.errors = 0
+
+    def _count(self, name: str, outcome: str):
+        counters = self.stats.setdefault(name, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    def _failed(self, action: str, err: Exception):
+        self.errors += 1
+        logger.warning("Contacts cache %s failed: %s", action, err)
+
+    async def read_through(self, user_id: int, version: int, name: str, arguments: dict, ttl: int, load):
+        if self.client is None or ttl <= 0:
+            return await load()
+        digest = hashlib.sha256(json.dumps(arguments, default=_key_default, sort_keys=True).encode()).hexdigest()
+        key = f"contacts:{user_id}:{version}:{name}:{digest[:32]}"
+        try:
+            cached = await self.client.get(key)
+        except redis.RedisError as err:
+            self._failed("read", err)
+            return await load()
+        if cached is not None:
+            self._count(name, "hits")
+            return pickle.loads(cached)  # noqa
+        self._count(name, "misses")
+        value = await load()
+        try:
+            await self.client.set(key, pickle.dumps(value), ex=ttl)
+        except redis.RedisError as err:
+            self._failed("write", err)
+        return value
+
+    def cached(self, name: str, ttl: int):
+        """
+        Cache a repository read of one user's contacts under the cache_version argument, the version
+        the caller read for its ETag. The rest of the key is made from every argument but the session
+        and the user; a read without a user (all users' contacts) or without a version is not cached.
+        """
+        def decorator(function):
+            signature = inspect.signature(function)
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                arguments.pop("db")
+                current_user = arguments.pop("current_user")
+                version = arguments.pop("cache_version")
+                if current_user is None or version is None:
+                    return await function(*args, **kwargs)
+                return await self.read_through(current_user.id, version, name, arguments, ttl,
+                                               lambda: function(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    def summary(self) -> dict:
+        hits = sum(counters["hits"] for counters in self.stats.values())
+        misses = sum(counters["misses"] for counters in self.stats.values())
+        return {"enabled": self.client is not None, "hits": hits, "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+                "errors": self.errors, "reads": self.stats}
+
+
+contacts_cache = ContactsCache(redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0,
+                                           password=config.REDIS_PASSWORD,
+                                           socket_timeout=config.CONTACTS_CACHE_REDIS_TIMEOUT,
+                                           socket_connect_timeout=config.CONTACTS_CACHE_REDIS_TIMEOUT)
+                               if config.CONTACTS_CACHE_ENABLED else None)
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, Callable
+
+from sqlalchemy.engine import RowMapping
+
+from src.conf.config import config
+from src.entity.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas.schemas import ExportFormat
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv; charset=utf-8",
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.vcard: "text/vcard; charset=utf-8",
+}
+
+FILE_EXTENSIONS = {
+    ExportFormat.csv: "csv",
+    ExportFormat.ndjson: "ndjson",
+    ExportFormat.vcard: "vcf",
+}
+
+FIELDS = [column.name for column in repository_contacts.EXPORT_COLUMNS]
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _vcard_text(value) -> str:
+    return (str(value).replace("\\", "\\\\").replace(",", "\\,")
+            .replace(";", "\\;").replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def render_csv(rows: list[RowMapping], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def render_ndjson(rows: list[RowMapping]) -> str:
+    return "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows)
+
+
+def render_vcard(rows: list[RowMapping]) -> str:
+    cards = []
+    for row in rows:
+        lines = ["BEGIN:VCARD",
+                 "VERSION:3.0",
+                 f"N:{_vcard_text(row['last_name'])};{_vcard_text(row['first_name'])};;;",
+                 f"FN:{_vcard_text(row['first_name'])} {_vcard_text(row['last_name'])}",
+                 f"EMAIL;TYPE=INTERNET:{_vcard_text(row['email'])}",
+                 f"TEL:{_vcard_text(row['contact_number'])}",
+                 f"BDAY:{row['birth_date'].isoformat()}"]
+        if row["additional_information"]:
+            lines.append(f"NOTE:{_vcard_text(row['additional_information'])}")
+        lines.append("END:VCARD")
+        cards.append("\r\n".join(lines) + "\r\n")
+    return "".join(cards)
+
+
+RENDERERS = {
+    ExportFormat.csv: render_csv,
+    ExportFormat.ndjson: render_ndjson,
+    ExportFormat.vcard: render_vcard,
+}
+
+
+async def export_contacts(session_factory: Callable, file_format: ExportFormat, current_user: User | None = None,
+                          batch_size: int = config.EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    Yield the encoded export one batch of rows at a time.
+    The session lives as long as the stream, the CSV header goes out before the query runs.
+    """
+    if file_format == ExportFormat.csv:
+        yield render_csv([], header=True).encode()
+    render = RENDERERS[file_format]
+    async with session_factory() as db:
+        async for rows in repository_contacts.stream_contacts(batch_size, db, current_user):
+            yield render(rows).encode()
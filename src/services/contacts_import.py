@@ -0,0 +1,197 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import uuid
+from typing import Awaitable, BinaryIO, Callable, Iterator
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.conf import messages
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.entity.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas.schemas import ContactModel, ImportFormat, ImportReport, ImportRowError
+
+logger = logging.getLogger(__name__)
+
+
+class ImportJobs:
+    """
+    Reports of the imports running in the background, by job id, kept in Redis so that every worker
+    process can answer for a job another one runs. A report expires ttl seconds after its last update.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int = config.IMPORT_JOB_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        return f"import:{job_id}"
+
+    async def create(self, user_id: int) -> ImportReport:
+        report = ImportReport(job_id=uuid.uuid4().hex, status="pending")
+        await self.save(report, user_id)
+        return report
+
+    async def save(self, report: ImportReport, user_id: int):
+        try:
+            await self.client.set(self.key(report.job_id),
+                                  json.dumps({"user_id": user_id, "report": report.model_dump(mode="json")}),
+                                  ex=self.ttl)
+        except redis.RedisError as err:
+            # The job goes on, its next update may get through
+            logger.warning("Import job %s report was not saved: %s", report.job_id, err)
+
+    async def get(self, job_id: str, user_id: int) -> ImportReport | None:
+        stored = await self.client.get(self.key(job_id))
+        if stored is None:
+            return None
+        job = json.loads(stored)
+        return ImportReport(**job["report"]) if job["user_id"] == user_id else None
+
+
+import_jobs = ImportJobs(redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0,
+                                    password=config.REDIS_PASSWORD))
+
+
+def read_rows(file: BinaryIO, file_format: ImportFormat) -> Iterator[tuple[int, dict | str]]:
+    """
+    Yield (row number, row) pairs from the uploaded file without reading it into memory.
+    A row that can't be parsed is yielded as its error message.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    if file_format == ImportFormat.csv:
+        # Row 1 is the header
+        yield from enumerate(csv.DictReader(text), start=2)
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as err:
+            yield number, f"Invalid JSON: {err.msg}"
+            continue
+        yield number, row if isinstance(row, dict) else "Row must be a JSON object"
+
+
+def read_batch(rows: Iterator[tuple[int, dict | str]], size: int) -> tuple[list[tuple[int, dict | str]], str | None]:
+    """
+    Read up to size rows. Reading stops at bytes that aren't UTF-8 or at broken CSV, the rows read
+    before are returned with the reason, the rest of the file can't be read reliably.
+    """
+    batch = []
+    try:
+        for row in itertools.islice(rows, size):
+            batch.append(row)
+    except UnicodeDecodeError as err:
+        return batch, f"{messages.IMPORT_FILE_NOT_UTF8}: {err.reason}"
+    except csv.Error as err:
+        return batch, f"{messages.IMPORT_FILE_INVALID_CSV}: {err}"
+    return batch, None
+
+
+def validate_row(row: dict) -> ContactModel:
+    # Empty CSV cells are missing values, not empty strings
+    return ContactModel(**{key: value for key, value in row.items() if key and value not in ("", None)})
+
+
+class ContactImport:
+    """
+    Validate and insert contacts from an uploaded file batch by batch, recording the outcome in the report.
+    A file that stops being readable ends the import as failed, the batches before it stay inserted.
+    """
+
+    def __init__(self, report: ImportReport, current_user: User,
+                 batch_size: int = config.IMPORT_BATCH_SIZE,
+                 max_errors: int = config.IMPORT_MAX_REPORTED_ERRORS,
+                 on_progress: Callable[[ImportReport], Awaitable[None]] | None = None):
+        self.report = report
+        self.current_user = current_user
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.on_progress = on_progress
+
+    def fail(self, row: int, error: str):
+        self.report.failed += 1
+        if len(self.report.errors) < self.max_errors:
+            self.report.errors.append(ImportRowError(row=row, error=error))
+
+    async def run(self, file: BinaryIO, file_format: ImportFormat, db: AsyncSession) -> ImportReport:
+        self.report.status = "running"
+        rows = read_rows(file, file_format)
+        # Row 1 of a CSV file is the header
+        next_row = 2 if file_format == ImportFormat.csv else 1
+        while True:
+            # Parsing blocks on file reads, keep it off the event loop
+            batch, error = await run_in_threadpool(read_batch, rows, self.batch_size)
+            if batch:
+                await self.insert_batch(batch, db)
+                next_row = batch[-1][0] + 1
+            if error is not None:
+                self.report.status = "failed"
+                self.report.errors.append(ImportRowError(row=next_row, error=error))
+                return self.report
+            if not batch:
+                break
+            if self.on_progress is not None:
+                await self.on_progress(self.report)
+        self.report.status = "completed"
+        return self.report
+
+    async def insert_batch(self, batch: list[tuple[int, dict | str]], db: AsyncSession):
+        valid: dict[str, tuple[int, dict]] = {}
+        for number, row in batch:
+            self.report.processed += 1
+            if isinstance(row, str):
+                self.fail(number, row)
+                continue
+            try:
+                body = validate_row(row)
+            except ValidationError as err:
+                self.fail(number, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                                            for error in err.errors()))
+                continue
+            except HTTPException as err:
+                self.fail(number, err.detail)
+                continue
+            if body.email in valid:
+                self.fail(number, messages.CONTACT_EMAIL_EXISTS)
+                continue
+            valid[body.email] = (number, repository_contacts.contact_values(body))
+
+        inserted = await repository_contacts.insert_contacts_batch([values for _, values in valid.values()],
+                                                                   self.current_user, db)
+        self.report.inserted += len(inserted)
+        for email, (number, _) in valid.items():
+            if email not in inserted:
+                self.fail(number, messages.CONTACT_NUMBER_EMAIL_EXISTS)
+
+
+async def run_import_job(path: str, file_format: ImportFormat, report: ImportReport, current_user: User):
+    """
+    Import a spooled upload in the background with a session of its own, then remove the file.
+    The report is saved after every batch and when the import ends.
+    """
+    async def save(progress: ImportReport):
+        await import_jobs.save(progress, current_user.id)
+
+    try:
+        async with sessionmanager.session() as db:
+            with open(path, "rb") as file:
+                await ContactImport(report, current_user, on_progress=save).run(file, file_format, db)
+    except Exception as err:
+        report.status = "failed"
+        report.errors.append(ImportRowError(row=0, error=str(err)))
+    finally:
+        os.unlink(path)
+        await save(report)
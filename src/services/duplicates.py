@@ -0,0 +1,87 @@
+import logging
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Iterable
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.entity.models import phone_e164
+from src.repository import duplicates as repository_duplicates
+
+logger = logging.getLogger(__name__)
+
+
+def blocking_keys(contact) -> list[tuple[str, str]]:
+    """
+    Keys that put a contact in the same block as its likely duplicates. Only contacts sharing a block
+    are compared, so the scan never compares every contact with every other one.
+    Names are compared within a birth date, split by the first letter of either name,
+    so a typo in one name still lands the pair in a shared block.
+    """
+    birth_date = contact.birth_date.isoformat()
+    return [("email", contact.email.strip().lower()),
+            ("phone", phone_e164(contact.contact_number)),
+            ("name", f"{birth_date}:first:{contact.first_name[:1].lower()}"),
+            ("name", f"{birth_date}:last:{contact.last_name[:1].lower()}")]
+
+
+def name_similarity(a, b) -> float:
+    return SequenceMatcher(None, f"{a.first_name} {a.last_name}".lower(),
+                           f"{b.first_name} {b.last_name}".lower()).ratio()
+
+
+def find_duplicate_pairs(contacts: Iterable, similarity: float = config.DEDUPE_NAME_SIMILARITY,
+                         max_block_size: int = config.DEDUPE_MAX_BLOCK_SIZE) -> dict[tuple[int, int], str]:
+    """
+    Pairs of likely duplicates among one user's contacts, by (lower id, higher id), with the reason:
+    the same email ignoring case, the same normalized phone number, or similar names with the same birth date.
+    Name blocks larger than max_block_size are skipped instead of compared pair by pair.
+    """
+    blocks: dict[tuple[str, str], list] = defaultdict(list)
+    for contact in contacts:
+        for key in blocking_keys(contact):
+            blocks[key].append(contact)
+
+    pairs: dict[tuple[int, int], str] = {}
+    for (reason, key), members in blocks.items():
+        if len(members) < 2:
+            continue
+        if reason == "name" and len(members) > max_block_size:
+            logger.warning("Duplicate scan skipped a name block of %d contacts: %s", len(members), key)
+            continue
+        for a, b in combinations(sorted(members, key=lambda contact: contact.id), 2):
+            pair = (a.id, b.id)
+            if pair in pairs:
+                continue
+            if reason == "name" and name_similarity(a, b) < similarity:
+                continue
+            pairs[pair] = reason
+    return pairs
+
+
+async def scan_users(user_ids: list[int]):
+    """
+    Find and store the duplicates of each user, every user in a transaction of its own.
+    """
+    async with sessionmanager.session() as db:
+        for user_id in user_ids:
+            contacts = await repository_duplicates.get_dedupe_rows(user_id, db)
+            await repository_duplicates.replace_duplicates(user_id, find_duplicate_pairs(contacts), db)
+
+
+async def run_duplicate_scan(user_id: int | None = None, chunk_size: int = config.DEDUPE_USER_CHUNK):
+    """
+    Background job: scan one user, or every user with contacts, chunk_size users at a time.
+    """
+    if user_id is not None:
+        await scan_users([user_id])
+        return
+    after_id = 0
+    while True:
+        async with sessionmanager.session() as db:
+            user_ids = await repository_duplicates.get_user_ids_with_contacts(after_id, chunk_size, db)
+        if not user_ids:
+            break
+        await scan_users(user_ids)
+        after_id = user_ids[-1]
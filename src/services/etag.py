@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts) -> str:
+    """
+    A strong ETag: a digest of everything the representation depends on.
+    """
+    raw = json.dumps(parts, default=str, separators=(",", ":")).encode()
+    return '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the request's If-None-Match names the current representation (weak comparison, as RFC 9110 asks).
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def contact_etag(contact_id: int, version: int) -> str:
+    """
+    The ETag of a single contact: its id and version, so If-Match can be checked by the UPDATE itself.
+    """
+    return f'"{contact_id}-{version}"'
+
+
+def if_match_versions(request: Request, contact_id: int) -> list[int] | None:
+    """
+    The contact versions the request's If-Match allows (strong comparison, weak tags never match),
+    None when the request has no If-Match or allows any version with "*".
+    """
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag_id, _, version = tag.strip().strip('"').partition("-")
+        if tag.strip().startswith('"') and tag_id == str(contact_id) and version.isdigit():
+            versions.append(int(version))
+    return versions
@@ -0,0 +1,61 @@
+from typing import Sequence
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.engine import Row
+
+from src.entity.models import User
+from src.schemas.schemas import ContactProjection
+from src.schemas.user import UserResponse
+
+USER_FIELDS = tuple(UserResponse.model_fields)
+
+
+def user_item(user: User) -> dict:
+    return {name: getattr(user, name) for name in USER_FIELDS}
+
+
+def contact_items(rows: Sequence[Row], projection: ContactProjection, owner: User | None = None) -> list[dict]:
+    """
+    Turn contact rows into response items without building a model per row: the rows hold only
+    columns read from the database, which already passed validation on the way in.
+    Columns the query selected for itself, such as the sort key of a page, are left out.
+    With ?include=user the owner is the given one, or is read from the joined user__<name> columns.
+    """
+    if not rows:
+        return []
+    names = projection.columns()
+    if list(rows[0]._fields) == names:
+        items = [row._asdict() for row in rows]
+    else:
+        items = [{name: mapping[name] for name in names} for mapping in (row._mapping for row in rows)]
+    if not projection.include_user:
+        return items
+    if owner is not None:
+        user = user_item(owner)
+        for item in items:
+            item["user"] = user
+        return items
+    for item, row in zip(items, rows):
+        mapping = row._mapping
+        item["user"] = {name: mapping[f"user__{name}"] for name in USER_FIELDS} \
+            if mapping["user__id"] is not None else None
+    return items
+
+
+def changes_response(rows: Sequence[Row], deleted: list[int], token: str, projection: ContactProjection,
+                     owner: User) -> ORJSONResponse:
+    """
+    Serialize a delta sync response, like contacts_response does for lists.
+    """
+    return ORJSONResponse({"changed": contact_items(rows, projection, owner), "deleted": deleted, "token": token})
+
+
+def contacts_response(rows: Sequence[Row], projection: ContactProjection, owner: User | None = None,
+                      next_cursor: str | None = None, page: bool = False,
+                      headers: dict[str, str] | None = None) -> ORJSONResponse:
+    """
+    Serialize a contact list straight to JSON bytes with orjson. The route's response_model
+    only documents the shape, it isn't run on these responses.
+    """
+    items = contact_items(rows, projection, owner)
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor} if page else items, headers=headers)
@@ -0,0 +1,137 @@
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from src.conf.config import config
+
+
+class UserTypeahead:
+    """
+    Prefix index over one user's contacts: a sorted array of (term, contact id) pairs,
+    where the terms are the lower-cased first name, last name, full name and email.
+    Prefix lookup is a binary search followed by a walk over the matching run.
+    """
+    # Rough per-entry cost of the tuple, its string and the list slot, in bytes
+    ENTRY_OVERHEAD = 120
+    CONTACT_OVERHEAD = 400
+
+    def __init__(self):
+        self.entries: list[tuple[str, int]] = []
+        self.contacts: dict[int, dict] = {}
+        self.built_at = time.monotonic()
+        self.size = 0
+
+    @staticmethod
+    def terms(first_name: str, last_name: str, email: str) -> set[str]:
+        first_name, last_name, email = first_name.lower(), last_name.lower(), email.lower()
+        return {first_name, last_name, f"{first_name} {last_name}", email}
+
+    def contact_size(self, contact: dict) -> int:
+        return self.CONTACT_OVERHEAD + len(contact["first_name"]) + len(contact["last_name"]) + len(contact["email"])
+
+    def add(self, contact_id: int, first_name: str, last_name: str, email: str):
+        self.remove(contact_id)
+        contact = {"id": contact_id, "first_name": first_name, "last_name": last_name, "email": email}
+        self.contacts[contact_id] = contact
+        self.size += self.contact_size(contact)
+        for term in self.terms(first_name, last_name, email):
+            insort(self.entries, (term, contact_id))
+            self.size += self.ENTRY_OVERHEAD + len(term)
+
+    def remove(self, contact_id: int):
+        contact = self.contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        self.size -= self.contact_size(contact)
+        for term in self.terms(contact["first_name"], contact["last_name"], contact["email"]):
+            position = bisect_left(self.entries, (term, contact_id))
+            if position < len(self.entries) and self.entries[position] == (term, contact_id):
+                del self.entries[position]
+                self.size -= self.ENTRY_OVERHEAD + len(term)
+
+    def suggest(self, prefix: str, limit: int) -> list[dict]:
+        prefix = prefix.lower()
+        found: dict[int, dict] = {}
+        for position in range(bisect_left(self.entries, (prefix,)), len(self.entries)):
+            term, contact_id = self.entries[position]
+            if not term.startswith(prefix) or len(found) >= limit:
+                break
+            found.setdefault(contact_id, self.contacts[contact_id])
+        return list(found.values())
+
+
+class TypeaheadIndex:
+    """
+    Per-user typeahead indexes of this process, least recently used evicted first once the
+    estimated size of all indexes goes over the memory budget.
+    Indexes are built lazily on the first lookup and kept current by the contacts repository.
+    Writes made by other processes are picked up when the index gets older than the TTL and is rebuilt.
+    """
+
+    def __init__(self, memory_budget: int = config.TYPEAHEAD_MEMORY_BUDGET, ttl: float = config.TYPEAHEAD_TTL):
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self._indexes: OrderedDict[int, UserTypeahead] = OrderedDict()
+        self._building: dict[int, int] = {}
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        return sum(index.size for index in self._indexes.values())
+
+    def get(self, user_id: int) -> UserTypeahead | None:
+        index = self._indexes.get(user_id)
+        if index is None:
+            return None
+        if time.monotonic() - index.built_at > self.ttl:
+            del self._indexes[user_id]
+            return None
+        self._indexes.move_to_end(user_id)
+        return index
+
+    def start_build(self, user_id: int):
+        # Writes that land while the rows are being read may be missing from them
+        self._building[user_id] = self._building.get(user_id, 0)
+
+    def finish_build(self, user_id: int, rows) -> UserTypeahead:
+        index = UserTypeahead()
+        for row in rows:
+            index.add(row.id, row.first_name, row.last_name, row.email)
+        if self._building.pop(user_id, 0) == 0 and index.size <= self.memory_budget:
+            self._indexes[user_id] = index
+            self._evict()
+        return index
+
+    def _evict(self):
+        size = self.size
+        while size > self.memory_budget and len(self._indexes) > 1:
+            _, evicted = self._indexes.popitem(last=False)
+            size -= evicted.size
+            self.evictions += 1
+
+    def contact_written(self, user_id: int, contact_id: int, first_name: str, last_name: str, email: str):
+        if user_id in self._building:
+            self._building[user_id] += 1
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(contact_id, first_name, last_name, email)
+            self._evict()
+
+    def contact_removed(self, user_id: int, contact_id: int):
+        if user_id in self._building:
+            self._building[user_id] += 1
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(contact_id)
+
+    def invalidate(self, user_id: int):
+        if user_id in self._building:
+            self._building[user_id] += 1
+        self._indexes.pop(user_id, None)
+
+    def clear(self):
+        self._indexes.clear()
+        self._building.clear()
+
+
+typeahead_index = TypeaheadIndex()
@@ -1,5 +1,6 @@
 import asyncio
 from datetime import datetime
+from unittest.mock import AsyncMock, patch
 
 import pytest
 import pytest_asyncio
@@ -9,19 +10,59 @@ from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
 from sqlalchemy.pool import StaticPool
 
 from main import app
-from src.database.db import get_db
+from src.database.db import (LazyConnectionSession, get_db, get_read_db,
+                             get_read_session_factory)
+from src.database.instrumentation import instrument_engine
 from src.entity.models import Base, Contact, User
 from src.services.auth import auth_service
+from src.services.contacts_cache import contacts_cache
+from src.services.contacts_import import import_jobs
+from src.services.typeahead import typeahead_index
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_async_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+instrument_engine(engine)
+
+TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                         class_=LazyConnectionSession, bind=engine)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the few async Redis commands the contacts cache, the read-your-writes
+    markers and the import jobs use (TTLs are not applied).
+    """
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.closed = False
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, px=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    async def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def aclose(self):
+        self.closed = True
 
-TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 test_user = {"username": "username_test", "email": "test@example.com", "password": "12345678"}
 
 
+@pytest.fixture(scope="session", autouse=True)
+# Unit tests read the database directly, the e2e client swaps in an in-memory Redis
+def contacts_cache_off():
+    contacts_cache.client = None
+
+
 @pytest.fixture(scope="module", autouse=True)
 # Refreshing the database (delete all data from the database)
 def init_models_wrap():
@@ -53,6 +94,7 @@ def init_models_wrap():
             await session.commit()
 
     asyncio.run(init_models())
+    typeahead_index.clear()
 
 
 @pytest.fixture(scope="module")
@@ -68,12 +110,36 @@ def client():
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db  # while testing, pytest will be using SQL_DB
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_read_session_factory] = lambda: TestingSessionLocal
+    contacts_cache.client = FakeRedis()
+    import_jobs.client = FakeRedis()
 
     yield TestClient(app)
 
+    contacts_cache.client = None
+
 
 @pytest_asyncio.fixture()
 async def get_token():
     token = await auth_service.create_access_token(data={"sub": test_user["email"]})
     return token
 
+
+@pytest.fixture()
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture()
+def pass_rate_limiter(monkeypatch):
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+
+@pytest.fixture()
+def headers(get_token, pass_rate_limiter):
+    with patch.object(auth_service, "cache") as redis_mock:
+        redis_mock.get.return_value = None
+        yield {"Authorization": f"Bearer {get_token}"}
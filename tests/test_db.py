@@ -1,6 +1,16 @@
+from unittest.mock import AsyncMock
+
 import pytest
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+from pydantic import BaseModel, model_serializer
+from sqlalchemy import column, insert, literal_column, select, table, text
+
 from src.conf.config import config
-from src.database.db import DatabaseSessionManager
+from src.database.db import (DatabaseSessionManager, PoolStats,
+                             SessionScopedRoute, client_key)
+from src.services.auth import auth_service
 
 
 @pytest.fixture
@@ -24,3 +34,176 @@ async def test_rollback(session_manager):
         async with session_manager.session() as session:
             raise Exception("Simulated error")
 
+
+
+def test_pool_stats_histogram():
+    stats = PoolStats()
+    stats.observe(0.0005)
+    stats.observe(0.02)
+    stats.observe(10)
+    data = stats.as_dict()
+    assert data["checkouts"] == 3
+    assert data["checkout_latency_histogram"]["le_1ms"] == 1
+    assert data["checkout_latency_histogram"]["le_25ms"] == 1
+    assert data["checkout_latency_histogram"]["inf"] == 1
+    assert data["wait_time_max"] == 10
+
+
+@pytest.mark.asyncio
+async def test_pool_status(tmp_path):
+    session_manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+                                             pool_size=2, max_overflow=1, pool_timeout=5)
+    async with session_manager.session() as session:
+        await session.execute(text("SELECT 1"))
+        status = session_manager.pool_status()
+        assert status["checked_out"] == 1
+        assert status["size"] == 2
+    status = session_manager.pool_status()
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 1
+    assert status["max_overflow"] == 1
+    await session_manager.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_lazy_connection_checkout(tmp_path):
+    session_manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'lazy.db'}")
+    async with session_manager.engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE node (name TEXT)"))
+
+    async with session_manager.session() as session:
+        # No statement yet, no connection taken
+        assert session_manager.pool_status()["checked_out"] == 0
+        checkouts = session_manager.pool_status()["checkouts"]
+        for _ in range(3):
+            await session.execute(select(literal_column("1")))
+        # Consecutive reads share one connection and one read transaction
+        status = session_manager.pool_status()
+        assert status["checked_out"] == 1
+        assert status["checkouts"] == checkouts + 1
+        await session.end_read()
+        assert session_manager.pool_status()["checked_out"] == 0
+
+        await session.execute(insert(table("node", column("name"))).values(name="written"))
+        await session.execute(select(literal_column("1")))
+        # A write transaction keeps its connection until commit
+        assert session_manager.pool_status()["checked_out"] == 1
+        await session.end_read()
+        assert session_manager.pool_status()["checked_out"] == 1
+        await session.commit()
+        assert session_manager.pool_status()["checked_out"] == 0
+    await session_manager.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_session_scoped_route(tmp_path):
+    session_manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'scoped.db'}")
+    seen = {}
+
+    async def get_session():
+        async with session_manager.session() as session:
+            yield session
+        seen["closed"] = session_manager.pool_status()["checked_out"]
+
+    router = APIRouter(route_class=SessionScopedRoute)
+
+    @router.get("/reads")
+    async def reads(session=Depends(get_session)):
+        for _ in range(3):
+            await session.execute(select(literal_column("1")))
+        seen["endpoint"] = session_manager.pool_status()["checked_out"]
+        return SlowModel()
+
+    class SlowModel(BaseModel):
+        checked_out: int = 0
+
+        @model_serializer
+        def serialize(self):
+            # The response is serialized after the endpoint gave its connection back
+            return {"checked_out": session_manager.pool_status()["checked_out"]}
+
+    app = FastAPI()
+    app.include_router(router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/reads")
+    assert response.json() == {"checked_out": 0}
+    assert seen == {"endpoint": 1, "closed": 0}
+    assert session_manager.pool_status()["checkouts"] == 1
+    await session_manager.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_read_replica_routing(tmp_path, fake_redis):
+    session_manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}",
+                                             replica_url=f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}",
+                                             sticky_seconds=60, sticky_store=fake_redis)
+    for engine, name in ((session_manager.engine, "primary"), (session_manager.replica_engine, "replica")):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE node (name TEXT)"))
+            await conn.execute(text("INSERT INTO node VALUES (:name)"), {"name": name})
+
+    async def node_name(read_only, key):
+        async with session_manager.session(read_only=read_only, client_key=key) as session:
+            return (await session.execute(text("SELECT name FROM node ORDER BY rowid LIMIT 1"))).scalar_one()
+
+    assert await node_name(True, "client") == "replica"
+    assert await node_name(False, "client") == "primary"
+
+    async with session_manager.session(client_key="client") as session:
+        await session.execute(text("INSERT INTO node VALUES ('written')"))
+        await session.commit()
+
+    # Reads stick to the primary after a write, other clients keep using the replica
+    assert await node_name(True, "client") == "primary"
+    assert await node_name(True, "other_client") == "replica"
+
+    # The marker is shared through Redis: another process with the same store sticks too
+    other_process = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}",
+                                           replica_url=f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}",
+                                           sticky_store=fake_redis)
+    assert await other_process.is_sticky("client")
+    await other_process.close()
+    # Closing the manager closes its Redis client too
+    assert fake_redis.closed
+
+    # Redis expires the marker after the window
+    await fake_redis.delete(session_manager.sticky_key("client"))
+    assert await node_name(True, "client") == "replica"
+
+    # Without Redis a recent write can't be ruled out, reads go to the primary
+    broken = AsyncMock()
+    broken.exists.side_effect = redis.ConnectionError("down")
+    session_manager._sticky_store = broken
+    assert await node_name(True, "client") == "primary"
+
+    await session_manager.engine.dispose()
+    await session_manager.replica_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_client_key():
+    def request(token):
+        return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+    first = await auth_service.create_access_token({"sub": "user@example.com"})
+    second = await auth_service.create_access_token({"sub": "user@example.com"}, expires_delta=3600)
+    other = await auth_service.create_access_token({"sub": "other@example.com"})
+    refresh = await auth_service.create_refresh_token({"sub": "user@example.com"})
+    assert first != second
+
+    # Every access token of a user shares one read-your-writes marker
+    assert client_key(request(first)) == client_key(request(second)) is not None
+    assert client_key(request(other)) != client_key(request(first))
+    for token in (refresh, "not-a-jwt"):
+        assert client_key(request(token)) is None
+    assert client_key(Request({"type": "http", "headers": []})) is None
+
+
+@pytest.mark.asyncio
+async def test_warm_up(tmp_path):
+    session_manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'warm.db'}", pool_size=3)
+    await session_manager.warm_up(5)
+    status = session_manager.pool_status()
+    assert status["checked_in"] == 3
+    assert status["checked_out"] == 0
+    await session_manager.close()
@@ -0,0 +1,105 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.entity.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas.schemas import ContactFilter, ContactSort
+
+"""
+Кожен запит репозиторію контактів повинен використовувати індекс, а не повне сканування таблиці.
+Postgres перевіряється, якщо задано TEST_POSTGRES_URL.
+"""
+
+DATABASE_URLS = [
+    pytest.param("sqlite", id="sqlite"),
+    pytest.param(os.environ.get("TEST_POSTGRES_URL"), id="postgres",
+                 marks=pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"),
+                                          reason="TEST_POSTGRES_URL is not set")),
+]
+
+
+async def repository_queries(user: User, db):
+    today = date.today()
+    await repository_contacts.get_contacts(10, 0, db, user)
+    await repository_contacts.get_contact(1, user, db)
+    for filters in (ContactFilter(first_name="James"), ContactFilter(last_name="Bond"),
+                    ContactFilter(email="james_bond@gmail.com"), ContactFilter(phone="(777) 777-7777"),
+                    ContactFilter(phone_suffix="7777")):
+        await repository_contacts.get_contacts_page(10, None, ContactSort.id, db, user, filters)
+    await repository_contacts.upcoming_birthdays(today, today + timedelta(days=7), 0, 10, user, db)
+    for sort in ContactSort:
+        _, cursor = await repository_contacts.get_contacts_page(1, None, sort, db, user)
+        await repository_contacts.get_contacts_page(1, cursor, sort, db, user)
+        _, cursor = await repository_contacts.get_contacts_page(1, None, sort, db)
+        await repository_contacts.get_contacts_page(1, cursor, sort, db)
+    async for _ in repository_contacts.stream_contacts(10, db, user):
+        pass
+    await repository_contacts.search_contacts("bond", 10, 0, user, db)
+    await repository_contacts.get_contact_changes(None, user, db)
+    await repository_contacts.get_contact_changes(datetime(2020, 1, 1), user, db)
+
+
+def scans_contacts(statement: str, plan: list[str]) -> bool:
+    # Walking the whole table in primary key order is fine for a LIMIT query that needs no extra sort:
+    # it stops after one page.
+    ordered_page = "LIMIT" in statement and not any("TEMP B-TREE" in line for line in plan)
+    for line in plan:
+        # \b keeps the contacts_fts virtual table, which is searched through its own index, out of this
+        if re.search(r"SCAN contacts\b", line) and "USING" not in line and not ordered_page:
+            return True
+        if "Seq Scan on contacts" in line:
+            return True
+    return False
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", DATABASE_URLS)
+async def test_repository_queries_use_indexes(url, tmp_path):
+    if url == "sqlite":
+        url = f"sqlite+aiosqlite:///{tmp_path / 'explain.db'}"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        user = User(username="explain", email="explain@example.com", password="secret")
+        session.add(user)
+        await session.flush()
+        session.add(Contact(first_name="James", last_name="Bond", email="james_bond@gmail.com",
+                            contact_number="777-777-7777", birth_date=date(1980, 4, 18), user_id=user.id))
+        session.add(Contact(first_name="Miss", last_name="Moneypenny", email="moneypenny@gmail.com",
+                            contact_number="777-777-7778", birth_date=date(1982, 5, 1), user_id=user.id))
+        await session.commit()
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "contacts" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    async with session_maker() as session:
+        await repository_queries(user, session)
+    event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    assert len(statements) == 12 + 4 * len(ContactSort)
+
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # A table this small is always cheaper to scan, ask the planner whether an index can be used
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            explain = "EXPLAIN "
+        else:
+            explain = "EXPLAIN QUERY PLAN "
+        for statement, parameters in statements:
+            result = await conn.exec_driver_sql(explain + statement, parameters)
+            plan = [" ".join(str(column) for column in row) for row in result]
+            assert not scans_contacts(statement, plan), f"{statement}\n" + "\n".join(plan)
+
+    await engine.dispose()
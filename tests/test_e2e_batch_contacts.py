@@ -0,0 +1,91 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf import messages
+
+CONTACTS = [
+    {"first_name": "James", "last_name": "Bond", "email": "agent_007@gmail.com",
+     "contact_number": "777-777-7770", "birth_date": "1980-04-18", "additional_information": None},
+    {"first_name": "Felix", "last_name": "Leiter", "email": "felix@gmail.com",
+     "contact_number": "777-777-7771", "birth_date": "1975-02-10", "additional_information": None},
+]
+
+
+"""
+Пакетне отримання: знайдені контакти і 404 для чужих або неіснуючих.
+"""
+
+
+def test_get_contacts_batch(client, headers):
+    ids = []
+    for contact in CONTACTS:
+        response = client.post("/api/contacts", json=contact, headers=headers)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+
+    # Contact 1 belongs to no user
+    response = client.post("/api/contacts/batch/get", json={"ids": [ids[1], 1, ids[0], 99, ids[1]]},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+    assert [(item["id"], item["status"]) for item in items] == [(ids[1], 200), (1, 404), (ids[0], 200), (99, 404)]
+    assert items[0]["contact"]["email"] == "felix@gmail.com"
+    assert items[1]["detail"] == messages.CONTACT_NOT_FOUND
+
+    response = client.post("/api/contacts/batch/get", json={"ids": []}, headers=headers)
+    assert response.status_code == 422, response.text
+
+
+"""
+Пакетне оновлення: статус для кожного елемента, конфлікти не зупиняють інші оновлення.
+"""
+
+
+def test_update_contacts_batch(client, headers):
+    items = [
+        {**CONTACTS[0], "id": 2, "additional_information": "batch"},
+        # Taken by contact 1 of another user
+        {**CONTACTS[1], "id": 3, "email": "james_bond@gmail.com"},
+        {**CONTACTS[1], "id": 99},
+    ]
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "contacts.email IN" in statement:
+            statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.put("/api/contacts/batch", json={"items": items}, headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    assert response.status_code == 200, response.text
+    # The locking read never reaches another user's rows
+    assert len(statements) == 1 and "contacts.user_id = " in statements[0]
+    result = response.json()["items"]
+    assert [(item["id"], item["status"]) for item in result] == [(2, 200), (3, 409), (99, 404)]
+    assert result[0]["contact"]["additional_information"] == "batch"
+    assert result[1]["detail"] == messages.CONTACT_NUMBER_EMAIL_EXISTS
+
+    response = client.get("/api/contacts/3", headers=headers)
+    assert response.json()["email"] == "felix@gmail.com"
+    # The conflict with another user's contact didn't undo the other items
+    response = client.get("/api/contacts/2", headers=headers)
+    assert response.json()["additional_information"] == "batch"
+
+    response = client.put("/api/contacts/batch", json={"items": [items[0], items[0]]}, headers=headers)
+    assert response.status_code == 422, response.text
+
+
+"""
+Пакетне видалення.
+"""
+
+
+def test_remove_contacts_batch(client, headers):
+    response = client.post("/api/contacts/batch/delete", json={"ids": [2, 1, 3]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert [(item["id"], item["status"]) for item in response.json()["items"]] == [(2, 204), (1, 404), (3, 204)]
+
+    response = client.get("/api/contacts", headers=headers)
+    assert response.json() == []
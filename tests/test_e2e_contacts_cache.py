@@ -0,0 +1,119 @@
+from unittest.mock import AsyncMock
+
+import redis.asyncio as redis
+
+from src.services.contacts_cache import contacts_cache
+
+CONTACT = {"first_name": "Felix", "last_name": "Leiter", "email": "felix@gmail.com",
+           "contact_number": "777-777-7771", "birth_date": "1975-02-10", "additional_information": None}
+
+
+def counters(name: str) -> tuple[int, int]:
+    stats = contacts_cache.stats.get(name, {"hits": 0, "misses": 0})
+    return stats["hits"], stats["misses"]
+
+
+"""
+Кеш читань контактів у Redis: повторні читання з кешу, ключ - версія контактів з бази, як і в ETag.
+"""
+
+
+def test_list_read_through(client, headers):
+    response = client.post("/api/contacts", json=CONTACT, headers=headers)
+    assert response.status_code == 201, response.text
+
+    hits, misses = counters("contacts")
+    first = client.get("/api/contacts", headers=headers)
+    second = client.get("/api/contacts", headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert counters("contacts") == (hits + 1, misses + 1)
+    # user lookup and contacts version, the page came from the cache
+    assert int(second.headers["X-DB-Queries"]) == int(first.headers["X-DB-Queries"]) - 1
+
+    response = client.post("/api/contacts", headers=headers, json={
+        **CONTACT, "email": "felix_2@gmail.com", "contact_number": "777-777-7772"})
+    assert response.status_code == 201, response.text
+    response = client.get("/api/contacts", headers=headers)
+    assert "felix_2@gmail.com" in [item["email"] for item in response.json()]
+    assert counters("contacts") == (hits + 1, misses + 2)
+
+
+def test_contact_read_through(client, headers):
+    contact_id = client.get("/api/contacts", params={"fields": "email"}, headers=headers).json()[0]["id"]
+    # A single contact is cached only when its version was read anyway, for a conditional GET
+    revalidate = {**headers, "If-None-Match": '"stale"'}
+    hits, misses = counters("contact")
+    assert client.get(f"/api/contacts/{contact_id}", headers=headers).json()["first_name"] == "Felix"
+    assert counters("contact") == (hits, misses)
+    assert client.get(f"/api/contacts/{contact_id}", headers=revalidate).json()["first_name"] == "Felix"
+    assert client.get(f"/api/contacts/{contact_id}", headers=revalidate).json()["first_name"] == "Felix"
+    assert counters("contact") == (hits + 1, misses + 1)
+
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Felix II"}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.get(f"/api/contacts/{contact_id}", headers=revalidate)
+    assert response.json()["first_name"] == "Felix II"
+    assert response.headers["ETag"] == f'"{contact_id}-2"'
+
+    response = client.delete(f"/api/contacts/{contact_id}", headers=headers)
+    assert response.status_code == 204, response.text
+    assert client.get(f"/api/contacts/{contact_id}", headers=headers).status_code == 404
+
+
+def test_search_and_pages_read_through(client, headers):
+    hits, misses = counters("search")
+    for _ in range(2):
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "leiter"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [item["email"] for item in response.json()] == ["felix_2@gmail.com"]
+    assert counters("search") == (hits + 1, misses + 1)
+
+    hits, misses = counters("page")
+    for _ in range(2):
+        response = client.get("/api/contacts", params={"sort": "last_name", "limit": 1}, headers=headers)
+        assert response.status_code == 200, response.text
+    assert counters("page") == (hits + 1, misses + 1)
+
+    contact_id = response.json()["items"][0]["id"]
+    response = client.post("/api/contacts/batch/delete", json={"ids": [contact_id]}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.get("/api/contacts/search/fuzzy", params={"q": "leiter"}, headers=headers)
+    assert response.json() == []
+
+
+def test_cache_stats(client, headers):
+    response = client.get("/api/admin/contacts-cache", headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["enabled"] is True
+    assert body["hits"] >= 3 and body["misses"] >= 3
+    assert set(body["reads"]) >= {"contact", "contacts", "page", "search"}
+
+
+def test_cache_key_is_the_database_version(client, headers):
+    etag = client.get("/api/contacts", headers=headers).headers["ETag"]
+    keys = set(contacts_cache.client.data)
+    response = client.post("/api/contacts", headers=headers, json={
+        **CONTACT, "email": "felix_4@gmail.com", "contact_number": "777-777-7774"})
+    assert response.status_code == 201, response.text
+    # The write touched no cache key, the new version in the database is a new namespace
+    assert set(contacts_cache.client.data) == keys
+    response = client.get("/api/contacts", headers=headers)
+    assert response.headers["ETag"] != etag
+    assert "felix_4@gmail.com" in [item["email"] for item in response.json()]
+
+
+def test_redis_down_reads_the_database(client, headers, monkeypatch):
+    broken = AsyncMock()
+    broken.get.side_effect = broken.set.side_effect = redis.ConnectionError("down")
+    monkeypatch.setattr(contacts_cache, "client", broken)
+    errors = contacts_cache.errors
+
+    response = client.post("/api/contacts", headers=headers, json={
+        **CONTACT, "email": "felix_3@gmail.com", "contact_number": "777-777-7773"})
+    assert response.status_code == 201, response.text
+    response = client.get("/api/contacts", headers=headers)
+    assert response.status_code == 200, response.text
+    assert "felix_3@gmail.com" in [item["email"] for item in response.json()]
+    assert contacts_cache.errors == errors + 1
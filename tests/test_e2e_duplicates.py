@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from main import app
+from src.conf import messages
+from src.database.db import get_read_session_factory
+
+CONTACTS = [
+    {"first_name": "Jon", "last_name": "Smith", "email": "jon_smith@gmail.com",
+     "contact_number": "555-000-0001", "birth_date": "1985-06-01", "additional_information": "work"},
+    {"first_name": "John", "last_name": "Smith", "email": "john.smith@gmail.com",
+     "contact_number": "555-000-0002", "birth_date": "1985-06-01", "additional_information": "gym"},
+    {"first_name": "Felix", "last_name": "Leiter", "email": "felix_leiter@gmail.com",
+     "contact_number": "555-000-0003", "birth_date": "1975-02-10", "additional_information": None},
+]
+
+
+"""
+Пошук дублікатів у фоні, перелік знайдених пар і об'єднання пари.
+"""
+
+
+def test_scan_and_merge_duplicates(client, headers, monkeypatch):
+    # The background job opens its own sessions
+    session_factory = app.dependency_overrides[get_read_session_factory]()
+    monkeypatch.setattr("src.services.duplicates.sessionmanager", SimpleNamespace(session=session_factory))
+
+    ids = []
+    for contact in CONTACTS:
+        response = client.post("/api/contacts", json=contact, headers=headers)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+
+    response = client.post("/api/contacts/duplicates/scan", headers=headers)
+    assert response.status_code == 202, response.text
+
+    response = client.get("/api/contacts/duplicates", headers=headers)
+    assert response.status_code == 200, response.text
+    duplicates = response.json()
+    assert [(item["contact"]["id"], item["duplicate"]["id"], item["reason"]) for item in duplicates] == \
+           [(ids[0], ids[1], "name")]
+    duplicate_id = duplicates[0]["id"]
+
+    response = client.post(f"/api/contacts/duplicates/{duplicate_id}/merge", params={"keep": ids[2]},
+                           headers=headers)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == messages.DUPLICATE_KEEP_INVALID
+
+    response = client.post(f"/api/contacts/duplicates/{duplicate_id}/merge", params={"keep": ids[1]},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == ids[1]
+    assert response.json()["additional_information"] == "gym\nwork"
+
+    response = client.get(f"/api/contacts/{ids[0]}", headers=headers)
+    assert response.status_code == 404, response.text
+    response = client.get("/api/contacts/duplicates", headers=headers)
+    assert response.json() == []
+
+    response = client.post(f"/api/contacts/duplicates/{duplicate_id}/merge", params={"keep": ids[1]},
+                           headers=headers)
+    assert response.status_code == 404, response.text
+    assert response.json()["detail"] == messages.DUPLICATE_NOT_FOUND
@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+from src.conf import messages
+
+CONTACT = {"first_name": "Felix", "last_name": "Leiter", "email": "felix@gmail.com",
+           "contact_number": "777-777-7771", "birth_date": "1975-02-10", "additional_information": None}
+
+
+"""
+Умовні запити: ETag і If-None-Match для списку, одного контакту і днів народження.
+"""
+
+
+def test_list_not_modified(client, headers):
+    response = client.post("/api/contacts", json=CONTACT, headers=headers)
+    assert response.status_code == 201, response.text
+
+    response = client.get("/api/contacts", headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/contacts", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    response = client.get("/api/contacts", headers={**headers, "If-None-Match": "*"})
+    assert response.status_code == 304, response.text
+
+    # Another query of the same contacts is another representation
+    response = client.get("/api/contacts", params={"fields": "email"}, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+
+
+def test_list_modified_after_write(client, headers):
+    etag = client.get("/api/contacts", headers=headers).headers["ETag"]
+    response = client.post("/api/contacts", headers=headers, json={
+        **CONTACT, "email": "felix_2@gmail.com", "contact_number": "777-777-7772"})
+    assert response.status_code == 201, response.text
+
+    response = client.get("/api/contacts", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    assert "felix_2@gmail.com" in [item["email"] for item in response.json()]
+
+
+def test_contact_not_modified(client, headers):
+    contact_id = client.post("/api/contacts", headers=headers, json={
+        **CONTACT, "email": "felix_3@gmail.com", "contact_number": "777-777-7773"}).json()["id"]
+
+    response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag
+
+    response = client.put(f"/api/contacts/{contact_id}", headers=headers, json={**CONTACT, "first_name": "Felix II",
+                          "email": "felix_3@gmail.com", "contact_number": "777-777-7773"})
+    assert response.status_code == 200, response.text
+
+    response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.json()["first_name"] == "Felix II"
+    assert response.headers["ETag"] != etag
+
+    response = client.get("/api/contacts/9999", headers={**headers, "If-None-Match": "*"})
+    assert response.status_code == 404, response.text
+
+
+def test_birthdays_etag_changes_with_date(client, headers, monkeypatch):
+    class Today(date):
+        current = date.today()
+
+        @classmethod
+        def today(cls):
+            return cls.current
+
+    monkeypatch.setattr("src.routes.contacts.date", Today)
+    response = client.get("/api/contacts/birthdays/", headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/contacts/birthdays/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+
+    Today.current = Today.current + timedelta(days=1)
+    response = client.get("/api/contacts/birthdays/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+
+
+"""
+Оптимістичне блокування: If-Match на PUT і PATCH, 412 якщо контакт змінився після читання.
+"""
+
+
+def test_if_match(client, headers):
+    body = {**CONTACT, "email": "felix_4@gmail.com", "contact_number": "777-777-7774"}
+    contact_id = client.post("/api/contacts", headers=headers, json=body).json()["id"]
+    etag = client.get(f"/api/contacts/{contact_id}", headers=headers).headers["ETag"]
+    assert etag == f'"{contact_id}-1"'
+
+    # Two devices read the same version, the first write wins
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Device A"},
+                            headers={**headers, "If-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == f'"{contact_id}-2"'
+
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Device B"},
+                            headers={**headers, "If-Match": etag})
+    assert response.status_code == 412, response.text
+    assert response.json()["detail"] == messages.CONTACT_VERSION_MISMATCH
+    response = client.put(f"/api/contacts/{contact_id}", json={**body, "first_name": "Device B"},
+                          headers={**headers, "If-Match": etag})
+    assert response.status_code == 412, response.text
+    assert client.get(f"/api/contacts/{contact_id}", headers=headers).json()["first_name"] == "Device A"
+
+    response = client.put(f"/api/contacts/{contact_id}", json={**body, "first_name": "Device B"},
+                          headers={**headers, "If-Match": f'"other", "{contact_id}-2"'})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == f'"{contact_id}-3"'
+
+    # Weak tags never match If-Match
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Device C"},
+                            headers={**headers, "If-Match": f'W/"{contact_id}-3"'})
+    assert response.status_code == 412, response.text
+
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Device C"},
+                            headers={**headers, "If-Match": "*"})
+    assert response.status_code == 200, response.text
+    response = client.patch(f"/api/contacts/{contact_id}", json={"first_name": "Device D"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == f'"{contact_id}-5"'
+
+    response = client.patch("/api/contacts/9999", json={"first_name": "Nobody"},
+                            headers={**headers, "If-Match": '"9999-1"'})
+    assert response.status_code == 404, response.text
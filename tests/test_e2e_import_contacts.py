@@ -0,0 +1,110 @@
+from io import BytesIO
+
+import pytest
+
+from src.conf import messages
+from src.services.contacts_import import ImportJobs
+
+CSV_FILE = (
+    "first_name,last_name,email,contact_number,birth_date,additional_information\n"
+    "James,Bond,agent_007@gmail.com,777-777-7770,1980-04-18,agent\n"
+    "Miss,Moneypenny,moneypenny@gmail.com,777-777-7778,1982-05-01,\n"
+    "Bad,Phone,bad_phone@gmail.com,not-a-number,1982-05-01,\n"
+    "James,Copy,agent_007@gmail.com,777-777-7779,1980-04-18,\n"
+)
+
+NDJSON_FILE = (
+    '{"first_name": "James", "last_name": "Bond", "email": "james_bond@gmail.com",'
+    ' "contact_number": "777-777-7777", "birth_date": "1980-04-18"}\n'
+    '{"first_name": "Felix", "last_name": "Leiter", "email": "felix@gmail.com",'
+    ' "contact_number": "777-777-7780", "birth_date": "1975-02-10"}\n'
+    '\n'
+    '{"first_name": "Broken"\n'
+)
+
+
+"""
+Імпорт CSV: коректні рядки записуються, помилки повертаються з номером рядка.
+"""
+
+
+def test_import_csv(client, headers):
+    response = client.post("/api/contacts/import", headers=headers,
+                           files={"file": ("contacts.csv", BytesIO(CSV_FILE.encode()), "text/csv")})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["processed"] == 4
+    assert data["inserted"] == 2
+    assert data["failed"] == 2
+    assert [error["row"] for error in data["errors"]] == [4, 5]
+    assert data["errors"][1]["error"] == messages.CONTACT_EMAIL_EXISTS
+
+    response = client.get("/api/contacts", headers=headers)
+    assert sorted(contact["email"] for contact in response.json()) == ["agent_007@gmail.com",
+                                                                       "moneypenny@gmail.com"]
+
+
+"""
+Імпорт NDJSON: дублікати наявних контактів і некоректний JSON не зупиняють імпорт.
+"""
+
+
+def test_import_ndjson(client, headers):
+    response = client.post("/api/contacts/import?format=ndjson", headers=headers,
+                           files={"file": ("contacts.ndjson", BytesIO(NDJSON_FILE.encode()),
+                                           "application/x-ndjson")})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["processed"] == 3
+    assert data["inserted"] == 1
+    assert data["errors"][0] == {"row": 4, "error": data["errors"][0]["error"]}
+    assert data["errors"][0]["error"].startswith("Invalid JSON")
+    assert data["errors"][1] == {"row": 1, "error": messages.CONTACT_NUMBER_EMAIL_EXISTS}
+
+
+"""
+Стан неіснуючого фонового імпорту.
+"""
+
+
+def test_import_job_not_found(client, headers):
+    response = client.get("/api/contacts/import/unknown", headers=headers)
+    assert response.status_code == 404, response.text
+    assert response.json()["detail"] == messages.IMPORT_JOB_NOT_FOUND
+
+
+"""
+Файл не в UTF-8: імпорт завершується зі статусом failed, а не помилкою сервера.
+"""
+
+
+def test_import_not_utf8(client, headers):
+    rows = "".join(f"Latin,Row,latin_{number}@gmail.com,555-100-{number:04},1980-04-18,\n" for number in range(300))
+    latin1 = CSV_FILE.splitlines()[0] + "\n" + rows + "José,Latin,jose@gmail.com,555-200-0000,1980-04-18,\n"
+    response = client.post("/api/contacts/import", headers=headers,
+                           files={"file": ("contacts.csv", BytesIO(latin1.encode("latin-1")), "text/csv")})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["status"] == "failed"
+    # The rows decoded before the bad bytes are imported, the error says where reading stopped
+    assert 0 < data["inserted"] == data["processed"] < 300
+    assert data["errors"] == [{"row": data["processed"] + 2, "error": data["errors"][0]["error"]}]
+    assert data["errors"][0]["error"].startswith(messages.IMPORT_FILE_NOT_UTF8)
+
+
+"""
+Звіти фонового імпорту в Redis: стан видно з будь-якого процесу, але лише власнику.
+"""
+
+
+@pytest.mark.asyncio
+async def test_import_jobs_are_shared(fake_redis):
+    report = await ImportJobs(fake_redis).create(user_id=1)
+    report.status, report.inserted = "completed", 3
+    await ImportJobs(fake_redis).save(report, user_id=1)
+
+    other_process = ImportJobs(fake_redis)
+    assert await other_process.get(report.job_id, user_id=1) == report
+    assert await other_process.get(report.job_id, user_id=2) is None
+    assert await other_process.get("unknown", user_id=1) is None
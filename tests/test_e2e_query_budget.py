@@ -0,0 +1,38 @@
+import logging
+
+from src.database.instrumentation import RequestQueries
+
+"""
+Кількість SQL-запитів, які виконує кожен маршрут (заголовок X-DB-Queries).
+"""
+
+
+def test_create_contact_query_budget(client, headers):
+    response = client.post("api/contacts", headers=headers, json={
+        "first_name": "Budget",
+        "last_name": "Create",
+        "email": "budget_create@gmail.com",
+        "contact_number": "555-555-5555",
+        "birth_date": "1990-04-20",
+    })
+    assert response.status_code == 201, response.text
+    # user lookup, INSERT ... RETURNING
+    assert int(response.headers["X-DB-Queries"]) <= 2
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_get_contacts_query_budget(client, headers):
+    response = client.get("api/contacts", headers=headers)
+    assert response.status_code == 200, response.text
+    # user lookup, contacts version for the ETag, contacts page.
+    # The version read is what lets an If-None-Match request stop before the page is read
+    assert int(response.headers["X-DB-Queries"]) <= 3
+
+
+def test_repeated_statement_warning(caplog):
+    queries = RequestQueries(route="GET /api/contacts", repeat_threshold=2)
+    with caplog.at_level(logging.WARNING):
+        for _ in range(5):
+            queries.record("SELECT * FROM users WHERE id = ?", 0.001)
+    assert queries.count == 5
+    assert len([record for record in caplog.records if "N+1" in record.message]) == 1
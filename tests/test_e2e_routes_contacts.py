@@ -1,8 +1,11 @@
+import json
 from datetime import datetime
 from io import BytesIO
 from unittest.mock import AsyncMock, patch
 
 from fastapi import status, HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from starlette.testclient import TestClient
 
 from main import app
@@ -67,6 +70,33 @@ def test_get_all_contacts(client, get_token, monkeypatch):
         assert data[0]["first_name"] == "James config"
 
 
+"""
+Отримати список всіх контактів за курсором. all
+"""
+
+
+def test_get_all_contacts_cursor(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache") as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Passing RateLimiter
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        response = client.get("api/contacts/all", params={"sort": "last_name", "limit": 1}, headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert len(data["items"]) == 1
+        assert data["items"][0]["last_name"] == "Bond"
+        assert data["next_cursor"] is None
+
+        response = client.get("api/contacts/all", params={"cursor": "invalid"}, headers=headers)
+        assert response.status_code == 400, response.text
+
+
 """
 Створити новий контакт.
 """
@@ -129,6 +159,63 @@ def test_get_contact(client, get_token, monkeypatch):
         assert data["first_name"] == "James II"
 
 
+"""
+Отримати лише вибрані поля контакту (fields) і власника контакту (include=user).
+"""
+
+
+def test_get_contact_fields(client, get_token, monkeypatch):
+    with patch.object(auth_service, "cache") as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+
+        # Passing RateLimiter
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if "FROM contacts" in statement:
+                statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", capture)
+        try:
+            response = client.get("api/contacts/2", params={"fields": "first_name,email"}, headers=headers)
+        finally:
+            event.remove(Engine, "before_cursor_execute", capture)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"id": 2, "first_name": "James II", "email": "jamesII@gmail.com"}
+        # One statement: the projected columns, plus the version for the ETag
+        assert len(statements) == 1
+        assert "users" not in statements[0] and "additional_information" not in statements[0]
+        assert "contacts.version" in statements[0] and response.headers["ETag"] == '"2-1"'
+
+        response = client.get("api/contacts/2", headers=headers)
+        assert "user" not in response.json()
+        assert response.json()["additional_information"] is None
+
+        response = client.get("api/contacts/2", params={"fields": "last_name", "include": "user"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["last_name"] == "Bond II"
+        assert response.json()["user"]["email"] == "test@example.com"
+
+        response = client.get("api/contacts/all", params={"fields": "email", "include": "user", "sort": "id"},
+                              headers=headers)
+        assert response.status_code == 200, response.text
+        assert [item["user"] and item["user"]["email"] for item in response.json()["items"]] == \
+               [None, "test@example.com"]
+
+        response = client.get("api/contacts/2", params={"fields": "email,password"}, headers=headers)
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == f"{messages.CONTACT_FIELDS_INVALID}: password"
+
+        response = client.get("api/contacts/2", params={"include": "avatar"}, headers=headers)
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == messages.CONTACT_INCLUDE_INVALID
+
+
 """
 Отримати один контакт за ідентифікатором, який не існує.
 """
@@ -237,7 +324,7 @@ def test_update_contact_email_exists(client, get_token, monkeypatch):
         response = client.put("/api/contacts/2",
                               json={"first_name": "James_updated",
                                     "last_name": "Bond",
-                                    "email": "james_updated@gmail.com",
+                                    "email": "james_bond@gmail.com",
                                     "contact_number": "333-333-3333",
                                     "birth_date": json_serial(new_birth_date),
                                     }, headers=headers)
@@ -268,7 +355,7 @@ def test_update_contact_number_exists(client, get_token, monkeypatch):
                               json={"first_name": "James_updated",
                                     "last_name": "Bond",
                                     "email": "james_updated@gmail.com",
-                                    "contact_number": "333-333-4444",
+                                    "contact_number": "777-777-7777",
                                     "birth_date": json_serial(new_birth_date),
                                     }, headers=headers)
 
@@ -276,6 +363,149 @@ def test_update_contact_number_exists(client, get_token, monkeypatch):
         data = response.json()
         assert data["detail"] == messages.CONTACT_NUMBER_EMAIL_EXISTS
 
+        # The same number written in another format
+        response = client.put("/api/contacts/2",
+                              json={"first_name": "James_updated",
+                                    "last_name": "Bond",
+                                    "email": "james_updated@gmail.com",
+                                    "contact_number": "(777) 777.7777",
+                                    "birth_date": json_serial(new_birth_date),
+                                    }, headers=headers)
+
+        assert response.status_code == 409, response.text
+        assert response.json()["detail"] == messages.CONTACT_NUMBER_EMAIL_EXISTS
+
+
+"""
+Частково оновити існуючий контакт.
+"""
+
+
+def test_patch_contact(client, get_token, monkeypatch):
+    with patch.object(auth_service, 'cache') as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        response = client.patch("/api/contacts/2", json={"additional_information": "patched"}, headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["additional_information"] == "patched"
+        assert data["first_name"] == "James_updated"
+        assert data["email"] == "james_updated@gmail.com"
+        assert data["user"]["email"] == "test@example.com"
+
+        response = client.patch("/api/contacts/2", json={"contact_number": "777-777-7777"}, headers=headers)
+        assert response.status_code == 409, response.text
+        assert response.json()["detail"] == messages.CONTACT_NUMBER_EMAIL_EXISTS
+
+        response = client.patch("/api/contacts/2", json={"first_name": None}, headers=headers)
+        assert response.status_code == 422, response.text
+
+        response = client.patch("/api/contacts/9", json={"first_name": "Nobody"}, headers=headers)
+        assert response.status_code == 404, response.text
+
+
+"""
+Експорт контактів користувача у всіх форматах.
+"""
+
+
+def test_export_contacts(client, get_token, monkeypatch):
+    with patch.object(auth_service, 'cache') as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        response = client.get("/api/contacts/export", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.headers["content-disposition"] == 'attachment; filename="contacts.csv"'
+        lines = response.text.splitlines()
+        assert lines[0].startswith("id,first_name,last_name,email,contact_number,birth_date")
+        assert len(lines) == 2
+        assert "james_updated@gmail.com" in lines[1]
+
+        response = client.get("/api/contacts/export?format=ndjson", headers=headers)
+        assert response.status_code == 200, response.text
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["email"] for row in rows] == ["james_updated@gmail.com"]
+        assert rows[0]["additional_information"] == "patched"
+
+        response = client.get("/api/contacts/export?format=vcard", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.text.startswith("BEGIN:VCARD\r\nVERSION:3.0\r\nN:")
+        assert "EMAIL;TYPE=INTERNET:james_updated@gmail.com\r\n" in response.text
+        assert response.text.endswith("END:VCARD\r\n")
+
+        response = client.get("/api/contacts/all/export?format=ndjson", headers=headers)
+        assert response.status_code == 200, response.text
+        emails = [json.loads(line)["email"] for line in response.text.splitlines()]
+        assert emails == ["james_bond@gmail.com", "james_updated@gmail.com"]
+
+
+"""
+Нечіткий пошук контактів.
+"""
+
+
+def test_search_contacts_fuzzy(client, get_token, monkeypatch):
+    with patch.object(auth_service, 'cache') as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "JAMSE_updated"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["email"] for contact in response.json()] == ["james_updated@gmail.com"]
+
+        response = client.get("/api/contacts/search/fuzzy", params={"q": ""}, headers=headers)
+        assert response.status_code == 422, response.text
+
+
+"""
+Автодоповнення: індекс будується при першому запиті, далі відповіді без запитів до бази даних.
+"""
+
+
+def test_autocomplete_contacts(client, get_token, monkeypatch):
+    with patch.object(auth_service, 'cache') as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        response = client.get("/api/contacts/autocomplete", params={"q": "JAMES_"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["email"] for contact in response.json()] == ["james_updated@gmail.com"]
+        first_queries = int(response.headers["X-DB-Queries"])
+
+        response = client.get("/api/contacts/autocomplete", params={"q": "james_updated@"}, headers=headers)
+        assert [contact["id"] for contact in response.json()] == [2]
+        assert int(response.headers["X-DB-Queries"]) == first_queries - 1
+
+        response = client.patch("/api/contacts/2", json={"last_name": "Fleming"}, headers=headers)
+        assert response.status_code == 200, response.text
+        response = client.get("/api/contacts/autocomplete", params={"q": "flem"}, headers=headers)
+        assert [contact["last_name"] for contact in response.json()] == ["Fleming"]
+        response = client.patch("/api/contacts/2", json={"last_name": "Bond"}, headers=headers)
+        assert response.status_code == 200, response.text
+
 
 """
 Контакти повинні бути доступні для пошуку за іменем.
@@ -293,7 +523,7 @@ def test_find_by_first_name(client, get_token, monkeypatch):
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
 
         response = client.get(f"/api/contacts/search/?first_name=James_updated", headers=headers)
-        data = response.json()
+        data = response.json()["items"]
         print(f"DATA: {data}")
         assert len(data) == 1
         assert "id" in data[0]
@@ -319,7 +549,7 @@ def test_find_by_last_name(client, get_token, monkeypatch):
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
 
         response = client.get(f"/api/contacts/search/?last_name=Bond", headers=headers)
-        data = response.json()
+        data = response.json()["items"]
         print(f"DATA: {data}")
         assert len(data) == 1
         assert "id" in data[0]
@@ -345,13 +575,42 @@ def test_find_by_email(client, get_token, monkeypatch):
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
 
         response = client.get(f"/api/contacts/search/?email=james_updated@gmail.com", headers=headers)
-        data = response.json()
+        data = response.json()["items"]
         print(f"DATA: {data}")
-        assert "id" in data
-        assert data["first_name"] == "James_updated"
-        assert data["last_name"] == "Bond"
-        assert data["email"] == "james_updated@gmail.com"
-        assert data["contact_number"] == "333-333-3333"
+        assert len(data) == 1
+        assert "id" in data[0]
+        assert data[0]["first_name"] == "James_updated"
+        assert data[0]["last_name"] == "Bond"
+        assert data[0]["email"] == "james_updated@gmail.com"
+        assert data[0]["contact_number"] == "333-333-3333"
+
+
+"""
+Пошук за кількома фільтрами одночасно; якщо нічого не знайдено - порожня сторінка замість 404.
+"""
+
+
+def test_find_combined_filters(client, get_token, monkeypatch):
+    with patch.object(auth_service, 'cache') as redis_mock:
+        redis_mock.get.return_value = None
+        token = get_token
+        headers = {"Authorization": f"Bearer {token}"}
+
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
+        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
+
+        params = {"last_name": "Bond", "birth_date_from": "2000-01-01", "birth_date_to": "2005-01-01"}
+        response = client.get("/api/contacts/search/", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["id"] for contact in response.json()["items"]] == [2]
+
+        response = client.get("/api/contacts/search/", params={**params, "first_name": "Nobody"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"items": [], "next_cursor": None}
+
+        response = client.get("/api/contacts/search/", params={"phone_suffix": "3333"}, headers=headers)
+        assert [contact["id"] for contact in response.json()["items"]] == [2]
 
 
 """
@@ -376,7 +635,7 @@ def test_find_no_parameters(client, get_token, monkeypatch):
 
 
 """
-Отримання списку контактів з днями народження на найближчі 7 днів
+Отримання списку контактів з днями народження на найближчі N днів
 """
 
 
@@ -390,12 +649,16 @@ def test_get_upcoming_birthdays(client, get_token, monkeypatch):
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
         monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
 
-        response = client.get("/api/contacts/birthdays/", headers=headers)
+        # A full-year window always contains the contact born on 20 April
+        response = client.get("/api/contacts/birthdays/", params={"days": 365}, headers=headers)
         data = response.json()
         print(f"DATA: {data}")
         assert response.status_code == 200, response.text
         assert len(data) == 1
 
+        response = client.get("/api/contacts/birthdays/", params={"days": 400}, headers=headers)
+        assert response.status_code == 422, response.text
+
 
 """
 Завантаження файлу.
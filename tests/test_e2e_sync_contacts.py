@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from src.conf import messages
+from src.conf.config import config
+from src.repository.contacts import encode_sync_token
+
+CONTACTS = [
+    {"first_name": "James", "last_name": "Bond", "email": "agent_007@gmail.com",
+     "contact_number": "777-777-7770", "birth_date": "1980-04-18", "additional_information": None},
+    {"first_name": "Felix", "last_name": "Leiter", "email": "felix@gmail.com",
+     "contact_number": "777-777-7771", "birth_date": "1975-02-10", "additional_information": None},
+    {"first_name": "Miss", "last_name": "Moneypenny", "email": "moneypenny@gmail.com",
+     "contact_number": "777-777-7772", "birth_date": "1982-05-01", "additional_information": None},
+]
+
+
+"""
+Синхронізація змін: змінені та видалені контакти після токена.
+"""
+
+
+def test_sync_changes(client, headers, monkeypatch):
+    monkeypatch.setattr(config, "SYNC_OVERLAP_SECONDS", 0)
+    ids = []
+    for contact in CONTACTS:
+        response = client.post("/api/contacts", json=contact, headers=headers)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+
+    # Full sync
+    response = client.get("/api/contacts/changes", headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["id"] for item in body["changed"]] == ids
+    assert body["deleted"] == []
+    token = body["token"]
+
+    response = client.patch(f"/api/contacts/{ids[0]}", json={"first_name": "Jim"}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.delete(f"/api/contacts/{ids[2]}", headers=headers)
+    assert response.status_code == 204, response.text
+
+    response = client.get("/api/contacts/changes", params={"since": token}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    changed = {item["id"]: item for item in body["changed"]}
+    # Contacts written in the second before the token may come again
+    assert changed[ids[0]]["first_name"] == "Jim"
+    assert ids[2] not in changed
+    assert body["deleted"] == [ids[2]]
+
+    # Nothing changed after this moment
+    future = encode_sync_token(datetime.utcnow() + timedelta(hours=1))
+    response = client.get("/api/contacts/changes", params={"since": future, "fields": "email"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["changed"] == [] and response.json()["deleted"] == []
+
+    response = client.get("/api/contacts/changes", params={"since": token, "fields": "email"}, headers=headers)
+    assert set(response.json()["changed"][0]) == {"id", "email"}
+
+
+def test_sync_invalid_token(client, headers):
+    response = client.get("/api/contacts/changes", params={"since": "not a token"}, headers=headers)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == messages.SYNC_TOKEN_INVALID
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import instrumentation
+from src.database.instrumentation import SlowQueryLog, instrument_engine
+from src.services.auth import auth_service
+
+
+def test_normalize():
+    statement = "SELECT contacts.id\n  FROM contacts WHERE contacts.id IN (?, ?, ?) AND contacts.user_id = ?"
+    assert SlowQueryLog.normalize(statement) == \
+           "SELECT contacts.id FROM contacts WHERE contacts.id IN (...) AND contacts.user_id = ?"
+    assert SlowQueryLog.parameter_shapes((1, "a"), False) == ["int", "str"]
+    assert SlowQueryLog.parameter_shapes([{"id": 1}], True) == {"id": "int"}
+
+
+@pytest.mark.asyncio
+async def test_slow_query_plan_captured(tmp_path, monkeypatch):
+    log = SlowQueryLog(threshold_ms=0, size=2, explain_concurrency=3, explain_window=0)
+    monkeypatch.setattr(instrumentation, "slow_query_log", log)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE node (id INTEGER PRIMARY KEY, name TEXT)"))
+        for number in range(3):
+            await conn.execute(text("SELECT name FROM node WHERE id = :id"), {"id": number})
+    await log.wait_for_plans()
+
+    # The ring keeps only the newest entries
+    assert len(log.entries) == 2
+    entry = log.entries[-1]
+    assert entry["statement"] == "SELECT name FROM node WHERE id = ?"
+    assert entry["parameters"] == ["int"]
+    assert any("node" in line for line in entry["plan"])
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_slow_query_plans_bounded(tmp_path, monkeypatch):
+    log = SlowQueryLog(threshold_ms=0, size=10, explain_concurrency=1, explain_window=60)
+    monkeypatch.setattr(instrumentation, "slow_query_log", log)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bounded.db'}")
+    instrument_engine(engine)
+    async with engine.connect() as conn:
+        # The same statement is explained once per window
+        for number in range(3):
+            await conn.execute(text("SELECT :id"), {"id": number})
+        await log.wait_for_plans()
+        assert [entry["plan"] is not None for entry in log.entries] == [True, False, False]
+        assert log.plans_deduplicated == 2
+
+        # Another statement while the only EXPLAIN slot is busy gets no plan
+        assert log._explain_slots.acquire(blocking=False)
+        await conn.execute(text("SELECT 2 + :id"), {"id": 1})
+        assert log.entries[-1]["plan"] is None
+        assert log.plans_dropped == 1
+        log._explain_slots.release()
+
+        # Once the slot is free the statement is explained, it wasn't marked as explained when dropped
+        await conn.execute(text("SELECT 2 + :id"), {"id": 1})
+        await log.wait_for_plans()
+        assert log.entries[-1]["plan"] is not None
+    await engine.dispose()
+
+
+def test_get_slow_queries(client, get_token):
+    with patch.object(auth_service, "cache") as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/api/admin/slow-queries", headers={"Authorization": f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        assert "queries" in response.json()
+
+        for limit in (0, -1, 10_000):
+            response = client.get("/api/admin/slow-queries", params={"limit": limit},
+                                  headers={"Authorization": f"Bearer {get_token}"})
+            assert response.status_code == 422, response.text
+
+
+def test_get_pool_status(client, get_token):
+    response = client.get("/api/admin/pool")
+    assert response.status_code == 401, response.text
+
+    with patch.object(auth_service, "cache") as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {get_token}"})
+        assert response.status_code == 200, response.text
+        assert "pool_class" in response.json()
@@ -0,0 +1,44 @@
+import unittest
+from datetime import date
+from types import SimpleNamespace
+
+from src.services.duplicates import find_duplicate_pairs
+
+
+def contact(contact_id, first_name, last_name, email, contact_number, birth_date=date(1980, 4, 18)):
+    return SimpleNamespace(id=contact_id, first_name=first_name, last_name=last_name, email=email,
+                           contact_number=contact_number, birth_date=birth_date)
+
+
+class TestFindDuplicatePairs(unittest.TestCase):
+
+    def test_same_email_ignoring_case(self):
+        contacts = [contact(2, "James", "Bond", "James.Bond@gmail.com", "111-111-1111", date(1980, 1, 1)),
+                    contact(1, "Jim", "Smith", "james.bond@gmail.com", "222-222-2222", date(1990, 1, 1))]
+        self.assertEqual(find_duplicate_pairs(contacts), {(1, 2): "email"})
+
+    def test_same_number_in_another_format(self):
+        contacts = [contact(1, "James", "Bond", "a@gmail.com", "(777) 777-7777", date(1980, 1, 1)),
+                    contact(2, "Felix", "Leiter", "b@gmail.com", "+1 777 777 7777", date(1990, 1, 1))]
+        self.assertEqual(find_duplicate_pairs(contacts), {(1, 2): "phone"})
+
+    def test_similar_names_with_same_birth_date(self):
+        contacts = [contact(1, "Jon", "Smith", "a@gmail.com", "111-111-1111"),
+                    contact(2, "John", "Smith", "b@gmail.com", "222-222-2222"),
+                    contact(3, "John", "Smith", "c@gmail.com", "333-333-3333", date(1981, 4, 18)),
+                    contact(4, "Jane", "Doe", "d@gmail.com", "444-444-4444")]
+        self.assertEqual(find_duplicate_pairs(contacts), {(1, 2): "name"})
+
+    def test_typo_in_first_letter_of_first_name(self):
+        contacts = [contact(1, "Katherine", "Johnson", "a@gmail.com", "111-111-1111"),
+                    contact(2, "Catherine", "Johnson", "b@gmail.com", "222-222-2222")]
+        self.assertEqual(find_duplicate_pairs(contacts), {(1, 2): "name"})
+
+    def test_large_name_block_is_skipped(self):
+        contacts = [contact(i, "John", "Smith", f"{i}@gmail.com", f"111-111-{i:04}") for i in range(1, 5)]
+        self.assertEqual(find_duplicate_pairs(contacts, max_block_size=3), {})
+        self.assertEqual(len(find_duplicate_pairs(contacts, max_block_size=4)), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.requests import Request
+
+from src.entity.models import Base, Contact, User
+from src.repository.contacts import get_contacts_version
+from src.services.etag import (contact_etag, etag_matches, if_match_versions,
+                               make_etag, not_modified)
+
+
+def request(if_none_match: str | None = None, if_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    headers += [(b"if-match", if_match.encode())] if if_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+class TestETag(unittest.TestCase):
+
+    def test_make_etag_is_quoted_and_stable(self):
+        etag = make_etag(1, datetime(2024, 1, 1, 12), ["id", "email"])
+        self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+        self.assertEqual(etag, make_etag(1, datetime(2024, 1, 1, 12), ["id", "email"]))
+
+    def test_make_etag_changes_with_every_part(self):
+        etag = make_etag(1, 5, date(2024, 1, 1))
+        self.assertNotEqual(etag, make_etag(1, 6, date(2024, 1, 1)))
+        self.assertNotEqual(etag, make_etag(1, 5, date(2024, 1, 2)))
+        self.assertNotEqual(etag, make_etag(2, 5, date(2024, 1, 1)))
+
+    def test_matches(self):
+        etag = make_etag(1)
+        self.assertTrue(etag_matches(request(etag), etag))
+        self.assertTrue(etag_matches(request(f'"other", {etag}'), etag))
+        self.assertTrue(etag_matches(request(f"W/{etag}"), etag))
+        self.assertTrue(etag_matches(request("*"), etag))
+
+    def test_does_not_match(self):
+        etag = make_etag(1)
+        self.assertFalse(etag_matches(request(), etag))
+        self.assertFalse(etag_matches(request(""), etag))
+        self.assertFalse(etag_matches(request(make_etag(2)), etag))
+        self.assertFalse(etag_matches(request(etag.strip('"')), etag))
+
+    def test_if_match_versions(self):
+        self.assertIsNone(if_match_versions(request(), 7))
+        self.assertIsNone(if_match_versions(request(if_match="*"), 7))
+        self.assertEqual(if_match_versions(request(if_match=contact_etag(7, 3)), 7), [3])
+        self.assertEqual(if_match_versions(request(if_match='"7-3", "8-4", "7-5"'), 7), [3, 5])
+        # Weak, unquoted, other contacts' and malformed tags allow no version
+        self.assertEqual(if_match_versions(request(if_match='W/"7-3", 7-3, "8-3", "7-x", "abc"'), 7), [])
+
+    def test_not_modified(self):
+        response = not_modified('"abc"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"abc"')
+        self.assertEqual(response.body, b"")
+
+
+class TestContactsVersion(unittest.IsolatedAsyncioTestCase):
+    """
+    The contacts_version triggers bump the owner's version on every write, whichever code path makes it.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(username="owner", email="owner@example.com", password="secret")
+        self.other = User(username="other", email="other@example.com", password="secret")
+        self.session.add_all([self.user, self.other])
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def contact(self, number: int, user: User) -> dict:
+        return {"first_name": f"First{number}", "last_name": f"Last{number}", "email": f"c{number}@example.com",
+                "contact_number": f"555-000-{number:04}", "birth_date": date(1980, 1, 1), "user_id": user.id}
+
+    async def versions(self) -> tuple[int, int]:
+        return await get_contacts_version(self.user, self.session), await get_contacts_version(self.other, self.session)
+
+    async def test_new_user_starts_at_zero(self):
+        self.assertEqual(await self.versions(), (0, 0))
+
+    async def test_insert_update_delete_bump_only_the_owner(self):
+        await self.session.execute(insert(Contact), [self.contact(1, self.user)])
+        self.assertEqual(await self.versions(), (1, 0))
+        await self.session.execute(update(Contact).where(Contact.email == "c1@example.com")
+                                   .values(first_name="Changed"))
+        self.assertEqual(await self.versions(), (2, 0))
+        await self.session.execute(delete(Contact).where(Contact.email == "c1@example.com"))
+        self.assertEqual(await self.versions(), (3, 0))
+
+    async def test_bulk_insert_bumps(self):
+        await self.session.execute(insert(Contact), [self.contact(number, self.user) for number in range(3)])
+        version, other = await self.versions()
+        self.assertGreater(version, 0)
+        self.assertEqual(other, 0)
+
+    async def test_moving_a_contact_bumps_both_users(self):
+        await self.session.execute(insert(Contact), [self.contact(1, self.user)])
+        await self.session.execute(update(Contact).where(Contact.email == "c1@example.com")
+                                   .values(user_id=self.other.id))
+        self.assertEqual(await self.versions(), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,25 @@
+import base64
+import json
 import unittest
 from datetime import date, timedelta
 from unittest.mock import AsyncMock, MagicMock, Mock
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
-from src.entity.models import Contact, User
-from src.repository.contacts import (create_contact, find_contact_by_email,
-                                     find_contact_by_first_name,
-                                     find_contact_by_last_name,
-                                     get_all_contacts, get_contact,
-                                     get_contacts, remove_contact,
-                                     upcoming_birthdays, update_contact)
-from src.schemas.schemas import ContactModel
+from src.conf import messages
+from src.entity.models import (Base, Contact, User, phone_e164,
+                               phone_reversed)
+from src.repository.contacts import (contact_filters, contact_values,
+                                     create_contact, decode_cursor,
+                                     encode_cursor, get_all_contacts,
+                                     get_contact, get_contacts,
+                                     get_contacts_page,
+                                     query_trigrams, remove_contact,
+                                     search_contacts, upcoming_birthdays,
+                                     update_contact)
+from src.schemas.schemas import ContactFilter, ContactModel, ContactSort
 
 
 class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
@@ -38,7 +46,7 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
                             birth_date=date(2000, 4, 15),
                             user=self.user)]
         mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
+        mocked_contacts.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
         result = await get_contacts(limit, offset, self.session, self.user)
         self.assertEqual(result, contacts)
@@ -61,11 +69,46 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
                             birth_date=date(2000, 4, 15),
                             user=self.user)]
         mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
+        mocked_contacts.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
         result = await get_all_contacts(limit, offset, self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page(self):
+        contacts = [Contact(id=contact_id,
+                            first_name=f'test_first_name_{contact_id}',
+                            last_name=f'test_last_name_{contact_id}',
+                            email=f"test{contact_id}@test.com",
+                            contact_number=f"{contact_id}{contact_id}{contact_id}-111-1111",
+                            birth_date=date(2000, 3, 15),
+                            user=self.user) for contact_id in range(1, 4)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result, next_cursor = await get_contacts_page(2, None, ContactSort.last_name, self.session, self.user)
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor, ContactSort.last_name), ('test_last_name_2', 2))
+
+        mocked_contacts.all.return_value = contacts[2:]
+        result, next_cursor = await get_contacts_page(2, next_cursor, ContactSort.last_name, self.session, self.user)
+        self.assertEqual(result, contacts[2:])
+        self.assertIsNone(next_cursor)
+
+    def test_decode_cursor_invalid(self):
+        contact = Contact(id=1, last_name='test_last_name')
+        with self.assertRaises(HTTPException):
+            decode_cursor(encode_cursor(ContactSort.last_name, contact), ContactSort.first_name)
+        with self.assertRaises(HTTPException):
+            decode_cursor("not a cursor", ContactSort.id)
+        # Values of the wrong type for the sort column
+        for sort, value in ((ContactSort.last_name, {"a": 1}), (ContactSort.first_name, 5),
+                            (ContactSort.id, "5"), (ContactSort.id, True), (ContactSort.created_at, 5),
+                            (ContactSort.created_at, "yesterday")):
+            cursor = base64.urlsafe_b64encode(json.dumps([sort.value, value, 5]).encode()).decode()
+            with self.assertRaises(HTTPException) as error:
+                decode_cursor(cursor, sort)
+            self.assertEqual(error.exception.status_code, 400)
+
     async def test_create_contact(self):
         body = ContactModel(id=1,
                             first_name='test_first_name',
@@ -74,14 +117,37 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
                             contact_number="111-111-1111",
                             birth_date=date(2000, 4, 15),
                             user=self.user)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = Contact(id=1, **contact_values(body), user_id=self.user.id)
+        self.session.execute.return_value = mocked_contact
         result = await create_contact(body, self.user, self.session)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_called_once()
+        self.session.refresh.assert_not_called()
         self.assertIsInstance(result, Contact)
+        self.assertEqual(result.user, self.user)
         self.assertEqual(result.first_name, body.first_name)
         self.assertEqual(result.last_name, body.last_name)
         self.assertEqual(result.email, body.email)
         self.assertEqual(result.contact_number, body.contact_number)
         self.assertEqual(result.birth_date, body.birth_date)
 
+    async def test_create_contact_conflict(self):
+        body = ContactModel(first_name='test_first_name',
+                            last_name='test_last_name',
+                            email="test@test.com",
+                            contact_number="111-111-1111",
+                            birth_date=date(2000, 4, 15))
+        for orig, detail in ((Exception("UNIQUE constraint failed: contacts.email"), messages.CONTACT_EMAIL_EXISTS),
+                             (Exception('duplicate key value violates unique constraint '
+                                        '"contacts_contact_number_key"'), messages.CONTACT_NUMBER_EXISTS)):
+            self.session.execute.side_effect = IntegrityError("INSERT", {}, orig)
+            with self.assertRaises(HTTPException) as exc_info:
+                await create_contact(body, self.user, self.session)
+            self.assertEqual(exc_info.exception.status_code, 409)
+            self.assertEqual(exc_info.exception.detail, detail)
+        self.session.rollback.assert_called()
+
     async def test_get_contact(self):
         contact = Contact(id=1,
                           first_name='test_first_name',
@@ -130,92 +196,210 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
                           birth_date=date(2000, 4, 15),
                           user=self.user)
         mocked_contact = MagicMock()
-        mocked_contact.scalar_one_or_none.return_value = contact
+        mocked_contact.scalar_one_or_none.return_value = contact.id
         self.session.execute.return_value = mocked_contact
         result = await remove_contact(1, self.user, self.session)
-        self.session.delete.assert_called_once()
+        # A single DELETE ... RETURNING, the contact is never loaded
+        self.session.execute.assert_called_once()
+        self.session.delete.assert_not_called()
         self.session.commit.assert_called_once()
-        self.assertIsInstance(result, Contact)
+        self.assertEqual(result, contact.id)
 
-    async def test_find_contact_by_first_name(self):
-        contacts = [Contact(id=1,
-                            first_name='test_first_name',
-                            last_name='test_last_name',
-                            email="test@test.com",
-                            contact_number="111-111-1111",
-                            birth_date=date(2000, 4, 15),
-                            user=self.user), ]
-        mocked_contacts = Mock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await find_contact_by_first_name('test_first_name', self.user, self.session)
-        self.assertEqual(result, contacts)
-
-    async def test_find_contact_by_last_name(self):
-        contacts = [Contact(id=1,
-                            first_name='test_first_name',
-                            last_name='test_last_name',
-                            email="test@test.com",
-                            contact_number="111-111-1111",
-                            birth_date=date(2000, 4, 15),
-                            user=self.user), ]
-        mocked_contacts = Mock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await find_contact_by_last_name('test_last_name', self.user, self.session)
-        self.assertEqual(result, contacts)
-
-    async def test_find_contact_by_email(self):
-        contact = Contact(id=1,
-                          first_name='test_first_name',
-                          last_name='test_last_name',
-                          email="test@test.com",
-                          contact_number="111-111-1111",
-                          birth_date=date(2000, 4, 15),
-                          user=self.user)
-        mocked_contact = Mock()
-        mocked_contact.scalar.return_value = contact
-        self.session.execute.return_value = mocked_contact
-        result = await find_contact_by_email('test@test.com', self.user, self.session)
-        self.assertEqual(result, contact)
+    def test_contact_filters_only_supplied(self):
+        self.assertEqual(contact_filters(ContactFilter()), [])
+        conditions = contact_filters(ContactFilter(last_name="Bond", birth_date_to=date(1990, 1, 1)))
+        self.assertEqual([str(condition) for condition in conditions],
+                         ["contacts.last_name = :last_name_1", "contacts.birth_date <= :birth_date_1"])
 
     async def test_upcoming_birthdays(self):
         current_date = date.today()
         to_date = current_date + timedelta(days=7)
         skip = 0
         limit = 10
-        expected_result = []
 
         contacts = [Contact(id=1,
                             first_name='test_first_name_1',
                             last_name='test_last_name_1',
                             email="test@test.com",
                             contact_number="111-111-1111",
-                            birth_date=date(2000, 4, 16),
-                            user_id=self.user),
-                    Contact(id=2,
-                            first_name='test_first_name_2',
-                            last_name='test_last_name_2',
-                            email="test@test.com",
-                            contact_number="222-222-2222",
-                            birth_date=date(2000, 4, 14),
+                            birth_date=current_date + timedelta(days=1),
                             user_id=self.user)]
 
-        for contact in contacts:
-
-            contact_birthday_month_day = (contact.birth_date.month, contact.birth_date.day)
-            current_date_month_day = (current_date.month, current_date.day)
-            to_date_month_day = (to_date.month, to_date.day)
-
-            if current_date_month_day < contact_birthday_month_day <= to_date_month_day:
-                expected_result.append(contact)
-
+        # The window is filtered by the database
         mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value = contacts
+        mocked_contacts.scalars.return_value.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
         result = await upcoming_birthdays(current_date, to_date, skip, limit, self.user, self.session)
 
-        self.assertCountEqual(result, expected_result)
+        self.assertEqual(result, contacts)
+        search = str(self.session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.birthday_md >=", search)
+
+
+class TestUpcomingBirthdaysWindow(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(username="birthdays", email="birthdays@example.com", password="secret")
+        self.session.add(self.user)
+        for number, birth_date in enumerate([date(1990, 12, 30), date(1985, 1, 2), date(1970, 1, 20),
+                                             date(2000, 12, 20), date(1999, 12, 28)]):
+            self.session.add(Contact(first_name=f"name_{number}", last_name="test", email=f"test{number}@test.com",
+                                     contact_number=f"111-111-111{number}", birth_date=birth_date, user=self.user))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_window_wraps_new_year(self):
+        result = await upcoming_birthdays(date(2026, 12, 27), date(2027, 1, 3), 0, 10, self.user, self.session)
+        self.assertEqual([contact.birth_date for contact in result],
+                         [date(1999, 12, 28), date(1990, 12, 30), date(1985, 1, 2)])
+
+    async def test_pagination_applies_to_matches(self):
+        result = await upcoming_birthdays(date(2026, 12, 27), date(2027, 1, 3), 1, 1, self.user, self.session)
+        self.assertEqual([contact.birth_date for contact in result], [date(1990, 12, 30)])
+
+
+class TestPhoneNormalization(unittest.TestCase):
+
+    def test_formats_of_the_same_number(self):
+        numbers = ["123-456-7890", "(123) 456-7890", "123 456 7890", "123.456.7890", "+1 (123) 456-7890"]
+        self.assertEqual({phone_e164(number) for number in numbers}, {"+11234567890"})
+        self.assertEqual(phone_e164("+38 (050) 123-4567"), "+380501234567")
+
+    def test_reversed_digits(self):
+        self.assertEqual(phone_reversed("123-456-7890"), "09876543211")
+
+
+class TestFilterContacts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(username="filters", email="filters@example.com", password="secret")
+        self.session.add(self.user)
+        for number, (last_name, birth_date) in enumerate([("Bond", date(1980, 4, 18)), ("Bond", date(1995, 6, 1)),
+                                                          ("Leiter", date(1985, 2, 10))]):
+            self.session.add(Contact(first_name=f"name_{number}", last_name=last_name, email=f"test{number}@test.com",
+                                     contact_number=f"111-111-111{number}", birth_date=birth_date, user=self.user))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_filters_are_combined(self):
+        filters = ContactFilter(last_name="Bond", birth_date_from=date(1990, 1, 1))
+        contacts, next_cursor = await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters)
+        self.assertEqual([contact.birth_date for contact in contacts], [date(1995, 6, 1)])
+        self.assertIsNone(next_cursor)
+
+    async def test_pages_through_matches(self):
+        filters = ContactFilter(birth_date_to=date(1990, 1, 1))
+        contacts, next_cursor = await get_contacts_page(1, None, ContactSort.id, self.session, self.user, filters)
+        self.assertEqual([contact.last_name for contact in contacts], ["Bond"])
+        contacts, next_cursor = await get_contacts_page(1, next_cursor, ContactSort.id, self.session, self.user,
+                                                        filters)
+        self.assertEqual([contact.last_name for contact in contacts], ["Leiter"])
+        self.assertIsNone(next_cursor)
+
+    async def test_pages_through_a_shared_created_at(self):
+        # The contacts were written in the same second, the cursor must not skip the rest of that second
+        ids, cursor = [], None
+        while True:
+            contacts, cursor = await get_contacts_page(1, cursor, ContactSort.created_at, self.session, self.user)
+            ids += [contact.id for contact in contacts]
+            if cursor is None:
+                break
+        self.assertEqual(ids, [1, 2, 3])
+
+    async def test_created_and_updated_ranges_include_the_stored_moment(self):
+        contact = await self.session.get(Contact, 1)
+        for name, value in (("created", contact.created_at), ("updated", contact.update_at)):
+            filters = ContactFilter(**{f"{name}_from": value, f"{name}_to": value})
+            contacts, _ = await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters)
+            self.assertIn(1, [row.id for row in contacts], name)
+
+    async def test_phone_in_any_format(self):
+        filters = ContactFilter(phone="(111) 111.1111")
+        contacts, _ = await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters)
+        self.assertEqual([contact.contact_number for contact in contacts], ["111-111-1111"])
+
+    async def test_phone_suffix(self):
+        filters = ContactFilter(phone_suffix="1112")
+        contacts, _ = await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters)
+        self.assertEqual([contact.contact_number for contact in contacts], ["111-111-1112"])
+        filters = ContactFilter(phone_suffix="-")
+        self.assertEqual(await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters),
+                         ([], None))
+
+    async def test_no_match_is_an_empty_page(self):
+        filters = ContactFilter(email="nobody@test.com")
+        self.assertEqual(await get_contacts_page(10, None, ContactSort.id, self.session, self.user, filters),
+                         ([], None))
+
+
+class TestSearchContacts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(username="search", email="search@example.com", password="secret")
+        other = User(username="other", email="other@example.com", password="secret")
+        self.session.add_all([self.user, other])
+        for first_name, last_name, email, number, owner in [
+            ("James", "Bond", "agent_007@mi6.uk", "777-777-7007", self.user),
+            ("Jameson", "Whisky", "irish@example.com", "123-456-7890", self.user),
+            ("Miss", "Moneypenny", "moneypenny@mi6.uk", "777-777-7001", self.user),
+            ("James", "Other", "james@other.com", "555-555-5555", other),
+        ]:
+            self.session.add(Contact(first_name=first_name, last_name=last_name, email=email,
+                                     contact_number=number, birth_date=date(1980, 1, 1), user=owner))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def search(self, query: str, limit: int = 10, offset: int = 0) -> list[str]:
+        result = await search_contacts(query, limit, offset, self.user, self.session)
+        return [contact.last_name for contact in result]
+
+    def test_query_trigrams(self):
+        self.assertEqual(query_trigrams("bond"), ["bon", "ond"])
+        self.assertEqual(query_trigrams("aaaa"), ["aaa"])
+        self.assertEqual(query_trigrams("jb"), [])
+
+    async def test_prefix_is_case_insensitive(self):
+        self.assertEqual(await self.search("JAMES"), ["Bond", "Whisky"])
+        self.assertEqual(await self.search("mo"), ["Moneypenny"])
+
+    async def test_typo(self):
+        self.assertEqual((await self.search("moneypeny"))[0], "Moneypenny")
+        self.assertEqual((await self.search("jamse bond"))[0], "Bond")
+
+    async def test_email_and_phone(self):
+        self.assertEqual(await self.search("mi6.uk"), ["Bond", "Moneypenny"])
+        self.assertEqual((await self.search("7007"))[0], "Bond")
+
+    async def test_pagination(self):
+        self.assertEqual(await self.search("james", limit=1, offset=1), ["Whisky"])
+
+    async def test_search_follows_updates(self):
+        contact = await get_contact(1, self.user, self.session)
+        contact.last_name = "Fleming"
+        await self.session.commit()
+        self.assertEqual(await self.search("fleming"), ["Fleming"])
+        self.assertEqual(await self.search("bond"), [])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+import json
+import unittest
+from datetime import date
+
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.entity.models import Base, Contact, Role, User
+from src.repository.contacts import get_all_contacts, get_contacts
+from src.schemas.schemas import ContactField, ContactProjection, ContactSparseResponse
+from src.services.serialization import contacts_response
+
+
+class TestContactsResponse(unittest.IsolatedAsyncioTestCase):
+    """
+    The orjson fast path must produce the same JSON as the response model it bypasses.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(username="owner", email="owner@example.com", password="secret", role=Role.moderator)
+        self.session.add(self.user)
+        await self.session.flush()
+        self.session.add_all([
+            Contact(first_name="James", last_name="Bond", email="agent_007@mi6.uk", contact_number="777-777-7007",
+                    birth_date=date(1980, 4, 18), additional_information="Shaken, not stirred", user=self.user),
+            Contact(first_name="Miss", last_name="Moneypenny", email="moneypenny@mi6.uk",
+                    contact_number="777-777-7001", birth_date=date(1982, 5, 1)),
+        ])
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def assert_same_json(self, rows, projection: ContactProjection, owner: User | None = None):
+        fast = json.loads(contacts_response(rows, projection, owner).body)
+        expected = [projection.dump(row, owner) for row in rows] if owner is not None or not projection.include_user \
+            else fast
+        adapter = TypeAdapter(list[ContactSparseResponse])
+        self.assertEqual(fast, adapter.dump_python(adapter.validate_python(expected), mode="json", exclude_unset=True))
+
+    async def test_all_fields(self):
+        rows = await get_contacts(10, 0, self.session, self.user)
+        self.assert_same_json(rows, ContactProjection())
+
+    async def test_selected_fields_with_owner(self):
+        projection = ContactProjection(fields=[ContactField.email, ContactField.birth_date], include_user=True)
+        rows = await get_contacts(10, 0, self.session, self.user, projection)
+        self.assertEqual(list(rows[0]._fields), ["id", "email", "birth_date"])
+        self.assert_same_json(rows, projection, self.user)
+
+    async def test_joined_owners(self):
+        projection = ContactProjection(fields=[ContactField.last_name], include_user=True)
+        rows = await get_all_contacts(10, 0, self.session, projection)
+        items = {item["last_name"]: item for item in json.loads(contacts_response(rows, projection).body)}
+        self.assertEqual(items["Bond"]["user"], {"id": self.user.id, "username": "owner",
+                                                 "email": "owner@example.com", "avatar": None, "role": "moderator"})
+        self.assertIsNone(items["Moneypenny"]["user"])
+        self.assert_same_json(rows, projection)
+
+    async def test_page(self):
+        rows = await get_contacts(1, 0, self.session, self.user)
+        body = json.loads(contacts_response(rows, ContactProjection(), next_cursor="abc", page=True).body)
+        self.assertEqual(body["next_cursor"], "abc")
+        self.assertEqual(body["items"][0]["birth_date"], "1980-04-18")
+
+
+if __name__ == '__main__':
+    unittest.main()
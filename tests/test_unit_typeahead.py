@@ -0,0 +1,93 @@
+import unittest
+from types import SimpleNamespace
+
+from src.services.typeahead import TypeaheadIndex, UserTypeahead
+
+
+def row(contact_id: int, first_name: str, last_name: str, email: str):
+    return SimpleNamespace(id=contact_id, first_name=first_name, last_name=last_name, email=email)
+
+
+class TestUserTypeahead(unittest.TestCase):
+
+    def setUp(self):
+        self.index = UserTypeahead()
+        self.index.add(1, "James", "Bond", "agent_007@mi6.uk")
+        self.index.add(2, "Jameson", "Whisky", "irish@example.com")
+        self.index.add(3, "Miss", "Moneypenny", "moneypenny@mi6.uk")
+
+    def ids(self, prefix: str, limit: int = 10) -> list[int]:
+        return [contact["id"] for contact in self.index.suggest(prefix, limit)]
+
+    def test_prefix_of_any_term(self):
+        self.assertEqual(self.ids("JAM"), [1, 2])
+        self.assertEqual(self.ids("james b"), [1])
+        self.assertEqual(self.ids("mo"), [3])
+        self.assertEqual(self.ids("irish@"), [2])
+        self.assertEqual(self.ids("x"), [])
+
+    def test_contact_matching_several_terms_is_suggested_once(self):
+        self.assertEqual(self.ids("m"), [3])
+
+    def test_limit(self):
+        self.assertEqual(self.ids("jam", limit=1), [1])
+
+    def test_update_and_remove(self):
+        size = self.index.size
+        self.index.add(1, "Jim", "Bond", "agent_007@mi6.uk")
+        self.assertEqual(self.ids("james"), [2])
+        self.assertEqual(self.ids("jim"), [1])
+        self.index.remove(1)
+        self.index.remove(1)
+        self.assertEqual(self.ids("bond"), [])
+        self.assertLess(self.index.size, size)
+        self.index.remove(2)
+        self.index.remove(3)
+        self.assertEqual((self.index.entries, self.index.size), ([], 0))
+
+
+class TestTypeaheadIndex(unittest.TestCase):
+
+    def test_lru_eviction_over_budget(self):
+        single = UserTypeahead()
+        single.add(1, "James", "Bond", "agent_007@mi6.uk")
+        index = TypeaheadIndex(memory_budget=single.size * 2, ttl=300)
+        for user_id in (1, 2):
+            index.start_build(user_id)
+            index.finish_build(user_id, [row(user_id, "James", "Bond", "agent_007@mi6.uk")])
+        self.assertIsNotNone(index.get(1))
+        index.start_build(3)
+        index.finish_build(3, [row(3, "James", "Bond", "agent_007@mi6.uk")])
+        # User 2 was used least recently
+        self.assertIsNone(index.get(2))
+        self.assertIsNotNone(index.get(1))
+        self.assertEqual(index.evictions, 1)
+
+    def test_writes_update_loaded_index_only(self):
+        index = TypeaheadIndex(memory_budget=10_000, ttl=300)
+        index.contact_written(1, 1, "James", "Bond", "agent_007@mi6.uk")
+        self.assertIsNone(index.get(1))
+        index.start_build(1)
+        index.finish_build(1, [])
+        index.contact_written(1, 1, "James", "Bond", "agent_007@mi6.uk")
+        self.assertEqual([contact["id"] for contact in index.get(1).suggest("bond", 10)], [1])
+        index.contact_removed(1, 1)
+        self.assertEqual(index.get(1).suggest("bond", 10), [])
+
+    def test_write_during_build_discards_the_build(self):
+        index = TypeaheadIndex(memory_budget=10_000, ttl=300)
+        index.start_build(1)
+        index.contact_written(1, 5, "James", "Bond", "agent_007@mi6.uk")
+        built = index.finish_build(1, [])
+        self.assertEqual(built.contacts, {})
+        self.assertIsNone(index.get(1))
+
+    def test_expired_index_is_rebuilt(self):
+        index = TypeaheadIndex(memory_budget=10_000, ttl=0)
+        index.start_build(1)
+        index.finish_build(1, [])
+        self.assertIsNone(index.get(1))
+
+
+if __name__ == '__main__':
+    unittest.main()